@@ -1,11 +1,64 @@
-from .cache import Cache
-from .github_auth import GithubAuth
-from .json_cache import JSONCache
-from .member_management import MemberManagement
-from .ms_auth import MSAuth
-from .nick import Nick
-from .projects import Projects
-from .ui_helper import UIHelper
-from .help import Help
-
-__all__ = ["Nick", "MemberManagement", "Cache", "UIHelper", "MSAuth", "GithubAuth", "Projects", "JSONCache", "Help"]
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .approvals import Approvals
+    from .cache import Cache
+    from .github_auth import GithubAuth
+    from .github_cache import GithubCache
+    from .help import Help
+    from .jobs import Jobs
+    from .json_cache import JSONCache
+    from .member_management import MemberManagement
+    from .ms_auth import MSAuth
+    from .nick import Nick
+    from .outbox import Outbox
+    from .projects import Projects
+    from .role_reconciler import RoleReconciler
+    from .ui_helper import UIHelper
+    from .verify_server import VerifyServer
+
+# cogs are only imported when first accessed, so the entry point can time each of them
+cog_modules = {
+    "Approvals": f"{__name__}.approvals",
+    "Cache": f"{__name__}.cache",
+    "GithubAuth": f"{__name__}.github_auth",
+    "GithubCache": f"{__name__}.github_cache",
+    "Help": f"{__name__}.help",
+    "Jobs": f"{__name__}.jobs",
+    "JSONCache": f"{__name__}.json_cache",
+    "MemberManagement": f"{__name__}.member_management",
+    "MSAuth": f"{__name__}.ms_auth",
+    "Nick": f"{__name__}.nick",
+    "Outbox": f"{__name__}.outbox",
+    "Projects": f"{__name__}.projects",
+    "RoleReconciler": f"{__name__}.role_reconciler",
+    "UIHelper": f"{__name__}.ui_helper",
+    "VerifyServer": f"{__name__}.verify_server",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in cog_modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    return getattr(importlib.import_module(cog_modules[name]), name)
+
+
+__all__ = [
+    "Nick",
+    "MemberManagement",
+    "Cache",
+    "UIHelper",
+    "MSAuth",
+    "GithubAuth",
+    "Projects",
+    "JSONCache",
+    "Help",
+    "Jobs",
+    "Outbox",
+    "Approvals",
+    "GithubCache",
+    "RoleReconciler",
+    "VerifyServer",
+]
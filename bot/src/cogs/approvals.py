@@ -0,0 +1,446 @@
+import asyncio
+import logging
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Collection,
+    List,
+    MutableMapping,
+    MutableSet,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from config import config
+from nextcord import (
+    ButtonStyle,
+    Interaction,
+    Member,
+    NotFound,
+    RawBulkMessageDeleteEvent,
+    RawMessageDeleteEvent,
+    User,
+)
+from nextcord.ext.commands import Bot, Cog
+from nextcord.ui import View
+from utils.error import send_error, send_no_permission
+
+from .cache import Cache
+from .json_cache import JSONCache
+from .outbox import PRIORITY_EXCO, Outbox
+from .ui_helper import ButtonCallback, ButtonCallbackFactory, UIHelper
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 4  # one row of buttons per request, leaving the last row for paging and bulk actions
+HANDLED_SHOWN = 5  # how many handled requests a digest still shows
+PREVIOUS_POST_TIMEOUT = 30  # seconds to wait for an earlier request from the same requester to go out
+
+# gets the exco member, the requester and the request's args; returns what to show exco afterwards
+ApprovalRun = Callable[..., Awaitable[str]]
+Entry = List[Any]  # kind, requester id, args, description
+
+
+def request_key(kind: str, requester_id: int) -> str:
+    return f"{kind}:{requester_id}"
+
+
+class ApprovalAction:
+    __slots__ = "name", "label", "emoji", "style", "run"
+
+    def __init__(self, name: str, label: str, emoji: str, style: ButtonStyle, run: ApprovalRun) -> None:
+        self.name = name  # also the UI helper callback name, so it has to stay stable
+        self.label = label
+        self.emoji = emoji
+        self.style = style
+        self.run = run
+
+
+class ApprovalKind:
+    __slots__ = "actions", "approve", "deny"
+
+    def __init__(self, actions: Sequence[ApprovalAction], approve: str, deny: str) -> None:
+        self.actions = {action.name: action for action in actions}
+        # what "approve all" and "deny all" do for this kind in a digest
+        self.approve = approve
+        self.deny = deny
+
+
+class Approvals(Cog):
+    # posts requests exco has to approve. with a digest window configured, requests arriving close together are
+    # coalesced into one paged message, instead of one message (and a few persisted buttons) each
+    # a requester has at most one outstanding request of each kind; asking again edits it in place
+    __slots__ = (
+        "bot",
+        "cache",
+        "ui_helper",
+        "outbox",
+        "kinds",
+        "digests",
+        "outstanding",
+        "posting",
+        "post_tasks",
+        "buffer",
+        "flush_task",
+        "in_progress",
+    )
+
+    def __init__(self, bot: Bot, cache: Cache, ui_helper: UIHelper, json_cache: JSONCache, outbox: Outbox) -> None:
+        super().__init__()
+
+        self.bot = bot
+        self.cache = cache
+        self.ui_helper = ui_helper
+        self.outbox = outbox
+
+        self.kinds: MutableMapping[str, ApprovalKind] = {}
+        # message id -> {"entries": entry id -> entry, "page": page, "handled": handled descriptions}
+        self.digests: MutableMapping[str, MutableMapping[str, Any]] = json_cache.register_cache("approval_digests")
+        # request key -> message id, and the entry id if the request is part of a digest
+        self.outstanding: MutableMapping[str, List[Optional[str]]] = json_cache.register_cache("approval_requests")
+        self.posting: MutableMapping[str, asyncio.Future] = {}  # request key -> request being sent
+        self.post_tasks: MutableSet[asyncio.Task] = set()  # kept so they aren't garbage collected mid-post
+        self.buffer: List[Entry] = []  # waiting for the digest window to close
+        self.flush_task: Optional[asyncio.Task] = None
+        self.in_progress: MutableSet[int] = set()  # message ids, so double clicks don't act twice
+
+        self.ui_helper.register_callback("approval-digest-action", self.digest_action_wrapper)
+        self.ui_helper.register_callback("approval-digest-page", self.digest_page_wrapper)
+        self.ui_helper.register_callback("approval-digest-bulk", self.digest_bulk_wrapper)
+
+    def register_kind(self, kind: str, actions: Sequence[ApprovalAction], *, approve: str, deny: str) -> None:
+        if kind in self.kinds:
+            raise ValueError(f"Approval kind {kind} already registered")
+
+        self.kinds[kind] = ApprovalKind(actions, approve, deny)
+
+        for action in actions:
+            self.ui_helper.register_callback(action.name, self.action_wrapper(kind, action))
+
+    def request(self, kind: str, requester: Member, args: Collection[Any], description: str) -> bool:
+        # returns whether an outstanding request from the same requester was replaced
+        entry: Entry = [kind, requester.id, list(args), description]
+        key = request_key(kind, requester.id)
+
+        if key in self.outstanding or key in self.posting:
+            self.start_post(entry)
+            return True
+
+        if config.approval_digest_window <= 0:
+            self.start_post(entry)
+            return False
+
+        for i, buffered in enumerate(self.buffer):
+            if request_key(buffered[0], buffered[1]) == key:
+                self.buffer[i] = entry
+                return True
+
+        self.buffer.append(entry)
+        if not self.flush_task:
+            self.flush_task = asyncio.create_task(self.flush_later())
+        return False
+
+    def get_single_view(self, entry: Entry) -> View:
+        kind, requester_id, args, _ = entry
+
+        responses = View(timeout=None, auto_defer=False)
+        for action in self.kinds[kind].actions.values():
+            responses.add_item(
+                self.ui_helper.get_button(
+                    callback_name=action.name,
+                    callback_args=(requester_id, *args),
+                    label=action.label,
+                    emoji=action.emoji,
+                    style=action.style,
+                )
+            )
+
+        return responses
+
+    def start_post(self, entry: Entry) -> None:
+        task = asyncio.create_task(self.post(entry))
+        self.post_tasks.add(task)
+        task.add_done_callback(self.post_tasks.discard)
+
+    async def post(self, entry: Entry) -> None:
+        key = request_key(entry[0], entry[1])
+
+        # the previous request may still be on its way out, we need its message to replace it
+        if previous_post := self.posting.get(key):
+            try:
+                await asyncio.wait_for(asyncio.shield(previous_post), PREVIOUS_POST_TIMEOUT)
+            except asyncio.TimeoutError:
+                # still queued behind something, post a new message rather than hold up every later request
+                logger.warn(f"Previous approval request {key} still not sent, posting a new one")
+
+        if await self.replace(key, entry):
+            return
+
+        sent = self.outbox.send(
+            self.cache.exco_channel, entry[3], view=self.get_single_view(entry), priority=PRIORITY_EXCO
+        )
+        self.posting[key] = sent
+        try:
+            if message := await sent:
+                self.outstanding[key] = [str(message.id), None]
+        finally:
+            if self.posting.get(key) is sent:
+                self.posting.pop(key)
+
+    async def replace(self, key: str, entry: Entry) -> bool:
+        # edits the outstanding request in place; its old buttons are dropped by the UI helper on edit
+        if not (outstanding := self.outstanding.get(key)):
+            return False
+
+        message_id, entry_id = outstanding
+        if entry_id is None:
+            content, view = f"{entry[3]} (updated)", self.get_single_view(entry)
+        elif (digest := self.digests.get(message_id)) and entry_id in digest["entries"]:
+            digest["entries"][entry_id] = entry
+            content, view = self.render_digest(digest)
+        else:
+            self.outstanding.pop(key)
+            return False
+
+        try:
+            await self.cache.exco_channel.get_partial_message(int(message_id)).edit(content=content, view=view)
+        except NotFound:
+            self.outstanding.pop(key)
+            return False
+
+        return True
+
+    def resolve(self, entry: Entry) -> None:
+        self.outstanding.pop(request_key(entry[0], entry[1]), None)
+
+    async def flush_later(self) -> None:
+        await asyncio.sleep(config.approval_digest_window)
+
+        entries, self.buffer = self.buffer, []
+        self.flush_task = None
+
+        if len(entries) == 1:
+            # nothing to coalesce
+            return await self.post(entries[0])
+
+        digest = {"entries": {str(i): entry for i, entry in enumerate(entries)}, "page": 0, "handled": []}
+        content, view = self.render_digest(digest)
+
+        message = await self.outbox.send(self.cache.exco_channel, content, view=view, priority=PRIORITY_EXCO)
+        if not message:
+            logger.error(f"Could not post digest of {len(entries)} approval requests")
+            return
+
+        self.digests[str(message.id)] = digest
+        for entry_id, entry in digest["entries"].items():
+            self.outstanding[request_key(entry[0], entry[1])] = [str(message.id), entry_id]
+
+    def render_digest(self, digest: MutableMapping[str, Any]) -> Tuple[str, Optional[View]]:
+        entries: MutableMapping[str, Entry] = digest["entries"]
+        handled: List[str] = digest["handled"]
+
+        lines = []
+        if entries:
+            pages = (len(entries) + PAGE_SIZE - 1) // PAGE_SIZE
+            digest["page"] = page = min(digest["page"], pages - 1)
+            shown = list(entries.items())[page * PAGE_SIZE : (page + 1) * PAGE_SIZE]
+
+            lines.append(f"**{len(entries)} pending requests** (page {page + 1}/{pages})")
+            lines.extend(f"`#{int(entry_id) + 1}` {entry[3]}" for entry_id, entry in shown)
+        else:
+            lines.append("**All requests handled**")
+
+        if handled:
+            lines.append("")
+            lines.extend(handled[-HANDLED_SHOWN:])
+            if len(handled) > HANDLED_SHOWN:
+                lines.append(f"...and {len(handled) - HANDLED_SHOWN} more")
+
+        if not entries:
+            return "\n".join(lines), None
+
+        view = View(timeout=None, auto_defer=False)
+        for row, (entry_id, entry) in enumerate(shown):
+            for action in self.kinds[entry[0]].actions.values():
+                view.add_item(
+                    self.ui_helper.get_button(
+                        callback_name="approval-digest-action",
+                        callback_args=(entry_id, action.name),
+                        label=f"#{int(entry_id) + 1} {action.label}",
+                        emoji=action.emoji,
+                        style=action.style,
+                        row=row,
+                    )
+                )
+
+        for callback_name, callback_args, label, style, disabled in (
+            ("approval-digest-page", (-1,), "Previous", ButtonStyle.grey, page == 0),
+            ("approval-digest-page", (1,), "Next", ButtonStyle.grey, page == pages - 1),
+            ("approval-digest-bulk", ("approve",), "Approve all", ButtonStyle.green, False),
+            ("approval-digest-bulk", ("deny",), "Deny all", ButtonStyle.red, False),
+        ):
+            view.add_item(
+                self.ui_helper.get_button(
+                    callback_name=callback_name,
+                    callback_args=callback_args,
+                    label=label,
+                    style=style,
+                    disabled=disabled,
+                    row=PAGE_SIZE,
+                )
+            )
+
+        return "\n".join(lines), view
+
+    async def run_action(self, action: ApprovalAction, exco: Member, entry: Entry) -> str:
+        _, requester_id, args, _ = entry
+
+        requester = await self.cache.fetch_member(requester_id)
+        if not requester:
+            return f"<@{requester_id}> is no longer in the server!"
+
+        try:
+            return await action.run(exco, requester, *args)
+        except Exception:
+            logger.error(f"Approval action {action.name} failed:", exc_info=True)
+            return f"Could not handle <@{requester_id}>'s request, check logs for more info."
+
+    def get_exco(self, interaction: Interaction) -> Optional[Member]:
+        if not interaction.user or isinstance(interaction.user, User):
+            raise RuntimeError("Interaction had invalid user!")
+
+        if not interaction.message:
+            raise RuntimeError("Interaction had no message?")
+
+        if not interaction.user.get_role(config.exco_role):
+            return None
+
+        return interaction.user
+
+    def action_wrapper(self, kind: str, action: ApprovalAction) -> ButtonCallbackFactory:
+        def factory(requester_id: Any, *args: Any) -> ButtonCallback:
+            if not isinstance(requester_id, int):
+                raise ValueError("Invalid values passed!")
+
+            key = request_key(kind, requester_id)
+
+            async def callback(interaction: Interaction) -> None:
+                requester = await self.cache.fetch_member(requester_id)
+                if not requester:
+                    self.outstanding.pop(key, None)
+                    await interaction.edit(content="User no longer in server!", view=None)
+                    return
+
+                if not (exco := self.get_exco(interaction)):
+                    return await send_no_permission(interaction)
+
+                message_id = interaction.message.id  # type: ignore
+                if message_id in self.in_progress:
+                    return await send_error(interaction, "Already being handled!", ephemeral=True)
+
+                self.in_progress.add(message_id)
+                try:
+                    self.outstanding.pop(key, None)
+                    await interaction.edit(content=await action.run(exco, requester, *args), view=None)
+                finally:
+                    self.in_progress.discard(message_id)
+
+            return callback
+
+        return factory
+
+    def get_digest(self, interaction: Interaction) -> Optional[MutableMapping[str, Any]]:
+        return self.digests.get(str(interaction.message.id)) if interaction.message else None
+
+    async def update_digest(self, interaction: Interaction, digest: MutableMapping[str, Any]) -> None:
+        content, view = self.render_digest(digest)
+        await interaction.edit(content=content, view=view)
+
+        if not digest["entries"]:
+            self.digests.pop(str(interaction.message.id), None)  # type: ignore
+
+    def digest_action_wrapper(self, entry_id: Any, action_name: Any) -> ButtonCallback:
+        if not isinstance(entry_id, str) or not isinstance(action_name, str):
+            raise ValueError("Invalid values passed!")
+
+        async def callback(interaction: Interaction) -> None:
+            if not (exco := self.get_exco(interaction)):
+                return await send_no_permission(interaction)
+
+            # pop before acting, so a second click on the same entry finds nothing
+            if not (digest := self.get_digest(interaction)) or not (entry := digest["entries"].pop(entry_id, None)):
+                return await send_error(interaction, "Already handled!", ephemeral=True)
+
+            await interaction.response.defer()
+            self.resolve(entry)
+
+            action = self.kinds[entry[0]].actions[action_name]
+            digest["handled"].append(f"`#{int(entry_id) + 1}` " + await self.run_action(action, exco, entry))
+
+            await self.update_digest(interaction, digest)
+
+        return callback
+
+    def digest_page_wrapper(self, delta: Any) -> ButtonCallback:
+        if not isinstance(delta, int):
+            raise ValueError("Invalid values passed!")
+
+        async def callback(interaction: Interaction) -> None:
+            if not self.get_exco(interaction):
+                return await send_no_permission(interaction)
+
+            if not (digest := self.get_digest(interaction)):
+                return await send_error(interaction, "Already handled!", ephemeral=True)
+
+            digest["page"] = max(0, digest["page"] + delta)
+            await self.update_digest(interaction, digest)
+
+        return callback
+
+    def digest_bulk_wrapper(self, decision: Any) -> ButtonCallback:
+        if decision not in ("approve", "deny"):
+            raise ValueError("Invalid values passed!")
+
+        async def callback(interaction: Interaction) -> None:
+            if not (exco := self.get_exco(interaction)):
+                return await send_no_permission(interaction)
+
+            if not (digest := self.get_digest(interaction)) or not digest["entries"]:
+                return await send_error(interaction, "Already handled!", ephemeral=True)
+
+            entries: MutableMapping[str, Entry] = digest["entries"]
+            taken, digest["entries"] = dict(entries), {}
+
+            await interaction.response.defer()
+
+            for entry_id, entry in taken.items():
+                self.resolve(entry)
+                kind = self.kinds[entry[0]]
+                action = kind.actions[kind.approve if decision == "approve" else kind.deny]
+                digest["handled"].append(f"`#{int(entry_id) + 1}` " + await self.run_action(action, exco, entry))
+
+            await self.update_digest(interaction, digest)
+
+        return callback
+
+    def forget_message(self, message_id: int) -> None:
+        self.digests.pop(str(message_id), None)
+
+        # wrap in list to create a copy of items (we modify the dict in the loop)
+        for key, (outstanding_message_id, _) in list(self.outstanding.items()):
+            if outstanding_message_id == str(message_id):
+                self.outstanding.pop(key)
+
+    @Cog.listener()
+    async def on_raw_message_delete(self, payload: RawMessageDeleteEvent) -> None:
+        self.forget_message(payload.message_id)
+
+    @Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: RawBulkMessageDeleteEvent) -> None:
+        for message_id in payload.message_ids:
+            self.forget_message(message_id)
+
+
+__all__ = ["Approvals", "ApprovalAction"]
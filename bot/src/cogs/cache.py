@@ -1,12 +1,56 @@
+import asyncio
+import logging
+import resource
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Mapping, MutableMapping, MutableSet, Optional, TypeVar
+
 from config import config
-from nextcord import Guild, Role, TextChannel
+from nextcord import (
+    Guild,
+    Interaction,
+    Member,
+    RawMemberRemoveEvent,
+    Role,
+    TextChannel,
+    VoiceChannel,
+    Webhook,
+)
+from nextcord.abc import GuildChannel
 from nextcord.ext.commands import Bot, Cog
+from utils.nextcord_internals import cache_member, uncache_member, watch_raw_event
+
+logger = logging.getLogger(__name__)
+
+MEMBER_BATCH_SIZE = 100  # most user ids a member query accepts
+MEMBER_BATCH_DELAY = 0.05  # seconds to collect lookups for before querying
+
+NamedType = TypeVar("NamedType", Role, TextChannel, VoiceChannel)
+NameIndex = MutableMapping[str, MutableMapping[int, NamedType]]  # exact name -> id -> object
 
 
 class Cache(Cog, name="Cache"):
-    __slots__ = "_guild", "bot", "_alumni_role", "_exco_channel", "_member_role", "_guest_role"
+    __slots__ = (
+        "_guild",
+        "bot",
+        "_alumni_role",
+        "_exco_channel",
+        "_member_role",
+        "_guest_role",
+        "_roles_by_name",
+        "_text_channels_by_name",
+        "_voice_channels_by_name",
+        "_webhooks",
+        "_recent_members",
+        "_member_requests",
+        "_member_flushes",
+        "_role_member_ids",
+        "_role_index_lock",
+        "_started_at",
+        "_reported",
+    )
 
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot) -> None:
         super().__init__()
 
         self.bot = bot
@@ -16,6 +60,30 @@ class Cache(Cog, name="Cache"):
         self._guest_role = None
         self._exco_channel = None
 
+        # built on first lookup, then kept fresh from gateway events
+        self._roles_by_name: Optional[NameIndex[Role]] = None
+        self._text_channels_by_name: Optional[NameIndex[TextChannel]] = None
+        self._voice_channels_by_name: Optional[NameIndex[VoiceChannel]] = None
+        # channel id -> webhook id -> webhook
+        self._webhooks: MutableMapping[int, MutableMapping[int, Webhook]] = {}
+
+        # lazy member cache only: member id -> None, least recently used first
+        self._recent_members: OrderedDict[int, None] = OrderedDict()
+        # member id -> lookup waiting for the next batched query
+        self._member_requests: MutableMapping[int, asyncio.Future[Optional[Member]]] = {}
+        # tasks answering them, kept so they aren't garbage collected mid-query
+        self._member_flushes: MutableSet[asyncio.Task] = set()
+        # role id -> ids of the members holding it, built on first use and kept fresh from member updates, since
+        # the guild only knows the roles of the members it caches
+        self._role_member_ids: Optional[MutableMapping[int, MutableSet[int]]] = None
+        self._role_index_lock = asyncio.Lock()
+        self._started_at = time.perf_counter()
+        self._reported = False
+
+        if self.lazy_members:
+            # nextcord drops updates to members it doesn't cache, which is most of them here
+            watch_raw_event(bot, "GUILD_MEMBER_UPDATE", self.on_raw_member_update)
+
     @property
     def guild(self) -> Guild:
         if not self._guild:
@@ -63,5 +131,284 @@ class Cache(Cog, name="Cache"):
 
         return self._exco_channel
 
+    @property
+    def lazy_members(self) -> bool:
+        # without chunking at startup the guild only holds members we looked up or saw recently
+        return config.member_cache == "lazy"
+
+    def get_member(self, member_id: int) -> Optional[Member]:
+        # only what is cached; use fetch_member when a miss shouldn't mean "not in the server"
+        member = self.guild.get_member(member_id)
+        if member and self.lazy_members:
+            self._recent_members[member_id] = None
+            self._recent_members.move_to_end(member_id)
+
+        return member
+
+    async def fetch_member(self, member_id: int) -> Optional[Member]:
+        if (member := self.get_member(member_id)) or not self.lazy_members:
+            return member
+
+        # lookups arriving together share one gateway query
+        if not (future := self._member_requests.get(member_id)):
+            loop = asyncio.get_running_loop()
+            future = self._member_requests[member_id] = loop.create_future()
+            if len(self._member_requests) == 1:
+                loop.call_later(MEMBER_BATCH_DELAY, self.start_member_flush)
+
+        return await asyncio.shield(future)
+
+    async def fetch_members(self, member_ids: Iterable[int]) -> List[Member]:
+        members = await asyncio.gather(*(self.fetch_member(member_id) for member_id in member_ids))
+        return [member for member in members if member]
+
+    def start_member_flush(self) -> None:
+        task = asyncio.create_task(self.flush_member_requests())
+        self._member_flushes.add(task)
+        task.add_done_callback(self._member_flushes.discard)
+
+    async def flush_member_requests(self) -> None:
+        requests, self._member_requests = self._member_requests, {}
+        member_ids = list(requests)
+
+        try:
+            for start in range(0, len(member_ids), MEMBER_BATCH_SIZE):
+                batch = member_ids[start : start + MEMBER_BATCH_SIZE]
+                try:
+                    members = await self.guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+                except asyncio.TimeoutError as e:
+                    # only this batch timed out, the next one may still go through
+                    for member_id in batch:
+                        if not requests[member_id].done():
+                            requests[member_id].set_exception(e)
+                    continue
+
+                found = {member.id: member for member in members}
+                for member_id in batch:
+                    if member := found.get(member_id):
+                        self.remember(member)
+                    if not requests[member_id].done():
+                        requests[member_id].set_result(member)
+        except Exception as e:
+            # anything else, like the guild being unavailable, fails every lookup still waiting
+            for future in requests.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # only left over when cancelled, and nothing will answer them after that
+            for future in requests.values():
+                if not future.done():
+                    future.cancel()
+
+    async def all_members(self) -> List[Member]:
+        # lazily, a paginated REST scan that isn't kept in the cache; only for rare whole-guild passes
+        if not self.lazy_members:
+            return list(self.guild.members)
+
+        return [member async for member in self.guild.fetch_members(limit=None)]
+
+    async def role_members(self, role: Role) -> List[Member]:
+        if not self.lazy_members:
+            return list(role.members)
+
+        async with self._role_index_lock:
+            if self._role_member_ids is None:
+                await self.build_role_index()
+
+        return await self.fetch_members(self._role_member_ids.get(role.id, ()))  # type: ignore
+
+    async def build_role_index(self) -> None:
+        # one whole-guild scan per process; updates arriving during it are applied on top
+        self._role_member_ids = {}
+        for member in await self.all_members():
+            for role in member.roles:
+                self._role_member_ids.setdefault(role.id, set()).add(member.id)
+
+    def index_member_roles(self, member_id: int, role_ids: Iterable[int]) -> None:
+        if self._role_member_ids is None:
+            return
+
+        for member_ids in self._role_member_ids.values():
+            member_ids.discard(member_id)
+        for role_id in role_ids:
+            self._role_member_ids.setdefault(role_id, set()).add(member_id)
+
+    def on_raw_member_update(self, data: Mapping[str, Any]) -> None:
+        # called with the gateway payload, for cached and uncached members alike
+        if int(data["guild_id"]) != config.guild_id:
+            return
+
+        member_id = int(data["user"]["id"])
+        self.index_member_roles(member_id, [int(role_id) for role_id in data["roles"]])
+        if not self.guild.get_member(member_id):
+            # cached members get on_member_update from nextcord instead
+            self.bot.dispatch("uncached_member_update", member_id)
+
+    def remember(self, member: Member) -> None:
+        if not self.lazy_members or member.guild.id != config.guild_id:
+            return
+
+        if not self.guild.get_member(member.id):
+            cache_member(self.guild, member)
+
+        self._recent_members[member.id] = None
+        self._recent_members.move_to_end(member.id)
+
+        # trim in bulk once well over the limit, so each insert doesn't walk the whole cache
+        if len(self._recent_members) > config.member_cache_size * 1.1:
+            self.trim_members()
+
+    def trim_members(self) -> None:
+        excess = len(self._recent_members) - config.member_cache_size
+        if excess <= 0:
+            return
+
+        tracked_roles = {config.member_role, config.alumni_role, config.guest_role, config.exco_role}
+
+        def holds_tracked_role(member_id: int) -> bool:
+            member = self.guild.get_member(member_id)
+            return bool(member) and any(role.id in tracked_roles for role in member.roles)  # type: ignore
+
+        # least recently used first, members without any of our roles before those with
+        order = list(self._recent_members)
+        evicted = [member_id for member_id in order if not holds_tracked_role(member_id)][:excess]
+        if len(evicted) < excess:
+            evicted_set = set(evicted)
+            evicted.extend([member_id for member_id in order if member_id not in evicted_set][: excess - len(evicted)])
+
+        for member_id in evicted:
+            self._recent_members.pop(member_id)
+            if member_id != self.bot.user.id and (member := self.guild.get_member(member_id)):  # type: ignore
+                uncache_member(self.guild, member)
+
+    @staticmethod
+    def index_add(index: Optional[NameIndex[NamedType]], item: NamedType) -> None:
+        if index is not None:
+            index.setdefault(item.name, {})[item.id] = item
+
+    @staticmethod
+    def index_remove(index: Optional[NameIndex[NamedType]], item: NamedType) -> None:
+        if index is None:
+            return
+
+        if (items := index.get(item.name)) is not None:
+            items.pop(item.id, None)
+            if not items:
+                index.pop(item.name)
+
+    @staticmethod
+    def index_find(index: NameIndex[NamedType], name: str) -> Optional[NamedType]:
+        # names match exactly, like discord shows them; several can share one, the first found wins
+        items = index.get(name)
+        return next(iter(items.values()), None) if items else None
+
+    def find_role(self, name: str) -> Optional[Role]:
+        if self._roles_by_name is None:
+            self._roles_by_name = {}
+            for role in self.guild.roles:
+                self.index_add(self._roles_by_name, role)
+
+        return self.index_find(self._roles_by_name, name)
+
+    def find_text_channel(self, name: str) -> Optional[TextChannel]:
+        if self._text_channels_by_name is None:
+            self._text_channels_by_name = {}
+            for channel in self.guild.text_channels:
+                self.index_add(self._text_channels_by_name, channel)
+
+        return self.index_find(self._text_channels_by_name, name)
+
+    def find_voice_channel(self, name: str) -> Optional[VoiceChannel]:
+        if self._voice_channels_by_name is None:
+            self._voice_channels_by_name = {}
+            for channel in self.guild.voice_channels:
+                self.index_add(self._voice_channels_by_name, channel)
+
+        return self.index_find(self._voice_channels_by_name, name)
+
+    async def get_webhooks(self, channel: TextChannel) -> MutableMapping[int, Webhook]:
+        # only fetched once per channel, until a webhooks update for that channel comes in
+        if channel.id not in self._webhooks:
+            self._webhooks[channel.id] = {webhook.id: webhook for webhook in await channel.webhooks()}
+
+        return self._webhooks[channel.id]
+
+    def channel_index(self, channel: GuildChannel) -> Optional[NameIndex]:
+        if isinstance(channel, TextChannel):
+            return self._text_channels_by_name
+        if isinstance(channel, VoiceChannel):
+            return self._voice_channels_by_name
+        return None
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        # compare between MEMBER_CACHE=full and lazy to see what skipping chunking saves
+        if self._reported:
+            return
+
+        self._reported = True
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+        logger.info(
+            f"Ready in {time.perf_counter() - self._started_at:.1f}s with {len(self.guild.members)} members cached "
+            f"({config.member_cache} member cache), max RSS {max_rss:.1f}MiB"
+        )
+
+    @Cog.listener()
+    async def on_interaction(self, interaction: Interaction) -> None:
+        if isinstance(interaction.user, Member):
+            self.remember(interaction.user)
+
+    @Cog.listener()
+    async def on_member_join(self, member: Member) -> None:
+        self.remember(member)
+
+    @Cog.listener()
+    async def on_member_remove(self, member: Member) -> None:
+        self._recent_members.pop(member.id, None)
+
+    @Cog.listener()
+    async def on_raw_member_remove(self, payload: RawMemberRemoveEvent) -> None:
+        if payload.guild_id == config.guild_id:
+            self.index_member_roles(payload.user.id, ())
+
+    @Cog.listener()
+    async def on_guild_role_create(self, role: Role) -> None:
+        if role.guild.id == config.guild_id:
+            self.index_add(self._roles_by_name, role)
+
+    @Cog.listener()
+    async def on_guild_role_update(self, before: Role, after: Role) -> None:
+        if after.guild.id == config.guild_id:
+            self.index_remove(self._roles_by_name, before)
+            self.index_add(self._roles_by_name, after)
+
+    @Cog.listener()
+    async def on_guild_role_delete(self, role: Role) -> None:
+        if role.guild.id == config.guild_id:
+            self.index_remove(self._roles_by_name, role)
+            if self._role_member_ids is not None:
+                self._role_member_ids.pop(role.id, None)
+
+    @Cog.listener()
+    async def on_guild_channel_create(self, channel: GuildChannel) -> None:
+        if channel.guild.id == config.guild_id:
+            self.index_add(self.channel_index(channel), channel)  # type: ignore
+
+    @Cog.listener()
+    async def on_guild_channel_update(self, before: GuildChannel, after: GuildChannel) -> None:
+        if after.guild.id == config.guild_id:
+            self.index_remove(self.channel_index(before), before)  # type: ignore
+            self.index_add(self.channel_index(after), after)  # type: ignore
+
+    @Cog.listener()
+    async def on_guild_channel_delete(self, channel: GuildChannel) -> None:
+        if channel.guild.id == config.guild_id:
+            self.index_remove(self.channel_index(channel), channel)  # type: ignore
+            self._webhooks.pop(channel.id, None)
+
+    @Cog.listener()
+    async def on_webhooks_update(self, channel: GuildChannel) -> None:
+        self._webhooks.pop(channel.id, None)
+
 
 __all__ = ["Cache"]
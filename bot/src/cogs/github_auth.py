@@ -1,37 +1,36 @@
+import asyncio
 import logging
-import time
 import uuid
 from textwrap import dedent
-from typing import MutableMapping, Optional, Tuple, Union
+from typing import Any, Mapping, Optional, Tuple, Union
 
-import requests
 from config import config
-from github import Github
 from nextcord import ButtonStyle, Interaction, Member
-from nextcord.ext import ipc
+from nextcord.ext import ipc, tasks
 from nextcord.ext.commands import Bot, Cog
 from nextcord.ui import Button, View
-from utils.access_control_decorators import is_in_server, subcommand
-from utils.database import database
+from utils.access_control_decorators import check_rate_limit, is_in_server, subcommand
+from utils.database import AUTH_FLOW_MIN_REMAINING, database
 from utils.error import send_error
 
+from shared.single_flight import SingleFlight, succeeded
+
 from .cache import Cache
-from .json_cache import JSONCache
+from .outbox import Outbox
 
 logger = logging.getLogger(__name__)
 
 
 class GithubAuth(Cog, name="GithubAuth"):
-    __slots__ = "bot", "cache", "github_auth_flows"
+    __slots__ = "bot", "cache", "callbacks", "outbox"
 
-    def __init__(self, bot: Bot, cache: Cache, json_cache: JSONCache) -> None:
+    def __init__(self, bot: Bot, cache: Cache, outbox: Outbox) -> None:
         super().__init__()
 
         self.bot = bot
         self.cache = cache
-        self.github_auth_flows = json_cache.register_cache(
-            "github_auth_flows", self.prune_auth_flows
-        )  # state -> timestamp, discord id
+        self.outbox = outbox
+        self.callbacks: SingleFlight[Union[str, Tuple[str, int]]] = SingleFlight(ttl=30, cache_if=succeeded)
 
     # convenience function: get github name from discord id
     async def get_github_name(self, discord_id: int) -> Optional[str]:
@@ -42,11 +41,12 @@ class GithubAuth(Cog, name="GithubAuth"):
         pass
 
     @subcommand(gh, description="Link with your GitHub account")
+    @check_rate_limit("gh-verify", capacity=3, per=600)
     async def verify(self, interaction: Interaction) -> None:
         if not interaction.user:
             raise RuntimeError("Interaction had no user!")
 
-        member = self.cache.guild.get_member(interaction.user.id)
+        member = await self.cache.fetch_member(interaction.user.id)
         if not member:
             raise RuntimeError("User not in AppVenture server, is permission check correct?")
 
@@ -62,14 +62,16 @@ class GithubAuth(Cog, name="GithubAuth"):
         if await self.get_github_name(member.id):
             return await send_error(interaction, "You have already linked your GitHub account!", ephemeral=True)
 
-        # generate auth flow
-        while (state := uuid.uuid4().hex) in self.github_auth_flows:
-            pass
-        
-        github_link = f"https://github.com/login/oauth/authorize?client_id={config.github_client_id}&state={state}"
+        # reuse an outstanding auth flow, otherwise generate one
+        if outstanding := database.get_outstanding_auth_flow(
+            "github", member.id, min_remaining=AUTH_FLOW_MIN_REMAINING
+        ):
+            state = str(outstanding.state)
+        else:
+            state = uuid.uuid4().hex
+            database.insert_auth_flow("github", state, member.id)
 
-        # add to pending auth flows
-        self.github_auth_flows[state] = (int(time.time()), member.id)
+        github_link = f"https://github.com/login/oauth/authorize?client_id={config.github_client_id}&state={state}"
 
         # generate message
         buttons = View()
@@ -90,10 +92,19 @@ class GithubAuth(Cog, name="GithubAuth"):
         except AttributeError:
             return "Internal IPC error, contact exco", 500
 
-        _, member_id = self.github_auth_flows.get(params.get("state", ""), (0, None))
-        if not member_id or not (github_code := params.get("code", None)):
+        return await self.handle_gh_auth_response(params)
+
+    async def handle_gh_auth_response(self, params: Mapping[str, Any]) -> Union[str, Tuple[str, int]]:
+        # users double submit or refresh the callback page, so share one exchange between identical callbacks
+        return await self.callbacks.run(params.get("state") or None, lambda: self.exchange_gh_auth_code(params))
+
+    async def exchange_gh_auth_code(self, params: Mapping[str, Any]) -> Union[str, Tuple[str, int]]:
+        auth_flow = database.get_auth_flow("github", params.get("state", ""))
+        if not auth_flow or not (github_code := params.get("code", None)):
             return "Not found in pending requests, try running <code>/gh verify</code> again", 404
 
+        import requests
+
         response = requests.post(
             "https://github.com/login/oauth/access_token",
             data={
@@ -109,14 +120,25 @@ class GithubAuth(Cog, name="GithubAuth"):
                 500,
             )
 
-        self.github_auth_flows.pop(params["state"])
+        database.delete_auth_flow(auth_flow)
 
-        # get their name
-        github_user = Github(response.json()["access_token"]).get_user()
-        github_username = github_user.login
-        github_display_name = github_user.name or github_username
+        # get their name; the token is new every time, so there is nothing a cache could reuse
+        user_response = await asyncio.to_thread(
+            requests.get,
+            "https://api.github.com/user",
+            headers={
+                "Authorization": f"Bearer {response.json()['access_token']}",
+                "Accept": "application/vnd.github+json",
+            },
+        )
+        if not user_response.ok:
+            return "Could not get your GitHub account, try running <code>/gh verify</code> again", 500
+
+        github_user = user_response.json()
+        github_username: str = github_user["login"]
+        github_display_name: str = github_user["name"] or github_username
 
-        appventure_member = self.cache.guild.get_member(member_id)
+        appventure_member = await self.cache.fetch_member(auth_flow.discord_id)  # type: ignore
         if not appventure_member:
             return "You're not in the AppVenture server, please join and try again", 400
 
@@ -125,19 +147,26 @@ class GithubAuth(Cog, name="GithubAuth"):
         return "Successfully linked with Github!"
 
     async def do_verification(self, appventure_member: Member, github_username: str, github_display_name: str) -> None:
-        database.set_github(appventure_member.id, github_username)
+        await database.write_github(appventure_member.id, github_username)
 
-        await appventure_member.send(
-            f"Your GitHub account, `{github_display_name} (@{github_username})`, is successfully linked!"
+        self.outbox.send(
+            appventure_member,
+            f"Your GitHub account, `{github_display_name} (@{github_username})`, is successfully linked!",
         )
 
-    def prune_auth_flows(self, github_auth_flows: MutableMapping[str, Tuple[int, int]]) -> None:
-        current_time = time.time()
-        current_auth_flows = github_auth_flows
-        # wrap in list to create a copy of items (we modify the dict in the loop)
-        for key, auth_flow_data in list(current_auth_flows.items()):
-            if current_time - auth_flow_data[0] >= 86400:
-                github_auth_flows.pop(key)
+    @Cog.listener()
+    async def on_connect(self) -> None:
+        if not self.prune_auth_flows.is_running():
+            self.prune_auth_flows.start()
+
+    @tasks.loop(minutes=5)
+    async def prune_auth_flows(self) -> None:
+        if pruned := database.prune_auth_flows("github"):
+            logger.info(f"Pruned {pruned} expired GitHub auth flows")
+
+    def cog_unload(self) -> None:
+        self.prune_auth_flows.cancel()
+        return super().cog_unload()
 
 
 __all__ = ["GithubAuth"]
@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+from typing import Any, List, Mapping, MutableMapping, Optional, Tuple
+from urllib.parse import urlencode
+
+from nextcord.ext.commands import Bot, Cog
+
+from .json_cache import JSONCache
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://api.github.com"
+MAX_ENTRIES = 512
+TIMEOUT = 10  # seconds
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+CacheEntry = MutableMapping[str, Any]  # etag, last_modified, expires, used, body, next
+
+
+class GithubCache(Cog):
+    # conditional GET cache for GitHub REST reads. GitHub doesn't count 304 responses against the rate limit,
+    # so revalidating with If-None-Match / If-Modified-Since is free, and within max-age we don't ask at all
+    __slots__ = "bot", "entries", "stats"
+
+    def __init__(self, bot: Bot, json_cache: JSONCache) -> None:
+        super().__init__()
+
+        self.bot = bot
+        # token hash + url -> entry; bounded, least recently used entries go first
+        self.entries: MutableMapping[str, CacheEntry] = json_cache.register_cache("github_cache", self.before_save)
+        self.stats: Counter[str] = Counter()  # hit, revalidated, miss
+
+    def before_save(self, entries: MutableMapping[str, CacheEntry]) -> None:
+        if self.stats:
+            logger.info(
+                f"GitHub cache: {self.stats['hit']} hits, {self.stats['revalidated']} revalidated, "
+                f"{self.stats['miss']} misses, {len(entries)} entries"
+            )
+
+    def evict(self) -> None:
+        while len(self.entries) > MAX_ENTRIES:
+            self.entries.pop(min(self.entries, key=lambda key: self.entries[key]["used"]))
+
+    async def get(
+        self, path_or_url: str, token: str, params: Optional[Mapping[str, Any]] = None
+    ) -> Tuple[int, Any, Optional[str]]:
+        # returns status, parsed body (None unless 200) and the url of the next page, if any
+        import requests
+
+        url = path_or_url if path_or_url.startswith("https://") else API_URL + path_or_url
+        if params:
+            url += "?" + urlencode(sorted(params.items()))
+
+        # never keep the token itself on disk
+        key = hashlib.sha256(token.encode()).hexdigest()[:16] + ":" + url
+        entry = self.entries.get(key)
+        now = time.time()
+
+        if entry and entry["expires"] > now:
+            self.stats["hit"] += 1
+            entry["used"] = now
+            return 200, entry["body"], entry["next"]
+
+        headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await asyncio.to_thread(requests.get, url, headers=headers, timeout=TIMEOUT)
+
+        max_age = MAX_AGE.search(response.headers.get("Cache-Control", ""))
+        expires = now + (int(max_age.group(1)) if max_age else 0)
+
+        if response.status_code == 304 and entry:
+            self.stats["revalidated"] += 1
+            entry.update(expires=expires, used=now)
+            return 200, entry["body"], entry["next"]
+
+        self.stats["miss"] += 1
+        if response.status_code != 200:
+            return response.status_code, None, None
+
+        entry = self.entries[key] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "expires": expires,
+            "used": now,
+            "body": response.json(),
+            "next": response.links.get("next", {}).get("url"),
+        }
+        self.evict()
+
+        return 200, entry["body"], entry["next"]
+
+    async def get_all(self, path: str, token: str, params: Optional[Mapping[str, Any]] = None) -> Tuple[int, List[Any]]:
+        # follows pagination; each page is cached on its own
+        status, page, next_url = await self.get(path, token, {"per_page": 100, **(params or {})})
+        if status != 200:
+            return status, []
+
+        result = list(page)
+        while next_url:
+            status, page, next_url = await self.get(next_url, token)
+            if status != 200:
+                return status, []
+            result.extend(page)
+
+        return 200, result
+
+
+__all__ = ["GithubCache"]
@@ -23,22 +23,28 @@ class Help(Cog):
         return self.get_commands_members() + [
             ("/members import", "Import new members from a csv (make sure to do this before new members join!)"),
             ("/members export", "Export members to a csv"),
-            ("/members refresh", "Give alumni role to members who have graduated"),
+            ("/members refresh", "Give alumni role to members who have graduated, archiving past alumni"),
             ("/members modify_year", "Modify the year of a member (retained people)"),
             ("/members leave", "Give someone guest role, removing member role"),
+            ("/roles drift", "List members whose roles don't match the member list"),
             ("/ms manual_verify", "Manually verify someone's email"),
             ("/projects create", "Create a new project"),
+            ("/projects bulk-create", "Create many projects from a csv"),
             ("/projects delete", "Delete a project"),
             ("/projects import", "Add an existing project to the database"),
             ("/projects link", "Link a project to GitHub"),
             ("/projects share", "Share project GitHub repo to members"),
             ("/projects export", "Export all projects and member assignments"),
-            ("/projects archive", "Archive a project")
+            ("/projects archive", "Archive a project"),
+            ("/projects audit", "Compare project roles with GitHub repo access"),
+            ("/projects bulk-archive", "Archive every project in a category, or a list of projects"),
+            ("/jobs list", "List recent background jobs (imports, exports, refreshes, shares)"),
+            ("/jobs status", "Show the progress of a background job"),
         ]
 
     @is_in_server(description="Get help on the commands")
     async def help(self, interaction: Interaction):
-        if not interaction.user or not (member := self.cache.guild.get_member(interaction.user.id)):
+        if not interaction.user or not (member := await self.cache.fetch_member(interaction.user.id)):
             raise RuntimeError("Interaction had invalid user!")
         
         if member.get_role(config.exco_role):
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Mapping,
+    MutableMapping,
+    MutableSequence,
+    Sequence,
+    Tuple,
+)
+
+import orjson
+from nextcord import File, HTTPException, Interaction, SlashOption, TextChannel
+from nextcord.ext.commands import Bot, Cog
+from utils.access_control_decorators import is_exco, subcommand
+from utils.database import Job, database
+from utils.error import send_error
+
+from .cache import Cache
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 2  # kept small so batch jobs never crowd out interactive commands
+PROGRESS_INTERVAL = 5  # seconds between status message edits
+
+
+class JobFailed(Exception):
+    # the message is shown to whoever queued the job
+    pass
+
+
+class JobResult:
+    __slots__ = "message", "files"
+
+    def __init__(self, message: str, files: Sequence[File] = ()) -> None:
+        self.message = message
+        self.files = files
+
+
+class JobContext:
+    __slots__ = "job", "jobs", "payload", "checkpoint", "last_progress"
+
+    def __init__(self, job: Job, jobs: "Jobs") -> None:
+        self.job = job
+        self.jobs = jobs
+        self.payload: Mapping[str, Any] = orjson.loads(job.payload)  # type: ignore
+        # whatever the job saved last time, so it can pick up where it left off after a restart
+        checkpoint = job.checkpoint
+        self.checkpoint: MutableMapping[str, Any] = orjson.loads(checkpoint) if checkpoint else {}  # type: ignore
+        self.last_progress = 0.0
+
+    async def save(self, progress: str, *, checkpoint: bool = True) -> None:
+        # without checkpoint, only the progress is written and a restart resumes from the last checkpoint
+        if checkpoint:
+            self.job.checkpoint = orjson.dumps(self.checkpoint).decode()  # type: ignore
+        self.job.progress = progress  # type: ignore
+        database.update_job(self.job)
+
+        if time.monotonic() - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = time.monotonic()
+            await self.jobs.update_status_message(self.job)
+
+        # let anything else waiting on the loop run between steps
+        await asyncio.sleep(0)
+
+
+JobHandler = Callable[[JobContext], Awaitable[JobResult]]
+
+
+class Jobs(Cog):
+    __slots__ = "bot", "cache", "handlers", "queue", "workers"
+
+    def __init__(self, bot: Bot, cache: Cache) -> None:
+        super().__init__()
+
+        self.bot = bot
+        self.cache = cache
+        self.handlers: MutableMapping[str, Tuple[JobHandler, int]] = {}  # kind -> handler, priority
+        self.queue: asyncio.PriorityQueue[Tuple[int, int]] = asyncio.PriorityQueue()  # priority, job id
+        self.workers: MutableSequence[asyncio.Task] = []
+
+    def register_handler(self, kind: str, handler: JobHandler, *, priority: int) -> None:
+        if kind in self.handlers:
+            raise ValueError(f"Job handler {kind} already registered")
+
+        self.handlers[kind] = (handler, priority)
+
+    async def enqueue(self, interaction: Interaction, kind: str, payload: Mapping[str, Any]) -> Job:
+        if not interaction.user:
+            raise RuntimeError("Interaction had no user!")
+
+        _, priority = self.handlers[kind]
+
+        # the interaction token expires after 15 minutes, so progress goes to a message we own
+        channel = interaction.channel if isinstance(interaction.channel, TextChannel) else self.cache.exco_channel
+
+        job = Job(
+            kind=kind,
+            priority=priority,
+            status="queued",
+            payload=orjson.dumps(payload).decode(),
+            channel_id=channel.id,
+            created_by=interaction.user.id,
+        )
+        database.insert_job(job)
+
+        message = await channel.send(self.format_status(job))
+        job.message_id = message.id  # type: ignore
+        database.update_job(job)
+
+        self.queue.put_nowait((priority, job.id))  # type: ignore
+        return job
+
+    def format_status(self, job: Job) -> str:
+        status = f"Job #{job.id} (`{job.kind}`): {job.status}"
+
+        if job.status == "running" and job.progress:
+            status += f" - {job.progress}"
+        if job.result:
+            status += f"\n{job.result}"
+
+        return status
+
+    async def update_status_message(self, job: Job, files: Sequence[File] = ()) -> None:
+        channel = self.bot.get_channel(job.channel_id)  # type: ignore
+        if not isinstance(channel, TextChannel) or not job.message_id:
+            return
+
+        message = channel.get_partial_message(job.message_id)  # type: ignore
+        try:
+            await message.edit(content=self.format_status(job))
+            if files:
+                await channel.send(files=list(files), reference=message)
+        except HTTPException:
+            logger.warn(f"Could not update status message of job {job.id}:", exc_info=True)
+
+    async def run_job(self, job_id: int) -> None:
+        job = database.get_job(job_id)
+        if not job or job.status not in ("queued", "running"):
+            return
+
+        if job.kind not in self.handlers:
+            job.status = "failed"  # type: ignore
+            job.result = f"Unknown job kind {job.kind}"  # type: ignore
+            database.update_job(job)
+            return await self.update_status_message(job)
+
+        handler, _ = self.handlers[job.kind]  # type: ignore
+
+        job.status = "running"  # type: ignore
+        database.update_job(job)
+        await self.update_status_message(job)
+
+        files: Sequence[File] = ()
+        try:
+            result = await handler(JobContext(job, self))
+        except JobFailed as error:
+            job.status = "failed"  # type: ignore
+            job.result = str(error)  # type: ignore
+        except Exception:
+            logger.error(f"Job {job.id} ({job.kind}) failed:", exc_info=True)
+            job.status = "failed"  # type: ignore
+            job.result = "Internal error, check logs for more info."  # type: ignore
+        else:
+            job.status = "done"  # type: ignore
+            job.result = result.message  # type: ignore
+            files = result.files
+
+        database.update_job(job)
+        await self.update_status_message(job, files)
+
+    async def worker(self) -> None:
+        while True:
+            _, job_id = await self.queue.get()
+            try:
+                await self.run_job(job_id)
+            except Exception:
+                logger.error(f"Worker failed running job {job_id}:", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        # on_ready also fires on reconnects, only start the workers once
+        if self.workers:
+            return
+
+        # resume anything that was queued or running when the bot went down
+        unfinished = database.get_unfinished_jobs()
+        for job in unfinished:
+            self.queue.put_nowait((job.priority, job.id))  # type: ignore
+
+        logger.info(f"Resuming {len(unfinished)} jobs")
+
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(WORKERS)]
+
+    def cog_unload(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        return super().cog_unload()
+
+    @is_exco()
+    async def jobs(self, _: Interaction) -> None:
+        pass
+
+    @subcommand(jobs, description="List recent background jobs", name="list")
+    async def _list(self, interaction: Interaction) -> None:
+        jobs = database.get_recent_jobs(10)
+        if not jobs:
+            return await send_error(interaction, "No jobs yet", ephemeral=True)
+
+        lines = [
+            f"#{job.id} `{job.kind}` by <@{job.created_by}>: {job.status}"
+            + (f" ({job.progress})" if job.status == "running" and job.progress else "")
+            for job in jobs
+        ]
+        await interaction.send("\n".join(lines), ephemeral=True)
+
+    @subcommand(jobs, description="Show the status of a background job")
+    async def status(
+        self,
+        interaction: Interaction,
+        *,
+        job_id: int = SlashOption(description="Job number", required=True),
+    ) -> None:
+        job = database.get_job(job_id)
+        if not job:
+            return await send_error(interaction, "Job does not exist", ephemeral=True)
+
+        await interaction.send(f"{self.format_status(job)}\nqueue depth: {self.queue.qsize()}", ephemeral=True)
+
+
+__all__ = ["Jobs", "JobContext", "JobFailed", "JobResult"]
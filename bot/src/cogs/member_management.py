@@ -1,24 +1,32 @@
 import csv
 from io import StringIO
+from typing import Optional, Tuple
 
 from config import config
 from nextcord import Attachment, File, Interaction, Member, SlashOption
 from nextcord.ext.commands import Bot, Cog
 from utils.access_control_decorators import is_exco, subcommand
+from utils.database import Member as MemberDB
 from utils.database import database
 from utils.error import send_error
+from utils.member_index import choice_name
 
 from .cache import Cache
+from .jobs import JobContext, JobFailed, JobResult, Jobs
 
 
 class MemberManagement(Cog):
-    __slots__ = "bot", "cache"
+    __slots__ = "bot", "cache", "jobs"
 
-    def __init__(self, bot: Bot, cache: Cache) -> None:
+    def __init__(self, bot: Bot, cache: Cache, jobs: Jobs) -> None:
         super().__init__()
 
         self.bot = bot
         self.cache = cache
+        self.jobs = jobs
+
+        self.jobs.register_handler("members-import", self.import_job, priority=1)
+        self.jobs.register_handler("members-refresh", self.refresh_job, priority=2)
 
     @is_exco()
     async def members(self, _: Interaction) -> None:
@@ -55,17 +63,27 @@ class MemberManagement(Cog):
             # This should never happen, but just in case
             raise ValueError("Emails and names are not the same length???")
 
+        job = await self.jobs.enqueue(
+            interaction, "members-import", {"emails": emails, "names": names, "update_existing": update_existing}
+        )
+        await interaction.send(content=f"Queued as job #{job.id}, progress will be posted in this channel.")
+
+    async def import_job(self, context: JobContext) -> JobResult:
+        # a single transaction, so there is nothing to checkpoint
+        emails, names = context.payload["emails"], context.payload["names"]
+        update_existing = context.payload["update_existing"]
+
         success = database.create_members(emails, names, update_existing)
 
         if not success:
-            await send_error(interaction, "Insertion failed, check logs for more info.")
-        else:
-            if update_existing:
-                await interaction.send(
-                    content=f"Done! Added {success[1]} new members and updated {success[2]} members."
-                )
-            else:
-                await interaction.send(content=f"Done! Added {success[1]} new members.")
+            raise JobFailed("Insertion failed, check logs for more info.")
+
+        message = f"Done! Added {success[1]} new members"
+        if update_existing:
+            message += f" and updated {success[2]} members"
+        if success[3]:
+            message += f", skipped {success[3]} archived alumni"
+        return JobResult(message + ".")
 
     @subcommand(members, description="Export non-graduated members to csv")
     async def export(
@@ -95,43 +113,81 @@ class MemberManagement(Cog):
 
         file.close()
 
-    @subcommand(members, description="Give alumni role to those graduating")
+    @subcommand(members, description="Give alumni role to those graduating and archive past alumni")
     async def refresh(self, interaction: Interaction) -> None:
-        await interaction.response.defer()
+        job = await self.jobs.enqueue(interaction, "members-refresh", {})
+        await interaction.send(content=f"Queued as job #{job.id}, progress will be posted in this channel.")
 
-        guild = self.cache.guild
+    async def refresh_job(self, context: JobContext) -> JobResult:
         alumni_role = self.cache.alumni_role
 
-        new_alumni = database.get_graduated()
-        updated = 0
-
-        for member in new_alumni:
-            discord_id = member.discord_id
-            if not (discord_id):
-                continue
+        # ordered by email, so the checkpointed position stays meaningful across restarts
+        new_alumni = list(database.get_graduated())
+        done: int = context.checkpoint.get("done", 0)
+        updated: int = context.checkpoint.get("updated", 0)
 
-            profile = guild.get_member(discord_id)  # type: ignore
+        # one batched lookup up front instead of one per member
+        profiles = {
+            profile.id: profile
+            for profile in await self.cache.fetch_members(
+                member.discord_id for member in new_alumni[done:] if member.discord_id  # type: ignore
+            )
+        }
 
-            if (not profile) or (profile.get_role(config.alumni_role)):
-                continue
+        for member in new_alumni[done:]:
+            discord_id = member.discord_id
+            profile = discord_id and profiles.get(discord_id)  # type: ignore
+
+            if profile and not profile.get_role(config.alumni_role):
+                await profile.add_roles(alumni_role)
+                updated += 1
+
+            done += 1
+            context.checkpoint.update(done=done, updated=updated)
+            await context.save(f"{done}/{len(new_alumni)} checked, {updated} graduated")
+
+        # everyone past Y6 has had their alumni role by now, so they can leave the member table
+        archived = database.archive_graduated()
+
+        return JobResult(f"Done! {updated} people graduated, {archived} alumni archived.")
+
+    async def resolve_member(
+        self, interaction: Interaction, member: Optional[Member], student: Optional[str]
+    ) -> Optional[Tuple[Optional[Member], MemberDB]]:
+        # exco can pick someone on the server, or search the members list for someone who never joined
+        if member:
+            member_db = database.get_member_by_discord_id(member.id)
+        elif student:
+            member_db = database.get_member_by_email(student)
+            if member_db and member_db.discord_id:
+                member = await self.cache.fetch_member(member_db.discord_id)  # type: ignore
+        else:
+            await send_error(interaction, "Pick a member or a student")
+            return None
 
-            await profile.add_roles(alumni_role)
-            updated += 1
+        if not member_db:
+            await send_error(interaction, "Member not found in database")
+            return None
 
-        await interaction.send(content=f"Done! {updated} people graduated.")
+        return member, member_db
 
     @subcommand(members, description="Modify a member's year (for retained people)")
     async def modify_year(
         self,
         interaction: Interaction,
         *,
-        member: Member = SlashOption(description="Member to modify", required=True),
-        year: int = SlashOption(description="Their current school year", required=True),
+        member: Optional[Member] = SlashOption(description="Member to modify", required=False),
+        year: Optional[int] = SlashOption(description="Their current school year", required=False),
+        student: Optional[str] = SlashOption(description="Student to modify, by name or email", required=False),
     ):
+        # discord wants required options before optional ones, so with member optional and first, year is checked here
+        if year is None:
+            return await send_error(interaction, "Pick their current school year")
+
         # get member in db
-        member_db = database.get_member_by_discord_id(member.id)
-        if not member_db:
-            return await send_error(interaction, "Member not found in database")
+        if not (resolved := await self.resolve_member(interaction, member, student)):
+            return
+        member, member_db = resolved
 
         if member_db.year == year:
             return await send_error(interaction, "Member is already in that year")
@@ -140,27 +196,36 @@ class MemberManagement(Cog):
 
         database.update_member(member_db)
 
-        await interaction.send(content=f"Done! {member.mention} is now in year {year}")
+        await interaction.send(content=f"Done! {member.mention if member else member_db.name} is now in year {year}")
 
     @subcommand(members, description="Change a member to guest")
     async def leave(
         self,
         interaction: Interaction,
         *,
-        member: Member = SlashOption(description="Leaving member", required=True),
+        member: Optional[Member] = SlashOption(description="Leaving member", required=False),
+        student: Optional[str] = SlashOption(description="Leaving student, by name or email", required=False),
     ):
         # get member in db
-        member_db = database.get_member_by_discord_id(member.id)
-        if not member_db:
-            return await send_error(interaction, "Member not found in database")
+        if not (resolved := await self.resolve_member(interaction, member, student)):
+            return
+        member, member_db = resolved
 
         # give guest role, remove member role
-        await member.remove_roles(self.cache.member_role)
-        await member.add_roles(self.cache.guest_role)
+        if member:
+            await member.remove_roles(self.cache.member_role)
+            await member.add_roles(self.cache.guest_role)
 
         database.delete_member(member_db)
 
-        await interaction.send(content=f"Done! {member.mention} is now a guest")
+        await interaction.send(content=f"Done! {member.mention if member else member_db.name} is now a guest")
+
+    @modify_year.on_autocomplete("student")
+    @leave.on_autocomplete("student")
+    async def autocomplete_student(self, interaction: Interaction, student: str) -> None:
+        await interaction.response.send_autocomplete(
+            {choice_name(email, name): email for email, name in database.search_members(student)}
+        )
 
 
 __all__ = ["MemberManagement"]
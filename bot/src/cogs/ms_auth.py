@@ -1,162 +1,127 @@
+import asyncio
 import logging
-import time
 import uuid
 from textwrap import dedent
-from typing import Any, Literal, MutableMapping, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Mapping, Optional, Tuple, Union
 
-import msal
-import requests
+import orjson
 from config import config
-from nextcord import ButtonStyle, Interaction, Member, SlashOption, User
-from nextcord.ext import ipc
+from nextcord import ButtonStyle, Interaction, Member, SlashOption
+from nextcord.ext import ipc, tasks
 from nextcord.ext.commands import Bot, Cog
 from nextcord.ui import Button, View
 from utils import emojis
-from utils.access_control_decorators import check_is_exco, is_in_server, subcommand
-from utils.database import database
-from utils.error import send_error, send_no_permission
-
+from utils.access_control_decorators import (
+    check_is_exco,
+    check_rate_limit,
+    is_in_server,
+    subcommand,
+)
+from utils.database import AUTH_FLOW_MIN_REMAINING, database
+from utils.error import send_error
+from utils.member_index import choice_name
+from utils.rate_limit import rate_limiter
+
+from shared.single_flight import SingleFlight, succeeded
+
+from .approvals import ApprovalAction, Approvals
 from .cache import Cache
-from .json_cache import JSONCache
-from .ui_helper import ButtonCallback, UIHelper
+from .outbox import Outbox
+
+if TYPE_CHECKING:
+    from msal import PublicClientApplication
 
 logger = logging.getLogger(__name__)
 
 
 class MSAuth(Cog, name="MSAuth"):
-    __slots__ = "application", "auth_flows", "bot", "cache", "ui_helper"
+    __slots__ = "_application", "_application_lock", "bot", "cache", "callbacks", "outbox", "approvals"
 
-    def __init__(self, bot: Bot, cache: Cache, ui_helper: UIHelper, json_cache: JSONCache) -> None:
+    def __init__(self, bot: Bot, cache: Cache, outbox: Outbox, approvals: Approvals) -> None:
         super().__init__()
 
         self.bot = bot
         self.cache = cache
-        self.ui_helper = ui_helper
+        self.outbox = outbox
+        self.approvals = approvals
+
+        self._application: Optional["PublicClientApplication"] = None
+        self._application_lock = asyncio.Lock()
+        self.callbacks: SingleFlight[Union[str, Tuple[str, int]]] = SingleFlight(ttl=30, cache_if=succeeded)
+
+        # bulk approval lets people in as guests, alumni have to be picked out one by one
+        self.approvals.register_kind(
+            "join",
+            [
+                ApprovalAction(
+                    "accept-join-alumni", "Join as Alumni", emojis.hat, ButtonStyle.green, self.accept_as_alumni
+                ),
+                ApprovalAction(
+                    "accept-join-guest", "Join as Guest", emojis.tick, ButtonStyle.green, self.accept_as_guest
+                ),
+                ApprovalAction("reject-join", "Deny", emojis.cross, ButtonStyle.red, self.reject),
+            ],
+            approve="accept-join-guest",
+            deny="reject-join",
+        )
 
-        self.application = msal.PublicClientApplication(
+    @staticmethod
+    def create_application() -> "PublicClientApplication":
+        import msal
+
+        return msal.PublicClientApplication(
             client_id=config.ms_auth_client_id,
             authority=f"https://login.microsoftonline.com/{config.ms_auth_tenant_id}",
         )
 
-        self.auth_flows = json_cache.register_cache(
-            "auth_flows", self.prune_auth_flows
-        )  # state -> timestamp, discord id, flow
-
-        self.ui_helper.register_callback("accept-join-alumni", self.accept_as_alumni_wrapper)
-        self.ui_helper.register_callback("accept-join-guest", self.accept_as_guest_wrapper)
-        self.ui_helper.register_callback("reject-join", self.reject_wrapper)
-
-    def accept_as_alumni_wrapper(self, requester_id: Any) -> ButtonCallback:
-        if not isinstance(requester_id, int):
-            raise ValueError("Invalid values passed!")
-
-        async def callback(interaction: Interaction) -> None:
-            requester = self.cache.guild.get_member(requester_id)
-            if not requester:
-                await interaction.edit(content="User no longer in server!", view=None)
-                return
-
-            if not interaction.user or isinstance(interaction.user, User):
-                raise RuntimeError("Interaction had invalid user!")
-
-            if not interaction.message:
-                raise RuntimeError("Interaction had no message?")
-
-            if not interaction.user.get_role(config.exco_role):
-                return await send_no_permission(interaction)
-
-            await interaction.edit(
-                content=f"{interaction.user.mention} has accepted {requester.mention}'s request to join as alumni.",
-                view=None,
-            )
-
-            await requester.add_roles(self.cache.alumni_role)
-
-            await requester.send(f"Welcome back to AppVenture, {requester.display_name}!")
-
-        return callback
-
-    def accept_as_guest_wrapper(self, requester_id: Any) -> ButtonCallback:
-        if not isinstance(requester_id, int):
-            raise ValueError("Invalid values passed!")
-
-        async def callback(interaction: Interaction) -> None:
-            requester = self.cache.guild.get_member(requester_id)
-            if not requester:
-                await interaction.edit(content="User no longer in server!", view=None)
-                return
-
-            if not interaction.user or isinstance(interaction.user, User):
-                raise RuntimeError("Interaction had invalid user!")
-
-            if not interaction.message:
-                raise RuntimeError("Interaction had no message?")
-
-            if not interaction.user.get_role(config.exco_role):
-                return await send_no_permission(interaction)
-
-            await interaction.edit(
-                content=f"{interaction.user.mention} has accepted {requester.mention}'s request to join as guest.",
-                view=None,
-            )
-
-            await requester.add_roles(self.cache.guest_role)
-
-            await requester.send(f"Welcome to AppVenture as a guest, {requester.display_name}!")
+    async def get_application(self) -> "PublicClientApplication":
+        # msal is slow to import and does blocking network discovery on creation, so it is set up in a thread. warmed
+        # in on_ready, but built on first use if that failed
+        async with self._application_lock:
+            if not self._application:
+                self._application = await asyncio.to_thread(self.create_application)
 
-        return callback
+        return self._application
 
-    def reject_wrapper(self, requester_id: Any) -> ButtonCallback:
-        if not isinstance(requester_id, int):
-            raise ValueError("Invalid values passed!")
+    async def accept_as_alumni(self, exco: Member, requester: Member) -> str:
+        await requester.add_roles(self.cache.alumni_role)
 
-        async def callback(interaction: Interaction) -> None:
-            requester = self.cache.guild.get_member(requester_id)
-            if not requester:
-                await interaction.edit(content="User no longer in server!", view=None)
-                return
+        self.outbox.send(requester, f"Welcome back to AppVenture, {requester.display_name}!")
 
-            if not interaction.user or isinstance(interaction.user, User):
-                raise RuntimeError("Interaction had invalid user!")
+        return f"{exco.mention} has accepted {requester.mention}'s request to join as alumni."
 
-            if not interaction.message:
-                raise RuntimeError("Interaction had no message?")
+    async def accept_as_guest(self, exco: Member, requester: Member) -> str:
+        await requester.add_roles(self.cache.guest_role)
 
-            if not interaction.user.get_role(config.exco_role):
-                return await send_no_permission(interaction)
+        self.outbox.send(requester, f"Welcome to AppVenture as a guest, {requester.display_name}!")
 
-            await interaction.edit(
-                content=f"{interaction.user.mention} has rejected {requester.mention}'s request to join the server.",
-                view=None,
-            )
+        return f"{exco.mention} has accepted {requester.mention}'s request to join as guest."
 
-            await requester.send("An exco rejected your join application.")
+    async def reject(self, exco: Member, requester: Member) -> str:
+        # they can no longer be messaged once kicked, so only kick after the message is out
+        self.outbox.send(requester, "An exco rejected your join application.", after=requester.kick)
 
-            await requester.kick()
+        return f"{exco.mention} has rejected {requester.mention}'s request to join the server."
 
-        return callback
+    async def get_ms_auth_link(self, member_id: int) -> str:
+        # hand out the same link again rather than minting a new flow each time
+        if outstanding := database.get_outstanding_auth_flow("ms", member_id, min_remaining=AUTH_FLOW_MIN_REMAINING):
+            return f"{config.ms_auth_redirect_domain}ms_auth?state={outstanding.state}"
 
-    @ipc.server.route()
-    async def get_real_ms_auth_link(self, data) -> Optional[Union[str, Literal[False]]]:
-        try:
-            state = data.state
-        except AttributeError:
-            return False
+        state = uuid.uuid4().hex
 
-        return self.auth_flows.get(state, (0, 0, {}))[2].get("auth_uri")
-
-    def get_ms_auth_link(self, member_id: int) -> str:
-        while (state := uuid.uuid4().hex) in self.auth_flows:
-            pass
-
-        auth_flow = self.application.initiate_auth_code_flow(
+        application = await self.get_application()
+        auth_flow = application.initiate_auth_code_flow(
             scopes=["User.Read"],
             redirect_uri=config.ms_auth_redirect_domain,
             state=state,
             response_mode="form_post",
         )
 
-        self.auth_flows[state] = (int(time.time()), member_id, auth_flow)
+        # the verify server redirects to auth_uri straight from the database
+        database.insert_auth_flow(
+            "ms", state, member_id, auth_uri=auth_flow["auth_uri"], flow=orjson.dumps(auth_flow).decode()
+        )
 
         return f"{config.ms_auth_redirect_domain}ms_auth?state={state}"
 
@@ -167,11 +132,21 @@ class MSAuth(Cog, name="MSAuth"):
         except AttributeError:
             return "Internal IPC error, contact exco", 500
 
-        _, member_id, auth_flow = self.auth_flows.get(params.get("state", ""), (0, 0, None))
-        if not auth_flow:
+        return await self.handle_ms_auth_response(params)
+
+    async def handle_ms_auth_response(self, params: Mapping[str, Any]) -> Union[str, Tuple[str, int]]:
+        # users double submit or refresh the callback page, so share one exchange between identical callbacks
+        return await self.callbacks.run(params.get("state") or None, lambda: self.exchange_ms_auth_code(params))
+
+    async def exchange_ms_auth_code(self, params: Mapping[str, Any]) -> Union[str, Tuple[str, int]]:
+        auth_flow = database.get_auth_flow("ms", params.get("state", ""))
+        if not auth_flow or not auth_flow.flow:
             return "Not found in pending requests, try running <code>/ms verify</code> again", 404
 
-        response = self.application.acquire_token_by_auth_code_flow(auth_flow, params)
+        member_id: int = auth_flow.discord_id  # type: ignore
+        flow = orjson.loads(auth_flow.flow)  # type: ignore
+        application = await self.get_application()
+        response = await asyncio.to_thread(application.acquire_token_by_auth_code_flow, flow, dict(params))
         if response.get("error"):
             return (
                 response.get("error_description", "Unknown Microsoft error")
@@ -179,7 +154,9 @@ class MSAuth(Cog, name="MSAuth"):
                 500,
             )
 
-        self.auth_flows.pop(params["state"])
+        database.delete_auth_flow(auth_flow)
+
+        import requests
 
         # get their email and name
         user_data = requests.get(
@@ -195,7 +172,7 @@ class MSAuth(Cog, name="MSAuth"):
         if not name:
             return "Could not get your name from Microsoft, try running <code>/ms verify</code> again", 500
 
-        appventure_member = self.cache.guild.get_member(member_id)
+        appventure_member = await self.cache.fetch_member(member_id)
         if not appventure_member:
             return "You're not in the AppVenture server, please join and try again", 400
 
@@ -207,49 +184,27 @@ class MSAuth(Cog, name="MSAuth"):
         member = database.get_member_by_email(email)
         if member:
             # is AppVenture member
-            database.set_discord(email, appventure_member.id)
+            await database.write_discord(email, appventure_member.id)
             await appventure_member.add_roles(self.cache.member_role)
-            await appventure_member.send(f"Welcome, {name}, to AppVenture!")
+            self.outbox.send(appventure_member, f"Welcome, {name}, to AppVenture!")
+        elif database.get_archived_member_by_email(email):
+            # alumni who graduated before joining the server, or who left and came back
+            await database.write_archived_discord(email, appventure_member.id)
+            await appventure_member.add_roles(self.cache.alumni_role)
+            self.outbox.send(appventure_member, f"Welcome back, {name}, to AppVenture!")
         else:
-            responses = View(timeout=None, auto_defer=False)
-            responses.add_item(
-                self.ui_helper.get_button(
-                    callback_name="accept-join-alumni",
-                    callback_args=(appventure_member.id,),
-                    label="Join as Alumni",
-                    emoji=emojis.hat,
-                    style=ButtonStyle.green,
-                )
-            )
-            responses.add_item(
-                self.ui_helper.get_button(
-                    callback_name="accept-join-guest",
-                    callback_args=(appventure_member.id,),
-                    label="Join as Guest",
-                    emoji=emojis.tick,
-                    style=ButtonStyle.green,
-                )
-            )
-            responses.add_item(
-                self.ui_helper.get_button(
-                    callback_name="reject-join",
-                    callback_args=(appventure_member.id,),
-                    label="Deny",
-                    emoji=emojis.cross,
-                    style=ButtonStyle.red,
-                )
+            self.approvals.request(
+                "join", appventure_member, (), f"{name} ({appventure_member.mention}) is requesting to join the server."
             )
-            await self.cache.exco_channel.send(
-                f"{name} ({appventure_member.mention}) is requesting to join the server.", view=responses
-            )
-            await appventure_member.send(
-                "As you're not a current AppVenture member, your join request has been forwarded to current exco."
+            self.outbox.send(
+                appventure_member,
+                "As you're not a current AppVenture member, your join request has been forwarded to current exco.",
             )
 
         await appventure_member.edit(nick=name)
 
-    def get_verify_message(self, member_id: int) -> Tuple[str, View]:
-        link = self.get_ms_auth_link(member_id)
+    async def get_verify_message(self, member_id: int) -> Tuple[str, View]:
+        link = await self.get_ms_auth_link(member_id)
 
         buttons = View()
         buttons.add_item(Button(url=link, label="Verify!", style=ButtonStyle.green))
@@ -272,20 +227,24 @@ class MSAuth(Cog, name="MSAuth"):
         if member.guild != self.cache.guild:
             return  # do nothing
 
-        message = self.get_verify_message(member.id)
+        if rate_limiter.hit(member.id, "member-join", capacity=3, per=3600):
+            return  # rejoining over and over, they already have a link
+
+        message = await self.get_verify_message(member.id)
 
-        await member.send(content=message[0], view=message[1])
+        self.outbox.send(member, message[0], view=message[1])
 
     @is_in_server()
     async def ms(self, _: Interaction) -> None:
         pass
 
     @subcommand(ms, description="Start the verification process, if you are not verified yet")
+    @check_rate_limit("ms-verify", capacity=3, per=600)
     async def verify(self, interaction: Interaction) -> None:
         if not interaction.user:
             raise RuntimeError("Interaction had no user!")
 
-        member = self.cache.guild.get_member(interaction.user.id)
+        member = await self.cache.fetch_member(interaction.user.id)
         if not member:
             raise RuntimeError("User not in AppVenture server, is permission check correct?")
 
@@ -295,7 +254,7 @@ class MSAuth(Cog, name="MSAuth"):
         ):
             return await send_error(interaction, "You are already verified!", ephemeral=True)
 
-        message = self.get_verify_message(interaction.user.id)
+        message = await self.get_verify_message(interaction.user.id)
 
         await interaction.send(content=message[0], view=message[1], ephemeral=True)
 
@@ -318,13 +277,32 @@ class MSAuth(Cog, name="MSAuth"):
 
         await interaction.send(f"Successful manual verification of {name}!", ephemeral=True)
 
-    def prune_auth_flows(self, auth_flows: MutableMapping[str, Tuple[int, int, Any]]) -> None:
-        current_time = time.time()
-        current_auth_flows: MutableMapping[str, Tuple[int, int, Any]] = auth_flows
-        # wrap in list to create a copy of items (we modify the dict in the loop)
-        for key, auth_flow_data in list(current_auth_flows.items()):
-            if current_time - auth_flow_data[0] >= 86400:
-                auth_flows.pop(key)
+    @manual_verify.on_autocomplete("email")
+    async def autocomplete_email(self, interaction: Interaction, email: str) -> None:
+        await interaction.response.send_autocomplete(
+            {choice_name(member_email, name): member_email for member_email, name in database.search_members(email)}
+        )
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        try:
+            await self.get_application()
+        except Exception:
+            logger.warn("Setting up msal failed, retrying on first use:", exc_info=True)
+
+    @Cog.listener()
+    async def on_connect(self) -> None:
+        if not self.prune_auth_flows.is_running():
+            self.prune_auth_flows.start()
+
+    @tasks.loop(minutes=5)
+    async def prune_auth_flows(self) -> None:
+        if pruned := database.prune_auth_flows("ms"):
+            logger.info(f"Pruned {pruned} expired Microsoft auth flows")
+
+    def cog_unload(self) -> None:
+        self.prune_auth_flows.cancel()
+        return super().cog_unload()
 
 
 __all__ = ["MSAuth"]
@@ -0,0 +1,214 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    List,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+    Tuple,
+)
+
+from nextcord import Forbidden, HTTPException, Member, Message, NotFound, User
+from nextcord.abc import Messageable
+from nextcord.ext import tasks
+from nextcord.ext.commands import Bot, Cog
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# interaction replies never go through here, they are tied to the interaction token and always go out first
+PRIORITY_EXCO = 0  # notifications exco has to act on
+PRIORITY_DM = 1
+
+SENDERS = 4
+PACING = (5, 5.0)  # messages per seconds, per destination; matches Discord's per-channel limit
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 2.0  # seconds, doubled on each attempt
+PRUNE_THRESHOLD = 1024  # number of destinations before idle ones are dropped
+
+BucketKey = Tuple[str, int]  # ("user" or "channel", id)
+AfterSend = Callable[[], Awaitable[Any]]
+
+
+class OutboundMessage:
+    __slots__ = "priority", "seq", "target", "kwargs", "after", "attempts", "future"
+
+    def __init__(
+        self, priority: int, seq: int, target: Messageable, kwargs: MutableMapping[str, Any], after: Optional[AfterSend]
+    ) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.target = target
+        self.kwargs = kwargs
+        self.after = after
+        self.attempts = 0
+        self.future: asyncio.Future[Optional[Message]] = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "OutboundMessage") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Destination:
+    __slots__ = "pending", "pacing", "scheduled"
+
+    def __init__(self) -> None:
+        self.pending: List[OutboundMessage] = []  # heap, by priority then order of sending
+        self.pacing = TokenBucket(*PACING)
+        self.scheduled = False  # waiting in the ready queue, being sent, or backing off
+
+
+class Outbox(Cog):
+    # messages to one destination go out one at a time and in order; destinations are served by priority
+    __slots__ = "bot", "destinations", "ready", "seq", "senders", "stats", "max_depth"
+
+    def __init__(self, bot: Bot) -> None:
+        super().__init__()
+
+        self.bot = bot
+        self.destinations: MutableMapping[BucketKey, Destination] = {}
+        self.ready: asyncio.PriorityQueue[Tuple[int, int, BucketKey]] = asyncio.PriorityQueue()  # priority, seq, key
+        self.seq = itertools.count()
+        self.senders: MutableSequence[asyncio.Task] = []
+        self.stats: Counter[str] = Counter()  # sent, retried, failed
+        self.max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(destination.pending) for destination in self.destinations.values())
+
+    def send(
+        self,
+        target: Messageable,
+        content: Optional[str] = None,
+        *,
+        priority: int = PRIORITY_DM,
+        after: Optional[AfterSend] = None,
+        **kwargs: Any,
+    ) -> "asyncio.Future[Optional[Message]]":
+        # returns immediately; the future resolves to the message, or None if it could not be sent.
+        # after runs once the message went out (or failed), for things that must not happen before it
+        kwargs["content"] = content
+        kind = "user" if isinstance(target, (Member, User)) else "channel"
+        key: BucketKey = (kind, target.id)  # type: ignore
+
+        if key not in self.destinations and len(self.destinations) >= PRUNE_THRESHOLD:
+            self.prune()
+        destination = self.destinations.setdefault(key, Destination())
+
+        message = OutboundMessage(priority, next(self.seq), target, kwargs, after)
+        heapq.heappush(destination.pending, message)
+
+        self.max_depth = max(self.max_depth, self.depth)
+        self.schedule(key)
+
+        return message.future
+
+    def schedule(self, key: BucketKey, *, force: bool = False) -> None:
+        destination = self.destinations[key]
+        if not destination.pending or (destination.scheduled and not force):
+            return
+
+        destination.scheduled = True
+
+        if delay := destination.pacing.take(time.monotonic()):
+            asyncio.get_running_loop().call_later(delay, functools.partial(self.schedule, key, force=True))
+            return
+
+        head = destination.pending[0]
+        self.ready.put_nowait((head.priority, head.seq, key))
+
+    def prune(self) -> None:
+        now = time.monotonic()
+
+        # wrap in list to create a copy of items (we modify the dict in the loop)
+        for key, destination in list(self.destinations.items()):
+            destination.pacing.refill(now)
+            if not destination.scheduled and destination.pacing.tokens >= destination.pacing.capacity:
+                self.destinations.pop(key)
+
+    async def deliver(self, key: BucketKey) -> None:
+        destination = self.destinations[key]
+        message = heapq.heappop(destination.pending)
+        message.attempts += 1
+
+        try:
+            sent: Optional[Message] = await message.target.send(**message.kwargs)
+        except (Forbidden, NotFound):
+            # DMs closed or the channel is gone, retrying will not help
+            logger.warn(f"Could not send message to {key}:", exc_info=True)
+            sent = None
+        except HTTPException as error:
+            if error.status >= 500 and message.attempts < MAX_ATTEMPTS:
+                self.stats["retried"] += 1
+                heapq.heappush(destination.pending, message)
+                backoff = RETRY_BACKOFF * 2 ** (message.attempts - 1)
+                asyncio.get_running_loop().call_later(backoff, functools.partial(self.schedule, key, force=True))
+                return
+
+            logger.warn(f"Could not send message to {key} after {message.attempts} attempts:", exc_info=True)
+            sent = None
+        except Exception:
+            # anything else, like bad arguments or a dropped connection, still has to resolve the future and run after
+            logger.error(f"Sending message to {key} failed:", exc_info=True)
+            sent = None
+
+        self.stats["sent" if sent else "failed"] += 1
+        message.future.set_result(sent)
+
+        destination.scheduled = False
+        self.schedule(key)
+
+        if message.after:
+            try:
+                await message.after()
+            except Exception:
+                logger.error(f"Action after message to {key} failed:", exc_info=True)
+
+    async def sender(self) -> None:
+        while True:
+            _, _, key = await self.ready.get()
+            try:
+                await self.deliver(key)
+            except Exception:
+                logger.error(f"Sender failed delivering to {key}:", exc_info=True)
+                self.destinations[key].scheduled = False
+                self.schedule(key)
+            finally:
+                self.ready.task_done()
+
+    @tasks.loop(minutes=1)
+    async def report(self) -> None:
+        if not self.max_depth:
+            return
+
+        logger.info(
+            f"Outbox: {self.depth} queued (max {self.max_depth} in the last minute), "
+            f"{self.stats['sent']} sent, {self.stats['retried']} retried, {self.stats['failed']} failed"
+        )
+        self.max_depth = self.depth
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        # on_ready also fires on reconnects, only start the senders once
+        if self.senders:
+            return
+
+        self.senders = [asyncio.create_task(self.sender()) for _ in range(SENDERS)]
+        self.report.start()
+
+    def cog_unload(self) -> None:
+        for sender in self.senders:
+            sender.cancel()
+        self.report.cancel()
+        return super().cog_unload()
+
+
+__all__ = ["Outbox", "PRIORITY_EXCO", "PRIORITY_DM"]
@@ -1,11 +1,12 @@
+import asyncio
 import csv
 from io import StringIO
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Coroutine, List, MutableMapping, Optional, Set, Tuple, Union
 import logging
 
 from config import config
-from github import Github, UnknownObjectException
 from nextcord import (
+    Attachment,
     CategoryChannel,
     File,
     Interaction,
@@ -15,30 +16,117 @@ from nextcord import (
     SlashOption,
     TextChannel,
     VoiceChannel,
+    Webhook,
 )
 from nextcord.ext.commands import Bot, Cog
 from utils.access_control_decorators import is_exco, subcommand
+from utils.batch import run_batch
 from utils.database import Project, database, Github as GithubDB
 from utils.error import send_error
+from utils.org_snapshot import OrgSnapshot, Snapshot
+from utils.provisioning import Provisioner, StepFailed, StepResults
 
 from .cache import Cache
 from .github_auth import GithubAuth
+from .github_cache import GithubCache
+from .jobs import JobContext, JobFailed, JobResult, Jobs
 from .ui_helper import UIHelper
 
+if TYPE_CHECKING:
+    from github import Github
+    from github.Hook import Hook
+    from github.Organization import Organization
+    from github.Repository import Repository
+
 logger = logging.getLogger(__name__)
 
-class Projects(Cog):
-    __slots__ = "bot", "cache", "ui_helper", "ci", "org", "github_auth"
+SNAPSHOT_TTL = 600  # seconds
+EXPORT_CHECKPOINT_INTERVAL = 20  # projects between export checkpoints
+
+
+def parse_bool(value: Optional[str], *, default: bool) -> bool:
+    if not value or not value.strip():
+        return default
+
+    return value.strip().lower() in ("1", "true", "yes", "y")
 
-    def __init__(self, bot: Bot, cache: Cache, ui_helper: UIHelper, github_auth: GithubAuth) -> None:
+
+class Projects(Cog):
+    __slots__ = (
+        "bot",
+        "cache",
+        "ui_helper",
+        "_ci",
+        "_org",
+        "github_auth",
+        "github_cache",
+        "github_semaphore",
+        "jobs",
+        "org_snapshot",
+        "snapshot_seeded_at",
+    )
+
+    def __init__(
+        self,
+        bot: Bot,
+        cache: Cache,
+        ui_helper: UIHelper,
+        github_auth: GithubAuth,
+        github_cache: GithubCache,
+        jobs: Jobs,
+    ) -> None:
         super().__init__()
 
         self.bot = bot
         self.cache = cache
         self.ui_helper = ui_helper
-        self.ci = Github(config.github_token)
-        self.org = self.ci.get_organization("appventure-nush")
+        self._ci: Optional["Github"] = None
+        self._org: Optional["Organization"] = None
         self.github_auth = github_auth
+        self.github_cache = github_cache
+        self.org_snapshot = OrgSnapshot(config.github_token, "appventure-nush", ttl=SNAPSHOT_TTL)
+        self.snapshot_seeded_at = 0.0
+        # GitHub's secondary rate limits punish bursts of content creation, so cap concurrent calls
+        self.github_semaphore = asyncio.Semaphore(2)
+        self.jobs = jobs
+
+        self.jobs.register_handler("project-share", self.share_job, priority=2)
+        self.jobs.register_handler("project-export", self.export_job, priority=3)
+
+    @property
+    def ci(self) -> "Github":
+        # PyGithub is slow to import, so only load it once a project command needs it
+        if not self._ci:
+            from github import Github
+
+            self._ci = Github(config.github_token)
+
+        return self._ci
+
+    @property
+    def org(self) -> "Organization":
+        if not self._org:
+            self._org = self.ci.get_organization("appventure-nush")
+
+        return self._org
+
+    async def load_snapshot(self) -> Snapshot:
+        snapshot = await self.org_snapshot.get()
+
+        # a fresh snapshot also catches anything the webhooks missed
+        if self.org_snapshot.fetched_at != self.snapshot_seeded_at:
+            self.snapshot_seeded_at = self.org_snapshot.fetched_at
+            database.replace_repo_collaborators(snapshot)
+
+        return snapshot
+
+    async def get_collaborators(self, repo_name: str) -> Optional[Set[str]]:
+        # lowercased logins of direct collaborators, or None if the repo does not exist. served from the index the
+        # GitHub webhooks keep current; repos it doesn't know yet are filled in from one snapshot of the whole org
+        if (collaborators := database.get_repo_collaborators(repo_name)) is not None:
+            return collaborators
+
+        return (await self.load_snapshot()).get(repo_name.lower())
 
     @is_exco()
     async def project(self, _: Interaction) -> None:
@@ -65,59 +153,208 @@ class Projects(Cog):
         if database.get_project(project_name):
             return await send_error(interaction, "Project already exists")
 
+        provisioner = self.get_provisioner(category, project_name, with_github, with_voice)
+        try:
+            results = await provisioner.run()
+        except StepFailed as error:
+            logger.warn(f"Creating project {project_name} failed, rolled back:", exc_info=error.error)
+            return await send_error(
+                interaction, f"Project creation failed at `{error.step}` ({error.error}), everything was rolled back"
+            )
+
+        if with_github:
+            await results["text_channel"].send(f"Linked with `{results['repo'].full_name}`!")
+
+        await interaction.send(f"Project created successfully! ({provisioner.format_timings()})")
+
+    def get_provisioner(
+        self, category: CategoryChannel, project_name: str, with_github: bool, with_voice: bool
+    ) -> Provisioner:
+        # independent steps run concurrently, e.g. the repo is created alongside the role and channels
         guild = self.cache.guild
-        project_role = await guild.create_role(name=project_name, permissions=guild.default_role.permissions)
         deny_all = PermissionOverwrite.from_pair(allow=Permissions.none(), deny=Permissions(view_channel=False))
         channel_overrides = PermissionOverwrite.from_pair(allow=Permissions(view_channel=True), deny=Permissions.none())
 
-        project_text_channel = await guild.create_text_channel(
-            project_name,
-            category=category,
-            overwrites={guild.default_role: deny_all, project_role: channel_overrides},
-        )
+        provisioner = Provisioner()
 
-        project = Project(
-            name=project_name,
-            discord_role_id=project_role.id,
-            discord_text_channel_id=project_text_channel.id,
-        )
+        async def create_role(_: StepResults) -> Role:
+            return await guild.create_role(name=project_name, permissions=guild.default_role.permissions)
 
-        if with_voice:
-            project_voice_channel = await guild.create_voice_channel(
-                f"{project_role}-voice",
+        async def create_text_channel(results: StepResults) -> TextChannel:
+            return await guild.create_text_channel(
+                project_name,
                 category=category,
-                overwrites={guild.default_role: deny_all, project_role: channel_overrides},
+                overwrites={guild.default_role: deny_all, results["role"]: channel_overrides},
             )
 
-            project.discord_voice_channel_id = project_voice_channel.id  # type: ignore
+        async def create_voice_channel(results: StepResults) -> VoiceChannel:
+            return await guild.create_voice_channel(
+                f"{project_name}-voice",
+                category=category,
+                overwrites={guild.default_role: deny_all, results["role"]: channel_overrides},
+            )
 
-        if with_github:
-            # make github repo and attach webhook
-            repo = self.org.create_repo(project_name, private=True)
+        async def delete_discord_object(discord_object: Union[Role, TextChannel, VoiceChannel, Webhook]) -> None:
+            await discord_object.delete()
+
+        provisioner.add_step("role", create_role, undo=delete_discord_object)
+        provisioner.add_step("text_channel", create_text_channel, undo=delete_discord_object, depends_on=["role"])
+        if with_voice:
+            provisioner.add_step("voice_channel", create_voice_channel, undo=delete_discord_object, depends_on=["role"])
 
-            discord_webhook = await project_text_channel.create_webhook(
-                name=f"GitHub Updates (appventure-nush/{project_name})"
+        if with_github:
+            # PyGithub is blocking, keep it off the event loop
+            async def create_repo(_: StepResults) -> "Repository":
+                async with self.github_semaphore:
+                    return await asyncio.to_thread(lambda: self.org.create_repo(project_name, private=True))
+
+            async def delete_repo(repo: "Repository") -> None:
+                async with self.github_semaphore:
+                    await asyncio.to_thread(repo.delete)
+
+            async def create_discord_webhook(results: StepResults) -> Webhook:
+                return await results["text_channel"].create_webhook(
+                    name=f"GitHub Updates (appventure-nush/{project_name})"
+                )
+
+            async def create_github_webhook(results: StepResults) -> "Hook":
+                async with self.github_semaphore:
+                    return await asyncio.to_thread(
+                        results["repo"].create_hook,
+                        "web",
+                        {
+                            "url": f"{results['discord_webhook'].url}/github",
+                            "content_type": "json",
+                        },
+                        events=["push", "pull_request", "pull_request_review", "pull_request_review_comment"],
+                        active=True,
+                    )
+
+            async def delete_github_webhook(hook: "Hook") -> None:
+                async with self.github_semaphore:
+                    await asyncio.to_thread(hook.delete)
+
+            provisioner.add_step("repo", create_repo, undo=delete_repo)
+            provisioner.add_step(
+                "discord_webhook", create_discord_webhook, undo=delete_discord_object, depends_on=["text_channel"]
             )
-            webhook_url = f"{discord_webhook.url}/github"
-            github_webhook = repo.create_hook(
-                "web",
-                {
-                    "url": webhook_url,
-                    "content_type": "json",
-                },
-                events=["push", "pull_request", "pull_request_review", "pull_request_review_comment"],
-                active=True,
+            provisioner.add_step(
+                "github_webhook",
+                create_github_webhook,
+                undo=delete_github_webhook,
+                depends_on=["repo", "discord_webhook"],
             )
 
-            await project_text_channel.send(f"Linked with `{repo.full_name}`!")
+        async def insert_project(results: StepResults) -> Project:
+            project = Project(
+                name=project_name,
+                discord_role_id=results["role"].id,
+                discord_text_channel_id=results["text_channel"].id,
+            )
 
-            project.github_repo = repo.name  # type: ignore
-            project.webhook_id = discord_webhook.id  # type: ignore
-            project.github_webhook_id = github_webhook.id  # type: ignore
+            if with_voice:
+                project.discord_voice_channel_id = results["voice_channel"].id  # type: ignore
 
-        database.insert_project(project)
+            if with_github:
+                project.github_repo = results["repo"].name  # type: ignore
+                project.webhook_id = results["discord_webhook"].id  # type: ignore
+                project.github_webhook_id = results["github_webhook"].id  # type: ignore
+
+            database.insert_project(project)
+            return project
+
+        async def delete_project(project: Project) -> None:
+            database.delete_project(project)
 
-        await interaction.send("Project created successfully!")
+        provisioner.add_step("project", insert_project, undo=delete_project, depends_on=list(provisioner.steps))
+
+        return provisioner
+
+    @subcommand(project, description="Create projects from a csv", name="bulk-create")
+    async def bulk_create(
+        self,
+        interaction: Interaction,
+        *,
+        projects: Attachment = SlashOption(
+            description='Projects to create, "name", "category", and optionally "with_github" and "with_voice"'
+        ),
+    ) -> None:
+        await interaction.response.defer()
+
+        try:
+            content = (await projects.read()).decode("utf-8")
+        except UnicodeDecodeError:
+            return await send_error(interaction, "Could not decode, is the file in UTF-8?")
+
+        guild = self.cache.guild
+        categories = {category.name.lower(): category for category in guild.categories}
+        categories.update({str(category.id): category for category in guild.categories})
+
+        # name -> category, with_github, with_voice
+        to_create: MutableMapping[str, Tuple[CategoryChannel, bool, bool]] = {}
+        report: List[Tuple[str, str, str]] = []  # name, status, details
+
+        # line 1 is the header
+        for row_num, row in enumerate(csv.DictReader(StringIO(content)), start=2):
+            if not row.get("name", None) or not row.get("category", None):
+                return await send_error(
+                    interaction, f"Invalid row on line {row_num}, are the values (`name`, `category`) correct?"
+                )
+
+            project_name = row["name"].strip().lower().replace(" ", "-")
+            category = categories.get(row["category"].strip().lower())
+
+            if not category:
+                report.append((project_name, "failed", f"category {row['category']} not found"))
+            elif project_name in to_create:
+                report.append((project_name, "failed", "duplicate row"))
+            else:
+                to_create[project_name] = (
+                    category,
+                    parse_bool(row.get("with_github", None), default=True),
+                    parse_bool(row.get("with_voice", None), default=True),
+                )
+
+        # checked against every name in the file at once
+        for existing in database.get_projects_by_names(to_create):
+            to_create.pop(str(existing.name))
+            report.append((str(existing.name), "failed", "project already exists"))
+
+        async def on_progress(done: int, total: int) -> None:
+            await interaction.edit_original_message(content=f"Creating projects... ({done}/{total})")
+
+        async def create_one(item: Tuple[str, Tuple[CategoryChannel, bool, bool]]) -> Tuple[str, Provisioner]:
+            project_name, (category, with_github, with_voice) = item
+            provisioner = self.get_provisioner(category, project_name, with_github, with_voice)
+            results = await provisioner.run()
+
+            if with_github:
+                await results["text_channel"].send(f"Linked with `{results['repo'].full_name}`!")
+
+            return project_name, provisioner
+
+        # each project already runs its own steps concurrently, so keep the number of projects in flight small
+        outcomes = await run_batch(list(to_create.items()), create_one, concurrency=3, on_progress=on_progress)
+
+        for project_name, outcome in zip(to_create, outcomes):
+            if isinstance(outcome, StepFailed):
+                report.append((project_name, "failed", f"{outcome.step}: {outcome.error} (rolled back)"))
+            elif isinstance(outcome, Exception):
+                report.append((project_name, "failed", str(outcome)))
+            else:
+                report.append((project_name, "created", outcome[1].format_timings()))
+
+        report_file = StringIO()
+        report_writer = csv.writer(report_file)
+        report_writer.writerow(["project", "status", "details"])
+        report_writer.writerows(report)
+        report_file.seek(0)
+
+        created = sum(status == "created" for _, status, _ in report)
+        await interaction.edit_original_message(content=f"Done! Created {created} of {len(report)} projects.")
+        await interaction.send(file=File(fp=report_file, filename="bulk_create.csv"))  # type: ignore
+
+        report_file.close()
 
     @subcommand(project, description="Delete a project")
     async def delete(
@@ -141,30 +378,55 @@ class Projects(Cog):
             await interaction.send("Project deleted successfully!")
             return
 
+        await interaction.response.defer()
+
+        if errors := await self.teardown_project(project):
+            return await send_error(interaction, f"Project deleted, but could not remove: {', '.join(errors)}")
+
+        await interaction.send("Project deleted successfully!")
+
+    async def teardown_project(self, project: Project) -> List[str]:
+        # everything is independent, so delete it all at once; returns what could not be deleted
         guild = self.cache.guild
+        teardown: List[Tuple[str, Coroutine[Any, Any, None]]] = []
 
-        project_role = guild.get_role(project.discord_role_id)  # type: ignore
-        if project_role:
-            await project_role.delete()
+        if project_role := guild.get_role(project.discord_role_id):  # type: ignore
+            teardown.append(("role", project_role.delete()))
 
-        project_text_channel = guild.get_channel(project.discord_text_channel_id)  # type: ignore
-        if project_text_channel:
-            await project_text_channel.delete()
+        if project_text_channel := guild.get_channel(project.discord_text_channel_id):  # type: ignore
+            teardown.append(("text channel", project_text_channel.delete()))
 
         if project.discord_voice_channel_id:
-            project_voice_channel = guild.get_channel(project.discord_voice_channel_id)  # type: ignore
-            if project_voice_channel:
-                await project_voice_channel.delete()
+            if project_voice_channel := guild.get_channel(project.discord_voice_channel_id):  # type: ignore
+                teardown.append(("voice channel", project_voice_channel.delete()))
 
         if project.github_repo and project.github_webhook_id:
+            teardown.append(("GitHub webhook", self.delete_github_webhook(project)))
+
+        outcomes = await asyncio.gather(*(coroutine for _, coroutine in teardown), return_exceptions=True)
+
+        errors = []
+        for (name, _), outcome in zip(teardown, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warn(f"Could not delete {name} of project {project.name}:", exc_info=outcome)
+                errors.append(name)
+
+        return errors
+
+    async def delete_github_webhook(self, project: Project) -> None:
+        from github import UnknownObjectException
+
+        def delete() -> None:
             try:
-                repo = self.org.get_repo(project.github_repo)  # type: ignore
-                hook = repo.get_hook(project.github_webhook_id)  # type: ignore
+                old_repo = self.org.get_repo(project.github_repo)  # type: ignore
+                hook = old_repo.get_hook(project.github_webhook_id)  # type: ignore
                 hook.delete()
             except UnknownObjectException:
                 logging.warn(f"GitHub repo {project.github_repo} not found")
 
-        await interaction.send("Project deleted successfully!")
+        # PyGithub is blocking, keep it off the event loop
+        async with self.github_semaphore:
+            await asyncio.to_thread(delete)
 
     @subcommand(project, description="Link existing project", name="import")
     async def _import(
@@ -188,35 +450,19 @@ class Projects(Cog):
         if project:
             return await send_error(interaction, "Project already exists")
 
-        guild = self.cache.guild
-        _project_role = project_role
-        if not _project_role:
-            for role in guild.roles:
-                if role.name == project_name:
-                    _project_role = role
-                    break
+        _project_role = project_role or self.cache.find_role(project_name)
 
         if not _project_role:
             return await send_error(interaction, "Project role does not exist")
 
-        _project_text_channel = project_text_channel
-        if not _project_text_channel:
-            for channel in guild.text_channels:
-                if channel.name == project_name and isinstance(channel, TextChannel):
-                    _project_text_channel = channel
-                    break
+        _project_text_channel = project_text_channel or self.cache.find_text_channel(project_name)
 
         if not _project_text_channel:
             return await send_error(
                 interaction, "Project text channel does not exist, or the channel is not a text channel"
             )
 
-        _project_voice_channel = project_voice_channel
-        if not _project_voice_channel:
-            for channel in guild.voice_channels:
-                if channel.name == f"{project_name}-voice" and isinstance(channel, VoiceChannel):
-                    _project_voice_channel = channel
-                    break
+        _project_voice_channel = project_voice_channel or self.cache.find_voice_channel(f"{project_name}-voice")
 
         if not _project_voice_channel:
             return await send_error(
@@ -256,10 +502,16 @@ class Projects(Cog):
         if not force and project.github_repo:
             return await send_error(interaction, "Project already linked to GitHub repo")
 
-        try:
-            repo = self.org.get_repo(github_repo)
-        except UnknownObjectException:
+        status, repo_data, _ = await self.github_cache.get(f"/repos/appventure-nush/{github_repo}", config.github_token)
+        if status == 404:
             return await send_error(interaction, "GitHub repo does not exist")
+        if status != 200:
+            return await send_error(interaction, f"GitHub returned {status}, try again later")
+
+        from github import UnknownObjectException
+
+        # only writes from here on, which the cache can't help with
+        repo = self.ci.get_repo(repo_data["full_name"], lazy=True)
 
         project_text_channel = self.cache.guild.get_channel(project.discord_text_channel_id)  # type: ignore
         if not project_text_channel:
@@ -271,20 +523,17 @@ class Projects(Cog):
         if force and project.github_repo:
             # delete old webhooks
             try:
-                repo = self.org.get_repo(project.github_repo)  # type: ignore
-                hook = repo.get_hook(project.github_webhook_id)  # type: ignore
+                old_repo = self.org.get_repo(project.github_repo)  # type: ignore
+                hook = old_repo.get_hook(project.github_webhook_id)  # type: ignore
                 hook.delete()
             except UnknownObjectException:
                 logging.warn(f"Old GitHub repo {project.github_repo} not found")
 
-            for webhook in await project_text_channel.webhooks():
-                if webhook.id == project.webhook_id:
-                    await webhook.delete()
-                    break
+            webhooks = await self.cache.get_webhooks(project_text_channel)
+            if webhook := webhooks.get(project.webhook_id):  # type: ignore
+                await webhook.delete()
 
-        discord_webhook = await project_text_channel.create_webhook(
-            name=f"GitHub Updates (appventure-nush/{repo.name})"
-        )
+        discord_webhook = await project_text_channel.create_webhook(name=f"GitHub Updates ({repo_data['full_name']})")
         webhook_url = f"{discord_webhook.url}/github"
         github_webhook = repo.create_hook(
             "web",
@@ -296,9 +545,9 @@ class Projects(Cog):
             active=True,
         )
 
-        await project_text_channel.send(f"Linked with `{repo.full_name}`!")
+        await project_text_channel.send(f"Linked with `{repo_data['full_name']}`!")
 
-        project.github_repo = repo.name  # type: ignore
+        project.github_repo = repo_data["name"]
         project.webhook_id = discord_webhook.id  # type: ignore
         project.github_webhook_id = github_webhook.id  # type: ignore
 
@@ -315,8 +564,6 @@ class Projects(Cog):
     ) -> None:
         project_name = project_name.lower().replace(" ", "-")
 
-        await interaction.response.defer()
-
         project = database.get_project(project_name)
 
         if not project:
@@ -325,19 +572,28 @@ class Projects(Cog):
         if not project.github_repo:
             return await send_error(interaction, "Project not linked to GitHub repo")
 
-        try:
-            repo = self.org.get_repo(project.github_repo)  # type: ignore
-        except UnknownObjectException:
-            return await send_error(interaction, "GitHub repo link broken; please re-link project")
+        job = await self.jobs.enqueue(interaction, "project-share", {"project_name": project_name})
+        await interaction.send(f"Queued as job #{job.id}, progress will be posted in this channel.")
+
+    async def share_job(self, context: JobContext) -> JobResult:
+        project = database.get_project(context.payload["project_name"])
+        if not project or not project.github_repo:
+            raise JobFailed("Project no longer exists or is no longer linked to GitHub")
+
+        collaborators = await self.get_collaborators(project.github_repo)  # type: ignore
+        if collaborators is None:
+            raise JobFailed("GitHub repo link broken; please re-link project")
+
+        from github import UnknownObjectException
 
         role = self.cache.guild.get_role(project.discord_role_id)  # type: ignore
         if not role:
-            return await send_error(interaction, "Project role not found")
+            raise JobFailed("Project role not found")
 
-        members = role.members
-        github_accounts: list[tuple[GithubDB, str]] = []
-        no_github: list[str] = []
-        invalid_github: list[str] = []
+        members = await self.cache.role_members(role)
+        github_accounts: List[Tuple[GithubDB, str]] = []
+        no_github: List[str] = []
+        invalid_github: List[str] = context.checkpoint.get("invalid_github", [])
 
         for member in members:
             github = database.get_github(member.id)  # type: ignore
@@ -346,73 +602,161 @@ class Projects(Cog):
                 continue
             github_accounts.append((github, member.display_name))
 
-        contributors = [contributor.login for contributor in repo.get_contributors()]
+        repo = None
         for github in list(github_accounts):
-            if github[0].github in contributors:
+            if str(github[0].github).lower() in collaborators:
                 github_accounts.remove(github)
                 continue
 
-            # attempt to add to repo
+            # we already know the repo exists, so skip fetching it
+            if not repo:
+                repo = self.ci.get_repo(f"appventure-nush/{project.github_repo}", lazy=True)
+
+            # attempt to add to repo; they show up in the collaborator index once they accept the invitation
             try:
-                repo.add_to_collaborators(github[0].github, permission="maintain") # type: ignore
+                await asyncio.to_thread(
+                    repo.add_to_collaborators, github[0].github, permission="maintain"  # type: ignore
+                )
             except UnknownObjectException:
                 # github name is invalid, we dissociate the discord id
                 github_accounts.remove(github)
                 invalid_github.append(github[1])
                 database.delete_github(github[0])
 
+            # re-adding collaborators is harmless, so only the invalid accounts need to survive a restart
+            context.checkpoint["invalid_github"] = invalid_github
+            await context.save(f"shared with {github[0].github}")
+
         github_names_str = 'no members' if not len(github_accounts) else '```' + ', '.join(map(lambda github: str(github[0].github), github_accounts)) + '```'
         no_github_str = '' if not len(no_github) else 'no GitHub linked: ```' + ', '.join(no_github) + '```'
         invalid_github_str = '' if not len(invalid_github) else 'invalid GitHub usernames: ```' + ', '.join(invalid_github) + '``` - please reverify'
         error_str = ', '.join(filter(None, [no_github_str, invalid_github_str]))
 
-        await interaction.send(f"Project shared to {github_names_str} {f'({error_str})' if error_str else ''}")
+        return JobResult(f"Project shared to {github_names_str} {f'({error_str})' if error_str else ''}")
 
     @subcommand(project, description="Export all projects and member assignments")
     async def export(self, interaction: Interaction) -> None:
+        job = await self.jobs.enqueue(interaction, "project-export", {})
+        await interaction.send(f"Queued as job #{job.id}, progress will be posted in this channel.")
+
+    async def export_job(self, context: JobContext) -> JobResult:
         guild = self.cache.guild
 
-        await interaction.response.defer()
+        # sorted by name, so the checkpointed position stays meaningful across restarts
+        projects = sorted(database.get_projects(), key=lambda project: str(project.name))
+        done: int = context.checkpoint.get("done", 0)
+        project_rows: List[List[Any]] = context.checkpoint.get("project_rows", [])
+        member_rows: List[List[Any]] = context.checkpoint.get("member_rows", [])
+        # a single pass over the guild rather than one per project role
+        guild_members = await self.cache.all_members()
+
+        for project in projects[done:]:
+            project_role = guild.get_role(project.discord_role_id)  # type: ignore
+            if project_role:
+                collaborators: Set[str] = set()
+                if project.github_repo:
+                    repo_collaborators = await self.get_collaborators(project.github_repo)  # type: ignore
+                    if repo_collaborators is None:
+                        logging.warn(f"GitHub repo {project.github_repo} not found, cannot get members in GitHub")
+                    else:
+                        collaborators = repo_collaborators
+
+                for member in [member for member in guild_members if member.get_role(project_role.id)]:
+                    # check if member in github
+                    github_name = await self.github_auth.get_github_name(member.id)
+                    in_github = bool(github_name) and github_name.lower() in collaborators  # type: ignore
+                    member_rows.append([project.name, member.display_name, in_github])
+            else:
+                logging.warn(f"Project role {project.discord_role_id} not found, cannot list members")
+
+            project_rows.append([project.name, project.github_repo])
+
+            done += 1
+            context.checkpoint.update(done=done, project_rows=project_rows, member_rows=member_rows)
+            # the checkpoint holds every row so far, so writing it after each project would be quadratic
+            await context.save(f"{done}/{len(projects)} projects", checkpoint=done % EXPORT_CHECKPOINT_INTERVAL == 0)
 
         projects_file = StringIO()
         projects_writer = csv.writer(projects_file)
         projects_writer.writerow(["project-name", "github-name"])
+        projects_writer.writerows(project_rows)
 
         members_file = StringIO()
         members_writer = csv.writer(members_file)
         members_writer.writerow(["project", "member", "in-github"])
+        members_writer.writerows(member_rows)
 
-        projects = database.get_projects()
+        projects_file.seek(0)
+        members_file.seek(0)
 
-        for project in projects:
-            project_role = guild.get_role(project.discord_role_id)  # type: ignore
-            if project_role:
-                for member in project_role.members:
-                    # check if member in github
-                    in_github = False
-                    if project.github_repo:
-                        try:
-                            repo = self.org.get_repo(project.github_repo)  # type: ignore
-                            contributor_names = [
-                                contributor.login for contributor in repo.get_contributors()
-                            ]
-                            in_github = (await self.github_auth.get_github_name(member.id)) in contributor_names
-                        except UnknownObjectException:   # type: ignore
-                            logging.warn(f"GitHub repo {project.github_repo} not found, cannot get members in GitHub")
-
-                    members_writer.writerow([project.name, member.display_name, in_github])
-            else:
-                logging.warn(f"Project role {project.discord_role_id} not found, cannot list members")
+        return JobResult(
+            f"Here you go! ({len(projects)} projects)",
+            [
+                File(fp=projects_file, filename="projects.csv"),  # type: ignore
+                File(fp=members_file, filename="project_members.csv"),  # type: ignore
+            ],
+        )
 
-            projects_writer.writerow([project.name, project.github_repo])
+    @subcommand(project, description="Compare project roles with GitHub repo access")
+    async def audit(self, interaction: Interaction) -> None:
+        await interaction.response.defer()
 
-        projects_file.seek(0)
-        members_file.seek(0)
+        snapshot = await self.load_snapshot()
+        logins = {int(github.discord_id): str(github.github).lower() for github in database.get_githubs()}
+        discord_ids = {login: discord_id for discord_id, login in logins.items()}
+
+        guild_members = await self.cache.all_members()
+
+        lines = []
+        for project in sorted(database.get_projects(), key=lambda project: str(project.name)):
+            if not project.github_repo:
+                continue
+
+            collaborators = snapshot.get(str(project.github_repo).lower())
+            if collaborators is None:
+                lines.append(f"**{project.name}**: repo `{project.github_repo}` not found")
+                continue
+
+            role = self.cache.guild.get_role(project.discord_role_id)  # type: ignore
+            if not role:
+                lines.append(f"**{project.name}**: project role not found")
+                continue
 
-        await interaction.send(content=f"Here you go! ({len(projects)} projects)", files=[File(fp=projects_file, filename="projects.csv"), File(fp=members_file, filename="project_members.csv")])  # type: ignore
+            role_members = [member for member in guild_members if member.get_role(role.id)]
+            expected = {logins[member.id] for member in role_members if member.id in logins}
+            no_github = [member.display_name for member in role_members if member.id not in logins]
+            missing = sorted(expected - collaborators)
+            extra = sorted(collaborators - expected)
+
+            if not (missing or extra or no_github):
+                continue
 
-        projects_file.close()
-        members_file.close()
+            lines.append(f"**{project.name}** (`{project.github_repo}`):")
+            if missing:
+                lines.append("- in role, no repo access: " + ", ".join(f"`{login}`" for login in missing))
+            if extra:
+                lines.append(
+                    "- repo access, not in role: "
+                    + ", ".join(
+                        f"`{login}` (<@{discord_ids[login]}>)" if login in discord_ids else f"`{login}`"
+                        for login in extra
+                    )
+                )
+            if no_github:
+                lines.append("- no GitHub linked: " + ", ".join(no_github))
+
+        header = f"Audit against GitHub as of <t:{int(self.org_snapshot.fetched_at)}:R>"
+        if not lines:
+            return await interaction.send(f"{header}: every project role matches its repo!")
+
+        report = "\n".join([header, *lines])
+        if len(report) <= 2000:
+            return await interaction.send(report)
+
+        await interaction.send(
+            content=f"{header}: {len(lines)} lines, see attached",
+            file=File(fp=StringIO(report), filename="audit.md"),  # type: ignore
+        )
 
     @subcommand(project, description="Archive a project")
     async def archive(
@@ -428,28 +772,95 @@ class Projects(Cog):
         if not project:
             return await send_error(interaction, "Project does not exist")
 
+        await interaction.response.defer()
+
+        if error := await self.archive_project(project, archive_category):
+            return await send_error(interaction, error)
+
+        await interaction.send("Project archived successfully!")
+
+    async def archive_project(self, project: Project, archive_category: CategoryChannel) -> Optional[str]:
+        # returns an error message if the project could not be archived
         guild = self.cache.guild
         text_channel = guild.get_channel(project.discord_text_channel_id)  # type: ignore
         if not text_channel:
-            return await send_error(interaction, "Project text channel does not exist, was it manually deleted?")
+            return "Project text channel does not exist, was it manually deleted?"
         if not isinstance(text_channel, TextChannel):
-            return await send_error(interaction, "Project text channel is not a text channel, was it manually changed?")
+            return "Project text channel is not a text channel, was it manually changed?"
 
-        voice_channel = guild.get_channel(project.discord_voice_channel_id)  # type: ignore
-        if not voice_channel:
-            return await send_error(interaction, "Project text channel does not exist, was it manually deleted?")
-        if not isinstance(voice_channel, VoiceChannel):
-            return await send_error(
-                interaction, "Project voice channel is not a voice channel, was it manually changed?"
-            )
+        archive = [text_channel.edit(category=archive_category)]
+        # projects can be created without a voice channel, and one that is already gone has nothing left to delete
+        if project.discord_voice_channel_id:
+            if voice_channel := guild.get_channel(project.discord_voice_channel_id):  # type: ignore
+                archive.append(voice_channel.delete())
 
-        await text_channel.edit(category=archive_category)
-        await voice_channel.delete()
+        await asyncio.gather(*archive)
 
         # delete from the internal db
         database.delete_project(project)
 
-        await interaction.send("Project archived successfully!")
+    @subcommand(project, description="Archive every project in a category, or a list of projects", name="bulk-archive")
+    async def bulk_archive(
+        self,
+        interaction: Interaction,
+        *,
+        archive_category: CategoryChannel = SlashOption(description="Channel to move projects to", required=True),
+        category: Optional[CategoryChannel] = SlashOption(description="Archive every project in this category"),
+        project_names: Optional[str] = SlashOption(description="Comma separated project names to archive"),
+    ) -> None:
+        if not category and not project_names:
+            return await send_error(interaction, "Give a category or a list of projects to archive")
+
+        await interaction.response.defer()
+
+        projects: List[Project] = []
+
+        if category:
+            for text_channel in category.text_channels:
+                if project := database.get_project_by_text_channel_id(text_channel.id):
+                    projects.append(project)
+
+        missing: List[str] = []
+        if project_names:
+            names = {name.strip().lower().replace(" ", "-") for name in project_names.split(",") if name.strip()}
+            found = {str(project.name): project for project in database.get_projects_by_names(names)}
+            missing = sorted(names - found.keys())
+            projects.extend(project for name, project in found.items() if project not in projects)
+
+        if not projects:
+            return await send_error(interaction, "No projects to archive")
+
+        # categories hold at most 50 channels, check before moving anything
+        if len(archive_category.channels) + len(projects) > 50:
+            return await send_error(
+                interaction,
+                f"{archive_category.name} only has room for {50 - len(archive_category.channels)} more channels",
+            )
+
+        async def on_progress(done: int, total: int) -> None:
+            await interaction.edit_original_message(content=f"Archiving projects... ({done}/{total})")
+
+        async def archive_one(project: Project) -> Optional[str]:
+            return await self.archive_project(project, archive_category)
+
+        # channel edits share a guild-wide rate limit, so only a couple at a time
+        outcomes = await run_batch(projects, archive_one, concurrency=2, on_progress=on_progress)
+
+        failed = [f"{name}: not found" for name in missing]
+        for project, outcome in zip(projects, outcomes):
+            if outcome:
+                failed.append(f"{project.name}: {outcome}")
+
+        archived = len(projects) - (len(failed) - len(missing))
+        failed_str = "" if not failed else " Failed: ```" + "\n".join(failed) + "```"
+        await interaction.edit_original_message(content=f"Done! Archived {archived} projects.{failed_str}")
+
+    @delete.on_autocomplete("project_name")
+    @link.on_autocomplete("project_name")
+    @share.on_autocomplete("project_name")
+    @archive.on_autocomplete("project_name")
+    async def autocomplete_project_name(self, interaction: Interaction, project_name: str) -> None:
+        await interaction.response.send_autocomplete(list(database.complete_project_names(project_name)))
 
 
 __all__ = ["Projects"]
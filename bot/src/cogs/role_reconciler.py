@@ -0,0 +1,202 @@
+import logging
+from typing import (
+    Collection,
+    List,
+    MutableMapping,
+    MutableSet,
+    Optional,
+    Tuple,
+)
+
+from config import config
+from nextcord import Forbidden, HTTPException, Interaction, Member, Role
+from nextcord.ext import tasks
+from nextcord.ext.commands import Bot, Cog
+from utils.access_control_decorators import is_exco, subcommand
+from utils.database import Member as MemberDB
+from utils.database import database, graduating_year
+
+from .cache import Cache
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 10  # members fixed per pass
+APPLY_INTERVAL = 10  # seconds between passes
+REPORT_LINES = 20
+
+RoleDiff = Tuple[MutableSet[int], MutableSet[int]]  # role ids to add, role ids to remove
+
+
+class RoleReconciler(Cog):
+    # keeps the member, alumni and guest roles in line with the member table. the diff is only ever recomputed
+    # for members something happened to, so a pass costs time in the number of changes, not the guild size
+    __slots__ = "bot", "cache", "pending", "dirty", "started"
+
+    def __init__(self, bot: Bot, cache: Cache) -> None:
+        super().__init__()
+
+        self.bot = bot
+        self.cache = cache
+        self.pending: MutableMapping[int, RoleDiff] = {}  # discord id -> what has to change
+        self.dirty: MutableSet[int] = set()  # discord ids to recompute on the next pass
+        self.started = False
+
+        database.subscribe_members(self.mark_dirty)
+
+    def mark_dirty(self, discord_ids: Collection[int]) -> None:
+        self.dirty.update(discord_ids)
+
+    def expected_diff(self, member: Member, member_db: Optional[MemberDB]) -> RoleDiff:
+        add: MutableSet[int] = set()
+        remove: MutableSet[int] = set()
+        role_ids = {role.id for role in member.roles}
+
+        if member_db and member_db.year >= graduating_year():
+            # existing member roles are left alone, like /members refresh does
+            add.add(config.alumni_role)
+        elif member_db:
+            add.add(config.member_role)
+            remove.add(config.guest_role)
+        elif config.exco_role not in role_ids:
+            # not (or no longer) in the member table, e.g. after /members leave or a hand-given role
+            remove.add(config.member_role)
+
+        return add - role_ids, remove & role_ids
+
+    def recompute(self, discord_id: int, member: Optional[Member], member_db: Optional[MemberDB]) -> None:
+        if not member or member.bot:
+            self.pending.pop(discord_id, None)
+            return
+
+        add, remove = self.expected_diff(member, member_db)
+        if add or remove:
+            self.pending[discord_id] = (add, remove)
+        else:
+            self.pending.pop(discord_id, None)
+
+    async def recompute_dirty(self) -> None:
+        dirty, self.dirty = self.dirty, set()
+        members = {member.id: member for member in await self.cache.fetch_members(dirty)}
+        for discord_id in dirty:
+            # archived alumni are always past Y6, so they land in the alumni branch
+            member_db = database.get_member_by_discord_id(discord_id) or database.get_archived_member_by_discord_id(
+                discord_id
+            )
+            self.recompute(discord_id, members.get(discord_id), member_db)
+
+    async def full_pass(self) -> None:
+        # only at startup and once a day, since graduation depends on the date rather than any event
+        linked: MutableMapping[int, MemberDB] = {
+            member_db.discord_id: member_db for member_db in database.get_linked_archived_members()  # type: ignore
+        }
+        linked.update((member_db.discord_id, member_db) for member_db in database.get_linked_members())
+
+        self.pending.clear()
+        for member in await self.cache.all_members():
+            self.recompute(member.id, member, linked.get(member.id))
+
+        logger.info(f"Role reconciler found {len(self.pending)} members with drifted roles")
+
+    def describe(self, discord_id: int, diff: RoleDiff) -> str:
+        def names(role_ids: Collection[int]) -> str:
+            roles: List[Optional[Role]] = [self.cache.guild.get_role(role_id) for role_id in role_ids]
+            return ", ".join(role.name if role else str(role_id) for role, role_id in zip(roles, role_ids))
+
+        add, remove = diff
+        changes = [f"+{names(add)}" if add else "", f"-{names(remove)}" if remove else ""]
+        return f"<@{discord_id}>: " + " ".join(filter(None, changes))
+
+    async def apply(self, discord_id: int, diff: RoleDiff) -> None:
+        member = await self.cache.fetch_member(discord_id)
+        if not member:
+            return
+
+        add, remove = diff
+        roles = [role for role in member.roles[1:] if role.id not in remove]  # skip @everyone
+        roles.extend(role for role_id in add if (role := self.cache.guild.get_role(role_id)))
+
+        try:
+            # one request per member, whatever has to change
+            await member.edit(roles=roles, reason="Role reconciler")
+        except (Forbidden, HTTPException):
+            logger.warn(f"Could not fix roles of {discord_id}:", exc_info=True)
+
+    @tasks.loop(seconds=APPLY_INTERVAL)
+    async def reconcile(self) -> None:
+        await self.recompute_dirty()
+
+        if config.role_reconcile != "apply":
+            return
+
+        # rate limited: at most a batch of members per pass, the rest waits for the next one
+        for discord_id, diff in list(self.pending.items())[:BATCH_SIZE]:
+            self.pending.pop(discord_id)
+            await self.apply(discord_id, diff)
+            # the resulting member update brings it back if something is still off
+            self.dirty.add(discord_id)
+
+    @tasks.loop(hours=24)
+    async def daily_pass(self) -> None:
+        await self.full_pass()
+
+    @Cog.listener()
+    async def on_ready(self) -> None:
+        # on_ready also fires on reconnects, only start once
+        if self.started or config.role_reconcile == "off":
+            return
+
+        self.started = True
+        self.daily_pass.start()
+        self.reconcile.start()
+
+    @Cog.listener()
+    async def on_member_join(self, member: Member) -> None:
+        if member.guild == self.cache.guild:
+            self.dirty.add(member.id)
+
+    @Cog.listener()
+    async def on_member_update(self, before: Member, after: Member) -> None:
+        if after.guild == self.cache.guild and before.roles != after.roles:
+            self.dirty.add(after.id)
+
+    @Cog.listener()
+    async def on_uncached_member_update(self, member_id: int) -> None:
+        # with the lazy member cache most members aren't cached, and nextcord only reports updates to cached ones
+        self.dirty.add(member_id)
+
+    @Cog.listener()
+    async def on_member_remove(self, member: Member) -> None:
+        self.pending.pop(member.id, None)
+        self.dirty.discard(member.id)
+
+    def cog_unload(self) -> None:
+        self.reconcile.cancel()
+        self.daily_pass.cancel()
+        return super().cog_unload()
+
+    @is_exco()
+    async def roles(self, _: Interaction) -> None:
+        pass
+
+    @subcommand(roles, description="Show roles that drifted from the member list, without changing anything")
+    async def drift(self, interaction: Interaction) -> None:
+        # recomputing can look members up over the gateway, which may not fit in the time to respond
+        await interaction.response.defer(ephemeral=True)
+
+        # pick up anything that changed since the last pass, so the report is current
+        await self.recompute_dirty()
+
+        if not self.pending:
+            return await interaction.send(f"No drift! (mode: {config.role_reconcile})", ephemeral=True)
+
+        lines = [self.describe(discord_id, diff) for discord_id, diff in list(self.pending.items())[:REPORT_LINES]]
+        if len(self.pending) > REPORT_LINES:
+            lines.append(f"...and {len(self.pending) - REPORT_LINES} more")
+
+        await interaction.send(
+            f"{len(self.pending)} members drifted (mode: {config.role_reconcile}):\n" + "\n".join(lines),
+            ephemeral=True,
+        )
+
+
+__all__ = ["RoleReconciler"]
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from config import config
+from nextcord.ext.commands import Bot, Cog
+
+from .github_auth import GithubAuth
+from .ms_auth import MSAuth
+
+if TYPE_CHECKING:
+    from quart import Quart
+
+logger = logging.getLogger(__name__)
+
+
+# embedded mode: serves the verify server's routes on the bot's own event loop, calling the auth cogs directly
+class VerifyServer(Cog):
+    __slots__ = "bot", "ms_auth", "github_auth", "app", "server_task", "shutdown_event"
+
+    def __init__(self, bot: Bot, ms_auth: MSAuth, github_auth: GithubAuth) -> None:
+        super().__init__()
+
+        self.bot = bot
+        self.ms_auth = ms_auth
+        self.github_auth = github_auth
+
+        self.app = self.create_app()
+        self.server_task: Optional[asyncio.Task] = None
+        self.shutdown_event = asyncio.Event()
+
+    def create_app(self) -> "Quart":
+        # only needed in embedded mode, so quart is not imported otherwise
+        from quart import Quart
+
+        from shared.verify_routes import register_routes
+
+        app = Quart(__name__)
+        register_routes(
+            app,
+            on_ms_auth_response=self.ms_auth.handle_ms_auth_response,
+            on_gh_auth_response=self.github_auth.handle_gh_auth_response,
+            webhook_secret=config.github_webhook_secret,
+        )
+
+        return app
+
+    @Cog.listener()
+    async def on_connect(self) -> None:
+        # on_connect also fires on reconnects, only start serving once
+        if self.server_task:
+            return
+
+        self.server_task = asyncio.create_task(
+            self.app.run_task(
+                host="0.0.0.0", port=config.embedded_server_port, shutdown_trigger=self.shutdown_event.wait
+            )
+        )
+        logger.info(f"Serving verify routes on port {config.embedded_server_port}")
+
+    def cog_unload(self) -> None:
+        self.shutdown_event.set()
+        return super().cog_unload()
+
+
+__all__ = ["VerifyServer"]
@@ -4,36 +4,57 @@ import os
 class Config:
     __slots__ = (
         "alumni_role",
+        "approval_digest_window",
         "discord_token",
+        "embedded_server",
+        "embedded_server_port",
         "exco_channel_id",
         "exco_role",
         "github_client_id",
         "github_client_secret",
         "github_token",
+        "github_webhook_secret",
         "guest_role",
         "guild_id",
+        "import_budget_ms",
+        "member_cache",
+        "member_cache_size",
         "member_role",
         "ms_auth_client_id",
         "ms_auth_tenant_id",
         "ms_auth_redirect_domain",
+        "role_reconcile",
         "ipc_secret",
     )
 
     def __init__(self) -> None:
         self.alumni_role = int(os.environ["ALUMNI_ROLE"])
+        # seconds to collect approval requests into one digest message for; 0 posts each request on its own
+        self.approval_digest_window = float(os.environ.get("APPROVAL_DIGEST_WINDOW", "0"))
         self.discord_token = os.environ["DISCORD_TOKEN"]
+        self.embedded_server = os.environ.get("EMBEDDED_SERVER", "false").lower() in ("1", "true", "yes")
+        self.embedded_server_port = int(os.environ.get("EMBEDDED_SERVER_PORT", "3000"))
         self.exco_channel_id = int(os.environ["EXCO_CHANNEL_ID"])
         self.exco_role = int(os.environ["EXCO_ROLE"])
         self.github_client_id = os.environ["GITHUB_CLIENT_ID"]
         self.github_client_secret = os.environ["GITHUB_CLIENT_SECRET"]
         self.github_token = os.environ["GITHUB_TOKEN"]
+        # webhook deliveries are rejected until this is set
+        self.github_webhook_secret = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
         self.guest_role = int(os.environ["GUEST_ROLE"])
         self.guild_id = int(os.environ["GUILD_ID"])
+        self.import_budget_ms = float(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+        # "full" chunks every member at startup, "lazy" fetches members on demand and keeps a bounded cache
+        self.member_cache = os.environ.get("MEMBER_CACHE", "full").lower()
+        # members kept by the lazy member cache
+        self.member_cache_size = int(os.environ.get("MEMBER_CACHE_SIZE", "1000"))
         self.member_role = int(os.environ["MEMBER_ROLE"])
         self.ms_auth_client_id = os.environ["MS_AUTH_CLIENT_ID"]
         self.ms_auth_tenant_id = os.environ["MS_AUTH_TENANT_ID"]
         self.ms_auth_redirect_domain = os.environ["MS_AUTH_REDIRECT_DOMAIN"]
         self.ipc_secret = os.environ["IPC_SECRET"]
+        # "off", "dry-run" (only report drift with /roles drift) or "apply" (fix roles in the background)
+        self.role_reconcile = os.environ.get("ROLE_RECONCILE", "dry-run").lower()
 
 
 config = Config()
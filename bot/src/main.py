@@ -1,21 +1,12 @@
 import logging
 
 import uvloop
-from cogs import (
-    Cache,
-    GithubAuth,
-    JSONCache,
-    MemberManagement,
-    MSAuth,
-    Nick,
-    Projects,
-    UIHelper,
-    Help
-)
+from cogs import cog_modules
 from config import config
-from nextcord import Intents
+from nextcord import Intents, MemberCacheFlags
 from nextcord.ext import ipc
 from nextcord.ext.commands import Bot
+from utils.import_timer import ImportTimer
 
 
 def do_on_shutdown():
@@ -27,25 +18,65 @@ def main() -> None:
 
     uvloop.install()
 
+    # import cogs one at a time so we can see what each of them costs at startup
+    import_timer = ImportTimer()
+    for cog_name, module_name in cog_modules.items():
+        import_timer.import_cog(cog_name, module_name)
+    import_timer.log_report(config.import_budget_ms)
+
+    from cogs import (
+        Approvals,
+        Cache,
+        GithubAuth,
+        GithubCache,
+        Help,
+        Jobs,
+        JSONCache,
+        MemberManagement,
+        MSAuth,
+        Nick,
+        Outbox,
+        Projects,
+        RoleReconciler,
+        UIHelper,
+        VerifyServer,
+    )
+    from utils.database import database
+
     intents = Intents.default()
     intents.members = True
 
-    bot = Bot(intents=intents)
+    if config.member_cache == "lazy":
+        # the Cache cog looks members up on demand and decides what stays cached
+        bot = Bot(intents=intents, member_cache_flags=MemberCacheFlags.none(), chunk_guilds_at_startup=False)
+    else:
+        bot = Bot(intents=intents)
 
     bot.add_cog(cache := Cache(bot))
 
-    ipc_server = ipc.server.Server(bot, host="0.0.0.0", secret_key=config.ipc_secret)
-
     bot.add_cog(json_cache := JSONCache(bot))
     bot.add_cog(ui_helper := UIHelper(bot, json_cache))
-    bot.add_cog(MSAuth(bot, cache, ui_helper, json_cache))
-    bot.add_cog(github_auth := GithubAuth(bot, cache, json_cache))
-    bot.add_cog(MemberManagement(bot, cache))
-    bot.add_cog(Nick(bot, cache, ui_helper))
-    bot.add_cog(Projects(bot, cache, ui_helper, github_auth))
+    bot.add_cog(outbox := Outbox(bot))
+    bot.add_cog(approvals := Approvals(bot, cache, ui_helper, json_cache, outbox))
+    bot.add_cog(ms_auth := MSAuth(bot, cache, outbox, approvals))
+    bot.add_cog(github_cache := GithubCache(bot, json_cache))
+    bot.add_cog(github_auth := GithubAuth(bot, cache, outbox))
+    bot.add_cog(jobs := Jobs(bot, cache))
+    bot.add_cog(MemberManagement(bot, cache, jobs))
+    bot.add_cog(Nick(bot, cache, outbox, approvals))
+    bot.add_cog(Projects(bot, cache, ui_helper, github_auth, github_cache, jobs))
+    bot.add_cog(RoleReconciler(bot, cache))
     bot.add_cog(Help(bot, cache))
 
-    ipc_server.start()
+    # keeps the in-memory copies in the database layer current with writes made by other processes
+    database.listen_for_changes(bot.loop)
+
+    if config.embedded_server:
+        # serve the OAuth callbacks ourselves instead of going through the server container
+        bot.add_cog(VerifyServer(bot, ms_auth, github_auth))
+    else:
+        ipc_server = ipc.server.Server(bot, host="0.0.0.0", secret_key=config.ipc_secret)
+        ipc_server.start()
 
     bot.run(config.discord_token)
 
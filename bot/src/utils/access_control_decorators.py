@@ -1,3 +1,4 @@
+import math
 from typing import Callable
 
 from cogs.cache import Cache
@@ -13,9 +14,25 @@ from nextcord import (
 from nextcord.ext.application_checks import check
 from nextcord.ext.commands import Bot
 from utils.error import send_error
+from utils.rate_limit import rate_limiter
+
+
+class RateLimited(ApplicationCheckFailure):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Rate limited, retry after {retry_after:.0f}s")
+
+        self.retry_after = retry_after
 
 
 async def on_access_control_failure(_: ClientCog, interaction: Interaction, error: Exception) -> None:
+    if isinstance(error, RateLimited):
+        await send_error(
+            interaction,
+            f"You're doing that too often! Try again in {math.ceil(error.retry_after)} seconds.",
+            ephemeral=True,
+        )
+        return
+
     if isinstance(error, ApplicationCheckFailure):
         await send_error(interaction, "You cannot run this command!", ephemeral=True)
         return
@@ -24,7 +41,7 @@ async def on_access_control_failure(_: ClientCog, interaction: Interaction, erro
 
 
 def check_in_server():
-    def predicate(interaction: Interaction) -> bool:
+    async def predicate(interaction: Interaction) -> bool:
         client: Client = interaction.client
         if not isinstance(client, Bot):
             raise RuntimeError("Check not running from a bot!")
@@ -32,14 +49,13 @@ def check_in_server():
         if not (cache := client.get_cog("Cache")) or not isinstance(cache, Cache):
             raise RuntimeError("Cache cog invalid!")
 
-        guild = cache.guild
         user = interaction.user
 
         if not user:
             raise RuntimeError("User is not defined!")
 
         # make sure user has "member" in guild
-        return (guild.get_member(user.id)) is not None
+        return (await cache.fetch_member(user.id)) is not None
 
     return check(predicate)
 
@@ -56,7 +72,7 @@ def is_in_server(**kwargs):
 
 
 def check_is_verified():
-    def predicate(interaction: Interaction) -> bool:
+    async def predicate(interaction: Interaction) -> bool:
         client: Client = interaction.client
         if not isinstance(client, Bot):
             raise RuntimeError("Check not running from a bot!")
@@ -64,14 +80,13 @@ def check_is_verified():
         if not (cache := client.get_cog("Cache")) or not isinstance(cache, Cache):
             raise RuntimeError("Cache cog invalid!")
 
-        guild = cache.guild
         user = interaction.user
 
         if not user:
             raise RuntimeError("User is not defined!")
 
         # make sure user has any of "alumni", "member" or "guest" in guild
-        return ((member := guild.get_member(user.id)) is not None) and len(
+        return ((member := await cache.fetch_member(user.id)) is not None) and len(
             {cache.member_role, cache.alumni_role, cache.guest_role}.intersection(member.roles)
         ) > 0
 
@@ -90,7 +105,7 @@ def is_verified(**kwargs):
 
 
 def check_is_member():
-    def predicate(interaction: Interaction) -> bool:
+    async def predicate(interaction: Interaction) -> bool:
         client: Client = interaction.client
         if not isinstance(client, Bot):
             raise RuntimeError("Check not running from a bot!")
@@ -98,14 +113,14 @@ def check_is_member():
         if not (cache := client.get_cog("Cache")) or not isinstance(cache, Cache):
             raise RuntimeError("Cache cog invalid!")
 
-        guild = cache.guild
         user = interaction.user
 
         if not user:
             raise RuntimeError("User is not defined!")
 
         # make sure user has "member" in guild
-        return ((member := guild.get_member(user.id)) is not None) and (member.get_role(config.member_role) is not None)
+        member = await cache.fetch_member(user.id)
+        return member is not None and member.get_role(config.member_role) is not None
 
     return check(predicate)
 
@@ -122,7 +137,7 @@ def is_member(**kwargs):
 
 
 def check_is_exco():
-    def predicate(interaction: Interaction) -> bool:
+    async def predicate(interaction: Interaction) -> bool:
         client: Client = interaction.client
         if not isinstance(client, Bot):
             raise RuntimeError("Check not running from a bot!")
@@ -130,14 +145,14 @@ def check_is_exco():
         if not (cache := client.get_cog("Cache")) or not isinstance(cache, Cache):
             raise RuntimeError("Cache cog invalid!")
 
-        guild = cache.guild
         user = interaction.user
 
         if not user:
             raise RuntimeError("User is not defined!")
 
         # make sure user has "exco" in guild
-        return ((member := guild.get_member(user.id)) is not None) and (member.get_role(config.exco_role) is not None)
+        member = await cache.fetch_member(user.id)
+        return member is not None and member.get_role(config.exco_role) is not None
 
     return check(predicate)
 
@@ -153,6 +168,22 @@ def is_exco(**kwargs):
     return wrapped
 
 
+def check_rate_limit(command: str, *, capacity: int, per: float):
+    # token bucket per user: allows bursts of `capacity` calls, refilling fully over `per` seconds
+    def predicate(interaction: Interaction) -> bool:
+        user = interaction.user
+
+        if not user:
+            raise RuntimeError("User is not defined!")
+
+        if retry_after := rate_limiter.hit(user.id, command, capacity, per):
+            raise RateLimited(retry_after)
+
+        return True
+
+    return check(predicate)
+
+
 # ensure we keep the checks
 def subcommand(main_command: SlashApplicationCommand, **kwargs):
     if "inherit_hooks" not in kwargs:
@@ -173,5 +204,7 @@ __all__ = [
     "check_in_server",
     "is_verified",
     "check_is_verified",
+    "check_rate_limit",
+    "RateLimited",
     "subcommand",
 ]
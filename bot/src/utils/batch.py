@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Collection,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
+
+logger = logging.getLogger(__name__)
+
+ItemType = TypeVar("ItemType")
+ResultType = TypeVar("ResultType")
+
+ProgressCallback = Callable[[int, int], Awaitable[None]]  # done, total
+
+
+async def run_batch(
+    items: Collection[ItemType],
+    fn: Callable[[ItemType], Awaitable[ResultType]],
+    *,
+    concurrency: int,
+    on_progress: Optional[ProgressCallback] = None,
+    progress_interval: float = 2.0,
+) -> List[Union[ResultType, Exception]]:
+    # runs fn over items with at most `concurrency` in flight; results are in the same order as items,
+    # with exceptions returned in place of results. progress updates are throttled, since they usually edit a message
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    last_progress = 0.0
+
+    async def report_progress(force: bool = False) -> None:
+        nonlocal last_progress
+
+        if not on_progress or (not force and time.monotonic() - last_progress < progress_interval):
+            return
+
+        last_progress = time.monotonic()
+        try:
+            await on_progress(done, len(items))
+        except Exception:
+            logger.warn("Could not report batch progress:", exc_info=True)
+
+    async def run_one(item: ItemType) -> Union[ResultType, Exception]:
+        nonlocal done
+
+        async with semaphore:
+            try:
+                result: Union[ResultType, Exception] = await fn(item)
+            except Exception as error:
+                result = error
+
+        done += 1
+        await report_progress()
+        return result
+
+    results = await asyncio.gather(*(run_one(item) for item in items))
+    await report_progress(force=True)
+
+    return results
+
+
+__all__ = ["run_batch", "ProgressCallback"]
@@ -0,0 +1,42 @@
+from typing import Any, Generic, List, Optional, Type, TypeVar
+
+from peewee import Database, Model, Select
+
+ModelType = TypeVar("ModelType", bound=Model)
+
+
+class CompiledQuery(Generic[ModelType]):
+    # a select compiled to SQL once, so peewee doesn't rebuild and recompile it on every call. the query is built
+    # with placeholder values, whose number fixes how many parameters a call takes
+    __slots__ = "database", "model", "sql", "arity"
+
+    def __init__(self, database: Database, query: Select) -> None:
+        sql, params = query.sql()
+
+        self.database = database
+        self.model: Type[ModelType] = query.model
+        self.sql = sql
+        self.arity = len(params)
+
+    def execute(self, *params: Any) -> List[ModelType]:
+        if len(params) != self.arity:
+            raise TypeError(f"Query takes {self.arity} parameters, got {len(params)}")
+
+        cursor = self.database.execute_sql(self.sql, params)
+
+        columns = self.model._meta.columns
+        names = [columns[column.name].name for column in cursor.description]
+        result = []
+        for row in cursor.fetchall():
+            instance = self.model(__no_default__=1, **dict(zip(names, row)))
+            instance._dirty.clear()
+            result.append(instance)
+
+        return result
+
+    def first(self, *params: Any) -> Optional[ModelType]:
+        rows = self.execute(*params)
+        return rows[0] if rows else None
+
+
+__all__ = ["CompiledQuery"]
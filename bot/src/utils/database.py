@@ -1,9 +1,26 @@
+import asyncio
 import logging
+import time
 from datetime import date
-from typing import Any, Collection, Literal, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    List,
+    Literal,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
+import psycopg2
 from peewee import (
     JOIN,
+    SQL,
+    AutoField,
     BigIntegerField,
     Cast,
     CharField,
@@ -11,16 +28,44 @@ from peewee import (
     Model,
     PeeweeException,
     PostgresqlDatabase,
+    TextField,
+    Value,
+    ValuesList,
     fn,
-    SQL
 )
 from playhouse.hybrid import hybrid_property
 
-db = PostgresqlDatabase(
-    database="postgres", host="db", port=5432, user="postgres", password="postgres"
-)
+from shared import repo_index
+from shared.auth_flow import AUTH_FLOW_TTL, AuthFlow
+from shared.auth_flow import db as auth_flow_db
+from shared.auth_flow import import_legacy_auth_flows
+from shared.change_feed import Change, ChangeFeed, publish
+from shared.repo_index import RepoCollaborator, RepoSync
+
+from .compiled_query import CompiledQuery
+from .member_index import MemberIndex
+from .project_registry import ProjectRegistry
+from .write_buffer import WriteBuffer
+
+db = PostgresqlDatabase(database="postgres", host="db", port=5432, user="postgres", password="postgres")
+auth_flow_db.initialize(db)
+repo_index.db.initialize(db)
 logger = logging.getLogger(__name__)
 
+MemberListener = Callable[[Collection[int]], None]
+
+AUTH_FLOW_MIN_REMAINING = 72000  # seconds left before an outstanding flow is no longer handed out again
+WRITE_BATCH_SIZE = 100
+WRITE_BATCH_DELAY = 0.005  # seconds a verification write waits for others to share its commit
+
+
+def graduating_year() -> int:
+    # members in this year or above are considered graduated
+    if date.today().month >= 11:  # (november)
+        # consider those graduating soon
+        return 6
+    return 7
+
 
 class BaseModel(Model):
     class Meta:
@@ -50,6 +95,11 @@ class Member(BaseModel):
         return year
 
 
+class MemberArchive(Member):
+    # members past Y6, moved out of the member table by /members refresh so current-student queries stay small
+    archived_at = BigIntegerField()
+
+
 class Github(BaseModel):
     discord_id = BigIntegerField(primary_key=True)
     github = CharField(100)
@@ -65,68 +115,304 @@ class Project(BaseModel):
     github_webhook_id = BigIntegerField(null=True)
 
 
+class Job(BaseModel):
+    id = AutoField()
+    kind = CharField(50)
+    priority = IntegerField()  # lower runs first
+    status = CharField(10, index=True)  # queued, running, done or failed
+    payload = TextField()  # json
+    checkpoint = TextField(null=True)  # json, saved by the job as it makes progress
+    progress = TextField(null=True)
+    result = TextField(null=True)
+    channel_id = BigIntegerField()
+    message_id = BigIntegerField(null=True)  # status message
+    created_by = BigIntegerField()
+    created_at = BigIntegerField()
+    updated_at = BigIntegerField()
+
+
 class Database:
-    __slots__ = ()
+    __slots__ = (
+        "projects",
+        "member_index",
+        "githubs",
+        "member_listeners",
+        "changes",
+        "discord_writes",
+        "github_writes",
+        "archived_discord_writes",
+        "member_by_email",
+        "member_by_discord_id",
+    )
 
     def __init__(self) -> None:
         db.connect()
-        db.create_tables([Member, Github, Project])
+        db.create_tables([Member, MemberArchive, Github, Project, AuthFlow, Job, RepoCollaborator, RepoSync])
+        # flows still pending in the JSON caches from before the table existed
+        import_legacy_auth_flows("/storage")
+
+        # projects are small and read on every project command, so serve them from memory
+        self.projects = ProjectRegistry()
+        # member lookups by name are fuzzy, which the database can't index without pg_trgm
+        self.member_index = MemberIndex()
+        # discord id -> linked github account, read for every project member
+        self.githubs: MutableMapping[int, Github] = {}
+        self.reload()
+
+        # the member lookups behind most commands, compiled once
+        self.member_by_email: CompiledQuery[Member] = CompiledQuery(db, Member.select().where(Member.email == ""))
+        self.member_by_discord_id: CompiledQuery[Member] = CompiledQuery(
+            db, Member.select().where(Member.discord_id == 0)
+        )
+
+        # called with the discord ids of linked members after writes that affect them
+        self.member_listeners: List[MemberListener] = []
+
+        # writes to these tables notify other processes, which patch their copies from here
+        # on a connection of its own, since it stays listening for good
+        self.changes = ChangeFeed(lambda: psycopg2.connect(database=db.database, **db.connect_params), self.reload)
+        self.changes.subscribe("member", self.on_member_change)
+        self.changes.subscribe("github", self.on_github_change)
+        self.changes.subscribe("project", self.on_project_change)
+
+        # verification bursts link many accounts at once, so those writes are batched: email / discord id -> value
+        self.discord_writes: WriteBuffer[str, int] = WriteBuffer(
+            self.save_discords,
+            after_flush=lambda discord_ids: self.notify_members(*discord_ids.values()),
+            max_size=WRITE_BATCH_SIZE,
+            max_delay=WRITE_BATCH_DELAY,
+        )
+        self.github_writes: WriteBuffer[int, str] = WriteBuffer(
+            self.save_githubs, after_flush=self.cache_githubs, max_size=WRITE_BATCH_SIZE, max_delay=WRITE_BATCH_DELAY
+        )
+        self.archived_discord_writes: WriteBuffer[str, int] = WriteBuffer(
+            self.save_archived_discords,
+            after_flush=lambda discord_ids: self.notify_members(*discord_ids.values()),
+            max_size=WRITE_BATCH_SIZE,
+            max_delay=WRITE_BATCH_DELAY,
+        )
+
+    def reload(self) -> None:
+        self.projects = ProjectRegistry()
+        self.projects.load(Project.select())
+
+        self.member_index = MemberIndex()
+        self.member_index.load(Member.select(Member.email, Member.name).tuples())
+
+        self.githubs = {github.discord_id: github for github in Github.select()}  # type: ignore
+
+    def listen_for_changes(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.changes.start(loop)
+
+    @staticmethod
+    def publish(table: str, op: str, **key: Any) -> None:
+        publish(db, table, op, **key)
+
+    def on_member_change(self, change: Change) -> None:
+        if change["op"] == "reload":
+            # bulk imports don't fit in a notification
+            self.member_index = MemberIndex()
+            self.member_index.load(Member.select(Member.email, Member.name).tuples())
+        elif member := Member.get_or_none(Member.email == change["email"]):
+            self.member_index.add(str(member.email), str(member.name))
+        else:
+            self.member_index.remove(change["email"])
+
+        self.notify_members(*change.get("discord_ids", ()))
+
+    def on_github_change(self, change: Change) -> None:
+        discord_id = change["discord_id"]
+        if github := Github.get_or_none(Github.discord_id == discord_id):
+            self.githubs[discord_id] = github
+        else:
+            self.githubs.pop(discord_id, None)
+
+    def on_project_change(self, change: Change) -> None:
+        if project := Project.get_or_none(Project.name == change["name"]):
+            self.projects.add(project)
+        else:
+            self.projects.remove(change["name"])
+
+    def subscribe_members(self, listener: MemberListener) -> None:
+        self.member_listeners.append(listener)
+
+    def notify_members(self, *discord_ids: Optional[int]) -> None:
+        if not (linked := [discord_id for discord_id in discord_ids if discord_id]):
+            return
+
+        for listener in self.member_listeners:
+            try:
+                listener(linked)
+            except Exception:
+                logger.error("Member listener failed:", exc_info=True)
 
     def create_members(
         self, emails: Collection[str], names: Collection[str], update_existing: bool
-    ) -> Union[Literal[False], Tuple[Literal[True], int, int]]:
+    ) -> Union[Literal[False], Tuple[Literal[True], int, int, int]]:
         with db.atomic() as transaction:  # wrap in transaction
             try:
+                # archived alumni stay archived, a live row would make them a current member again
+                archived = set(
+                    MemberArchive.select(MemberArchive.email).where(MemberArchive.email.in_(emails)).scalars()
+                )
+                rows = [(email, name) for email, name in zip(emails, names) if email not in archived]
+
                 curr_records = Member.select().count()
-                Member.insert_many(
-                    rows=zip(emails, names), fields=[Member.email, Member.name]
-                ).on_conflict_ignore().execute()  # insert new records
+                if rows:
+                    Member.insert_many(
+                        rows=rows, fields=[Member.email, Member.name]
+                    ).on_conflict_ignore().execute()  # insert new records
                 num_new = Member.select().count() - curr_records
-                if update_existing:
-                    Member.insert_many(rows=zip(emails, names), fields=[Member.email, Member.name]).on_conflict(
+                if update_existing and rows:
+                    Member.insert_many(rows=rows, fields=[Member.email, Member.name]).on_conflict(
                         conflict_target=[Member.email], preserve=[Member.name]
                     ).execute()  # update existing records
-                num_existing_updated = update_existing * (len(emails) - num_new)
-                return (True, num_new, num_existing_updated)
+                num_existing_updated = update_existing * (len(rows) - num_new)
+                self.publish("member", "reload")
             except PeeweeException:
                 transaction.rollback()
                 logging.warn("Database writing failed:", exc_info=True)
                 return False
 
+        # existing names are only overwritten with update_existing, so read back what was kept
+        self.member_index.load(Member.select(Member.email, Member.name).where(Member.email.in_(emails)).tuples())
+        return (True, num_new, num_existing_updated, len(emails) - len(rows))
+
     def get_member_by_email(self, email: str) -> Optional[Member]:
-        return Member.get_or_none(Member.email == email)
+        return self.member_by_email.first(email)
 
     def get_member_by_name(self, name: str) -> Collection[Member]:
-        return Member.select().where(Member.name.contains(name))
+        return Member.select().where(Member.email.in_(self.member_index.containing(name)))
+
+    def search_members(self, query: str, limit: int = 25) -> Collection[Tuple[str, str]]:
+        # fuzzy match on name and email, best first, as (email, name)
+        return self.member_index.search(query, limit)
 
     def get_member_by_discord_id(self, discord_id: int) -> Optional[Member]:
-        return Member.get_or_none(Member.discord_id == discord_id)
+        return self.member_by_discord_id.first(discord_id)
 
     def get_members(self) -> Collection[Any]:
-        return (
-            Member.select(Member, Github.github)
-            .join(Github, JOIN.LEFT_OUTER, on=(Member.discord_id == Github.discord_id))
-            .order_by(Member.year, Member.name)
-            .objects()
-        )
+        # everyone, archived alumni included
+        members = []
+        for model in (Member, MemberArchive):
+            members.extend(
+                model.select(model, Github.github)
+                .join(Github, JOIN.LEFT_OUTER, on=(model.discord_id == Github.discord_id))
+                .objects()
+            )
+
+        return sorted(members, key=lambda member: (member.year, member.name))
+
+    def get_archived_member_by_email(self, email: str) -> Optional[MemberArchive]:
+        return MemberArchive.get_or_none(MemberArchive.email == email)
+
+    def get_archived_member_by_discord_id(self, discord_id: int) -> Optional[MemberArchive]:
+        return MemberArchive.get_or_none(MemberArchive.discord_id == discord_id)
+
+    def get_linked_archived_members(self) -> Collection[MemberArchive]:
+        return MemberArchive.select().where(MemberArchive.discord_id.is_null(False))
+
+    def set_archived_discord(self, email: str, discord_id: int) -> None:
+        self.set_archived_discords({email: discord_id})
+
+    def set_archived_discords(self, discord_ids: Mapping[str, int]) -> None:
+        self.save_archived_discords(discord_ids)
+        self.notify_members(*discord_ids.values())
+
+    def save_archived_discords(self, discord_ids: Mapping[str, int]) -> None:
+        # email -> discord id, like save_discords but for alumni
+        values = ValuesList(list(discord_ids.items()), columns=("email", "discord_id"), alias="new")
+        with db.atomic():
+            MemberArchive.update(discord_id=values.c.discord_id).from_(values).where(
+                MemberArchive.email == values.c.email
+            ).execute()
+            for email, discord_id in discord_ids.items():
+                self.publish("member", "upsert", email=email, discord_ids=[discord_id])
+
+    async def write_archived_discord(self, email: str, discord_id: int) -> None:
+        # returns once committed, batched with other verifications around the same time
+        await self.archived_discord_writes.write(email, discord_id)
+
+    def archive_graduated(self) -> int:
+        # only past Y6; graduating Y6s stay current until the year turns over. NOW() is fixed for the transaction,
+        # so the insert and the delete agree on who that is
+        graduated = Member.year >= 7
+        fields = [Member.email, Member.name, Member.discord_id, Member.year_offset]
+        archive_fields = [
+            MemberArchive.email,
+            MemberArchive.name,
+            MemberArchive.discord_id,
+            MemberArchive.year_offset,
+            MemberArchive.archived_at,
+        ]
+
+        with db.atomic():
+            archived = list(Member.select(Member.email, Member.discord_id).where(graduated).tuples())
+            if not archived:
+                return 0
+
+            MemberArchive.insert_from(
+                Member.select(*fields, Value(int(time.time()))).where(graduated), fields=archive_fields
+            ).on_conflict(conflict_target=[MemberArchive.email], preserve=archive_fields[1:]).execute()
+            Member.delete().where(graduated).execute()
+            # too many rows for a notification, so other processes reload
+            self.publish("member", "reload")
+
+        for email, _ in archived:
+            self.member_index.remove(email)
+        self.notify_members(*(discord_id for _, discord_id in archived))
+
+        return len(archived)
 
     def set_discord(self, email: str, discord_id: int) -> None:
+        self.set_discords({email: discord_id})
+
+    def set_discords(self, discord_ids: Mapping[str, int]) -> None:
+        self.save_discords(discord_ids)
+        self.notify_members(*discord_ids.values())
+
+    def save_discords(self, discord_ids: Mapping[str, int]) -> None:
+        # email -> discord id, as a single UPDATE ... FROM (VALUES ...). only touches the database, so the write
+        # buffer runs it in a thread and notifies listeners from the event loop
+        values = ValuesList(list(discord_ids.items()), columns=("email", "discord_id"), alias="new")
         with db.atomic():
-            Member.update(discord_id=discord_id).where(Member.email == email).execute()
+            Member.update(discord_id=values.c.discord_id).from_(values).where(Member.email == values.c.email).execute()
+            for email, discord_id in discord_ids.items():
+                self.publish("member", "upsert", email=email, discord_ids=[discord_id])
+
+    async def write_discord(self, email: str, discord_id: int) -> None:
+        # returns once committed, batched with other verifications around the same time
+        await self.discord_writes.write(email, discord_id)
 
     def set_github(self, discord_id: int, github: str) -> None:
+        self.set_githubs({discord_id: github})
+
+    def set_githubs(self, githubs: Mapping[int, str]) -> None:
+        self.save_githubs(githubs)
+        self.cache_githubs(githubs)
+
+    def save_githubs(self, githubs: Mapping[int, str]) -> None:
+        # discord id -> github login, as a single multi-row upsert
         with db.atomic():
-            Github.insert(discord_id=discord_id, github=github).on_conflict(
+            Github.insert_many(list(githubs.items()), fields=[Github.discord_id, Github.github]).on_conflict(
                 conflict_target=[Github.discord_id], preserve=[Github.github]
             ).execute()
+            for discord_id in githubs:
+                self.publish("github", "upsert", discord_id=discord_id)
+
+    def cache_githubs(self, githubs: Mapping[int, str]) -> None:
+        for discord_id, github in githubs.items():
+            self.githubs[discord_id] = Github(discord_id=discord_id, github=github)
+
+    async def write_github(self, discord_id: int, github: str) -> None:
+        # returns once committed, batched with other verifications around the same time
+        await self.github_writes.write(discord_id, github)
 
     def get_graduated(self) -> Collection[Member]:
-        target_year = 7
-        if date.today().month >= 11:  # (november)
-            # consider those graduating soon
-            target_year = 6
+        return Member.select().where(Member.year >= graduating_year()).order_by(Member.email)
 
-        return Member.select().where(Member.year >= target_year)
+    def get_linked_members(self) -> Collection[Member]:
+        return Member.select().where(Member.discord_id.is_null(False))
 
     def get_non_graduated(self, *, strict: bool = False, with_github: bool = False) -> Collection[Any]:
         # note a slight overlap in "graduated" and "non_graduated" between Nov/Dec, unless strict is enabled
@@ -147,39 +433,158 @@ class Database:
         return Member.select().where(Member.year < target_year).objects()
 
     def get_github(self, discord_id: int) -> Optional[Github]:
-        return Github.get_or_none(Github.discord_id == discord_id)
+        return self.githubs.get(discord_id)
+
+    def get_githubs(self) -> Collection[Github]:
+        return list(self.githubs.values())
 
     def get_project(self, name: str) -> Optional[Project]:
-        return Project.get_or_none(Project.name == name)
+        return self.projects.by_name.get(name)
 
     def get_projects(self) -> Collection[Project]:
-        return Project.select()
+        return list(self.projects.by_name.values())
+
+    def get_projects_by_names(self, names: Collection[str]) -> Collection[Project]:
+        return [project for name in names if (project := self.projects.by_name.get(name))]
+
+    def get_project_by_role_id(self, role_id: int) -> Optional[Project]:
+        return self.projects.by_role_id.get(role_id)
+
+    def get_project_by_text_channel_id(self, channel_id: int) -> Optional[Project]:
+        return self.projects.by_text_channel_id.get(channel_id)
+
+    def get_project_by_github_repo(self, github_repo: str) -> Optional[Project]:
+        return self.projects.by_github_repo.get(github_repo.lower())
+
+    def complete_project_names(self, prefix: str) -> Collection[str]:
+        return self.projects.complete(prefix.lower().replace(" ", "-"))
 
     def insert_project(self, project: Project) -> None:
         with db.atomic():
             project.save(force_insert=True)
+            self.publish("project", "upsert", name=str(project.name))
+
+        self.projects.add(project)
 
     def update_project(self, project: Project) -> None:
         with db.atomic():
             project.save()
+            self.publish("project", "upsert", name=str(project.name))
+
+        self.projects.add(project)
 
     def delete_project(self, project: Project) -> None:
         with db.atomic():
             project.delete_instance()
+            self.publish("project", "delete", name=str(project.name))
+
+        self.projects.remove(str(project.name))
 
     def update_member(self, member: Member) -> None:
         with db.atomic():
             member.save()
+            self.publish("member", "upsert", email=str(member.email), discord_ids=[member.discord_id])
+
+        self.member_index.add(str(member.email), str(member.name))
+        self.notify_members(member.discord_id)  # type: ignore
 
     def delete_member(self, member: Member) -> None:
         with db.atomic():
             member.delete_instance()
+            self.publish("member", "delete", email=str(member.email), discord_ids=[member.discord_id])
+
+        self.member_index.remove(str(member.email))
+        self.notify_members(member.discord_id)  # type: ignore
 
     def delete_github(self, github: Github) -> None:
         with db.atomic():
             github.delete_instance()
+            self.publish("github", "delete", discord_id=github.discord_id)
+
+        self.githubs.pop(github.discord_id, None)  # type: ignore
+
+    def get_repo_collaborators(self, repo: str) -> Optional[Set[str]]:
+        return repo_index.get_repo_collaborators(repo)
+
+    def replace_repo_collaborators(self, collaborators: Mapping[str, Collection[str]]) -> None:
+        repo_index.replace_repo_collaborators(collaborators)
+
+    def insert_job(self, job: Job) -> None:
+        job.created_at = job.updated_at = int(time.time())  # type: ignore
+        with db.atomic():
+            job.save(force_insert=True)
+
+    def update_job(self, job: Job) -> None:
+        job.updated_at = int(time.time())  # type: ignore
+        with db.atomic():
+            job.save()
+
+    def get_job(self, job_id: int) -> Optional[Job]:
+        return Job.get_or_none(Job.id == job_id)
+
+    def get_unfinished_jobs(self) -> Collection[Job]:
+        return Job.select().where(Job.status.in_(["queued", "running"])).order_by(Job.priority, Job.id)
+
+    def get_recent_jobs(self, limit: int) -> Collection[Job]:
+        return Job.select().order_by(Job.id.desc()).limit(limit)
+
+    def insert_auth_flow(
+        self, kind: str, state: str, discord_id: int, *, auth_uri: Optional[str] = None, flow: Optional[str] = None
+    ) -> None:
+        with db.atomic():
+            AuthFlow.insert(
+                state=state,
+                kind=kind,
+                discord_id=discord_id,
+                created_at=int(time.time()),
+                auth_uri=auth_uri,
+                flow=flow,
+            ).execute()
+
+    def get_auth_flow(self, kind: str, state: str) -> Optional[AuthFlow]:
+        return AuthFlow.get_or_none(
+            (AuthFlow.state == state)
+            & (AuthFlow.kind == kind)
+            & (AuthFlow.created_at > int(time.time()) - AUTH_FLOW_TTL)
+        )
+
+    def get_outstanding_auth_flow(self, kind: str, discord_id: int, *, min_remaining: int) -> Optional[AuthFlow]:
+        # newest flow for this user that is still valid for at least min_remaining seconds
+        return (
+            AuthFlow.select()
+            .where(
+                (AuthFlow.discord_id == discord_id)
+                & (AuthFlow.kind == kind)
+                & (AuthFlow.created_at > int(time.time()) - AUTH_FLOW_TTL + min_remaining)
+            )
+            .order_by(AuthFlow.created_at.desc())
+            .first()
+        )
+
+    def delete_auth_flow(self, auth_flow: AuthFlow) -> None:
+        with db.atomic():
+            auth_flow.delete_instance()
+
+    def prune_auth_flows(self, kind: str) -> int:
+        with db.atomic():
+            return (
+                AuthFlow.delete()
+                .where((AuthFlow.kind == kind) & (AuthFlow.created_at <= int(time.time()) - AUTH_FLOW_TTL))
+                .execute()
+            )
 
 
 database = Database()
 
-__all__ = ["database", "Project", "Member", "Github"]
+__all__ = [
+    "database",
+    "graduating_year",
+    "Project",
+    "Member",
+    "MemberArchive",
+    "Github",
+    "AuthFlow",
+    "Job",
+    "AUTH_FLOW_TTL",
+    "AUTH_FLOW_MIN_REMAINING",
+]
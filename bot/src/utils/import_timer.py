@@ -0,0 +1,108 @@
+import importlib
+import importlib.abc
+import logging
+import sys
+import time
+from importlib.machinery import ModuleSpec
+from types import ModuleType
+from typing import Any, List, MutableMapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _TimedLoader(importlib.abc.Loader):
+    __slots__ = "loader", "timer"
+
+    def __init__(self, loader: Any, timer: "ImportTimer") -> None:
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec: ModuleSpec) -> Optional[ModuleType]:
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        # restore the real loader so nothing downstream sees the wrapper
+        module.__loader__ = self.loader
+        if module.__spec__:
+            module.__spec__.loader = self.loader
+
+        self.timer.stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self.timer.stack.pop()
+            if self.timer.stack:
+                self.timer.stack[-1] += elapsed
+            self.timer.record(module.__name__, elapsed - children)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.loader, name)
+
+
+# rough equivalent of `-X importtime`, aggregating self time per top-level package for each cog
+class ImportTimer(importlib.abc.MetaPathFinder):
+    __slots__ = "stack", "current", "report"
+
+    def __init__(self) -> None:
+        self.stack: List[float] = []
+        self.current: Optional[str] = None
+        # cog -> top-level package -> (self time, number of modules)
+        self.report: MutableMapping[str, MutableMapping[str, Tuple[float, int]]] = {}
+
+    def find_spec(
+        self, fullname: str, path: Optional[Sequence[str]], target: Optional[ModuleType] = None
+    ) -> Optional[ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader, self)
+            return spec
+
+        return None
+
+    def record(self, module_name: str, self_time: float) -> None:
+        if not self.current:
+            return
+
+        package = module_name.partition(".")[0]
+        packages = self.report.setdefault(self.current, {})
+        total, count = packages.get(package, (0.0, 0))
+        packages[package] = (total + self_time, count + 1)
+
+    def import_cog(self, cog_name: str, module_name: str) -> ModuleType:
+        self.current = cog_name
+        sys.meta_path.insert(0, self)
+        try:
+            module = importlib.import_module(module_name)
+        finally:
+            sys.meta_path.remove(self)
+            self.current = None
+
+        return module
+
+    def log_report(self, budget_ms: float) -> None:
+        grand_total = 0.0
+
+        for cog_name, packages in self.report.items():
+            cog_total = sum(total for total, _ in packages.values())
+            grand_total += cog_total
+
+            heaviest = sorted(packages.items(), key=lambda item: item[1][0], reverse=True)[:5]
+            breakdown = ", ".join(f"{package} {total * 1000:.1f}ms ({count})" for package, (total, count) in heaviest)
+            logger.info(f"Import {cog_name}: {cog_total * 1000:.1f}ms [{breakdown}]")
+
+        if grand_total * 1000 > budget_ms:
+            logger.warn(f"Cog imports took {grand_total * 1000:.1f}ms, over the {budget_ms:.0f}ms budget!")
+        else:
+            logger.info(f"Cog imports took {grand_total * 1000:.1f}ms (budget {budget_ms:.0f}ms)")
+
+
+__all__ = ["ImportTimer"]
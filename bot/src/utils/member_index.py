@@ -0,0 +1,98 @@
+import heapq
+import re
+from collections import Counter
+from typing import Iterable, List, MutableMapping, MutableSet, Tuple
+
+MIN_SIMILARITY = 0.2  # below this, fuzzy matches are mostly noise
+MAX_CHOICE_NAME = 100  # discord rejects autocomplete choices with longer names
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(text: str) -> MutableSet[str]:
+    # same scheme as postgres' pg_trgm: each word padded with two spaces in front and one behind
+    result = set()
+
+    for word in WORD.findall(text.lower()):
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+
+    return result
+
+
+def choice_name(email: str, name: str) -> str:
+    # "name (email)" for autocomplete, shortening the name first so the email stays readable
+    suffix = f" ({email})"
+    return f"{name[: max(MAX_CHOICE_NAME - len(suffix), 0)]}{suffix}"[:MAX_CHOICE_NAME]
+
+
+class MemberIndex:
+    # in-memory trigram index over member names and emails, kept in sync by the Database write methods
+    __slots__ = "names", "postings", "sizes"
+
+    def __init__(self) -> None:
+        self.names: MutableMapping[str, str] = {}  # email -> name
+        self.postings: MutableMapping[str, MutableSet[str]] = {}  # trigram -> emails
+        self.sizes: MutableMapping[str, int] = {}  # email -> number of trigrams
+
+    def load(self, members: Iterable[Tuple[str, str]]) -> None:
+        for email, name in members:
+            self.add(email, name)
+
+    def keys(self, email: str, name: str) -> MutableSet[str]:
+        # the domain is the same for everyone, so only the part before the @ is worth indexing
+        return trigrams(name) | trigrams(email.split("@")[0])
+
+    def add(self, email: str, name: str) -> None:
+        if email in self.names:
+            self.remove(email)
+
+        keys = self.keys(email, name)
+        for key in keys:
+            self.postings.setdefault(key, set()).add(email)
+
+        self.names[email] = name
+        self.sizes[email] = len(keys)
+
+    def remove(self, email: str) -> None:
+        if (name := self.names.pop(email, None)) is None:
+            return
+
+        for key in self.keys(email, name):
+            if (emails := self.postings.get(key)) is not None:
+                emails.discard(email)
+                if not emails:
+                    self.postings.pop(key)
+
+        self.sizes.pop(email)
+
+    def containing(self, text: str) -> List[str]:
+        text = text.lower()
+        return [email for email, name in self.names.items() if text in name.lower()]
+
+    def search(self, query: str, limit: int = 25) -> List[Tuple[str, str]]:
+        # best matches first, as (email, name)
+        query = query.strip().lower()
+        if not query:
+            return [(email, self.names[email]) for email in heapq.nsmallest(limit, self.names, key=self.names.get)]
+
+        query_keys = trigrams(query)
+        shared: Counter[str] = Counter()
+        for key in query_keys:
+            shared.update(self.postings.get(key, ()))
+
+        scores = {}
+        for email, count in shared.items():
+            # pg_trgm's similarity: shared trigrams over all trigrams of either side
+            similarity = count / (len(query_keys) + self.sizes[email] - count)
+            # whatever contains the query as typed ranks above fuzzy matches
+            if query in self.names[email].lower() or query in email:
+                similarity += 1
+            if similarity >= MIN_SIMILARITY:
+                scores[email] = similarity
+
+        best = heapq.nlargest(limit, scores, key=lambda email: (scores[email], self.names[email]))
+        return [(email, self.names[email]) for email in best]
+
+
+__all__ = ["MemberIndex", "choice_name"]
@@ -0,0 +1,43 @@
+import logging
+from typing import Any, Callable, Mapping
+
+from nextcord import Guild, Member
+from nextcord.abc import Snowflake
+from nextcord.ext.commands import Bot
+
+# the lazy member cache needs a few things nextcord has no public API for. they are all here, checked against
+# nextcord 2.6.0 (the version in Pipfile.lock), so an upgrade only has to recheck this file
+
+logger = logging.getLogger(__name__)
+
+RawHandler = Callable[[Mapping[str, Any]], None]
+
+
+def cache_member(guild: Guild, member: Member) -> None:
+    # Guild._add_member: with the member cache flags off, nothing else adds members to the guild
+    guild._add_member(member)
+
+
+def uncache_member(guild: Guild, member: Snowflake) -> None:
+    # Guild._remove_member
+    guild._remove_member(member)
+
+
+def watch_raw_event(bot: Bot, event: str, handler: RawHandler) -> None:
+    # runs handler with the payload of every gateway event of this type, before nextcord parses it. nextcord drops
+    # e.g. GUILD_MEMBER_UPDATE for members it doesn't cache, without dispatching anything.
+    # ConnectionState.parsers maps event names to parse methods, and the gateway looks them up there per event
+    parsers = bot._connection.parsers
+    parse = parsers[event]
+
+    def parse_and_watch(data: Any) -> None:
+        try:
+            handler(data)
+        except Exception:
+            logger.error(f"Watching {event} failed:", exc_info=True)
+        parse(data)
+
+    parsers[event] = parse_and_watch
+
+
+__all__ = ["cache_member", "uncache_member", "watch_raw_event"]
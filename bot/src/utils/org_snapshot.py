@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+from typing import Any, Mapping, MutableMapping, Optional, Set
+
+from shared.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+TIMEOUT = 30  # seconds
+
+REPOSITORIES_QUERY = """
+query($org: String!, $cursor: String) {
+  organization(login: $org) {
+    repositories(first: 50, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        collaborators(first: 100, affiliation: DIRECT) {
+          pageInfo { hasNextPage endCursor }
+          nodes { login }
+        }
+      }
+    }
+  }
+}
+"""
+
+# only for the rare repo with more than a page of collaborators
+COLLABORATORS_QUERY = """
+query($org: String!, $repo: String!, $cursor: String) {
+  repository(owner: $org, name: $repo) {
+    collaborators(first: 100, after: $cursor, affiliation: DIRECT) {
+      pageInfo { hasNextPage endCursor }
+      nodes { login }
+    }
+  }
+}
+"""
+
+Snapshot = Mapping[str, Set[str]]  # lowercased repo name -> lowercased logins of direct collaborators
+
+
+class OrgSnapshot:
+    # every repo in the org with its collaborators, in a handful of GraphQL queries instead of a REST call per repo
+    __slots__ = "token", "org", "snapshots", "fetched_at"
+
+    def __init__(self, token: str, org: str, ttl: float) -> None:
+        self.token = token
+        self.org = org
+        self.snapshots: SingleFlight[Snapshot] = SingleFlight(ttl)
+        self.fetched_at = 0.0
+
+    async def get(self) -> Snapshot:
+        # concurrent callers share one fetch, and the result is reused until the ttl is up
+        return await self.snapshots.run(self.org, self.fetch)
+
+    async def query(self, query: str, variables: Mapping[str, Any]) -> Mapping[str, Any]:
+        import requests
+
+        response = await asyncio.to_thread(
+            requests.post,
+            GRAPHQL_URL,
+            json={"query": query, "variables": variables},
+            headers={"Authorization": f"Bearer {self.token}"},
+            timeout=TIMEOUT,
+        )
+        response.raise_for_status()
+
+        result = response.json()
+        if result.get("errors"):
+            raise RuntimeError(f"GitHub GraphQL errors: {result['errors']}")
+
+        return result["data"]
+
+    async def fetch(self) -> Snapshot:
+        start = time.perf_counter()
+        snapshot: MutableMapping[str, Set[str]] = {}
+        queries = 0
+        cursor: Optional[str] = None
+
+        while True:
+            data = await self.query(REPOSITORIES_QUERY, {"org": self.org, "cursor": cursor})
+            queries += 1
+            repositories = data["organization"]["repositories"]
+
+            for repo in repositories["nodes"]:
+                collaborators = repo["collaborators"]
+                logins = snapshot[repo["name"].lower()] = {node["login"].lower() for node in collaborators["nodes"]}
+
+                collaborators_cursor = collaborators["pageInfo"]["endCursor"]
+                while collaborators["pageInfo"]["hasNextPage"]:
+                    variables = {"org": self.org, "repo": repo["name"], "cursor": collaborators_cursor}
+                    collaborators = (await self.query(COLLABORATORS_QUERY, variables))["repository"]["collaborators"]
+                    queries += 1
+                    logins.update(node["login"].lower() for node in collaborators["nodes"])
+                    collaborators_cursor = collaborators["pageInfo"]["endCursor"]
+
+            if not repositories["pageInfo"]["hasNextPage"]:
+                break
+            cursor = repositories["pageInfo"]["endCursor"]
+
+        self.fetched_at = time.time()
+        logger.info(
+            f"Fetched snapshot of {len(snapshot)} repos in {self.org} "
+            f"with {queries} queries in {time.perf_counter() - start:.2f}s"
+        )
+
+        return snapshot
+
+
+__all__ = ["OrgSnapshot", "Snapshot"]
@@ -0,0 +1,75 @@
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING, Collection, List, MutableMapping, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .database import Project
+
+ProjectKeys = Tuple[Optional[int], Optional[int], Optional[str]]  # role id, text channel id, github repo
+
+
+class ProjectRegistry:
+    # in-memory copy of the project table, kept in sync by the Database write methods
+    __slots__ = "by_name", "by_role_id", "by_text_channel_id", "by_github_repo", "indexed_keys", "sorted_names"
+
+    def __init__(self) -> None:
+        self.by_name: MutableMapping[str, "Project"] = {}
+        self.by_role_id: MutableMapping[int, "Project"] = {}
+        self.by_text_channel_id: MutableMapping[int, "Project"] = {}
+        self.by_github_repo: MutableMapping[str, "Project"] = {}
+        # keys each project was indexed under, since callers mutate the instance before saving it
+        self.indexed_keys: MutableMapping[str, ProjectKeys] = {}
+        self.sorted_names: List[str] = []  # for prefix lookups
+
+    def load(self, projects: Collection["Project"]) -> None:
+        for project in projects:
+            self.add(project)
+
+    def add(self, project: "Project") -> None:
+        name = str(project.name)
+        if name in self.by_name:
+            self.remove(name)
+
+        keys: ProjectKeys = (
+            project.discord_role_id,  # type: ignore
+            project.discord_text_channel_id,  # type: ignore
+            project.github_repo,  # type: ignore
+        )
+        role_id, text_channel_id, github_repo = keys
+
+        self.by_name[name] = project
+        self.indexed_keys[name] = keys
+        insort(self.sorted_names, name)
+
+        if role_id:
+            self.by_role_id[role_id] = project
+        if text_channel_id:
+            self.by_text_channel_id[text_channel_id] = project
+        if github_repo:
+            self.by_github_repo[github_repo.lower()] = project
+
+    def remove(self, name: str) -> None:
+        if not self.by_name.pop(name, None):
+            return
+
+        role_id, text_channel_id, github_repo = self.indexed_keys.pop(name)
+        self.sorted_names.pop(bisect_left(self.sorted_names, name))
+
+        if role_id:
+            self.by_role_id.pop(role_id, None)
+        if text_channel_id:
+            self.by_text_channel_id.pop(text_channel_id, None)
+        if github_repo:
+            self.by_github_repo.pop(github_repo.lower(), None)
+
+    def complete(self, prefix: str, limit: int = 25) -> List[str]:
+        result = []
+
+        for name in self.sorted_names[bisect_left(self.sorted_names, prefix) :]:
+            if not name.startswith(prefix) or len(result) >= limit:
+                break
+            result.append(name)
+
+        return result
+
+
+__all__ = ["ProjectRegistry"]
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Collection,
+    MutableMapping,
+    MutableSequence,
+    Optional,
+)
+
+logger = logging.getLogger(__name__)
+
+StepResults = MutableMapping[str, Any]
+StepFn = Callable[[StepResults], Awaitable[Any]]  # gets the results of the steps before it
+UndoFn = Callable[[Any], Awaitable[None]]  # gets the result of its own step
+
+
+class Step:
+    __slots__ = "name", "run", "undo", "depends_on"
+
+    def __init__(self, name: str, run: StepFn, undo: Optional[UndoFn], depends_on: Collection[str]) -> None:
+        self.name = name
+        self.run = run
+        self.undo = undo
+        self.depends_on = depends_on
+
+
+class StepFailed(Exception):
+    def __init__(self, step: str, error: BaseException) -> None:
+        super().__init__(f"{step} failed: {error}")
+
+        self.step = step
+        self.error = error
+
+
+class Provisioner:
+    # runs steps as soon as the steps they depend on are done; on failure, undoes completed steps in reverse
+    __slots__ = "steps", "results", "timings", "completed", "elapsed"
+
+    def __init__(self) -> None:
+        self.steps: MutableMapping[str, Step] = {}
+        self.results: StepResults = {}
+        self.timings: MutableMapping[str, float] = {}  # step name -> seconds taken
+        self.completed: MutableSequence[str] = []  # in order of completion
+        self.elapsed = 0.0
+
+    def add_step(
+        self, name: str, run: StepFn, *, undo: Optional[UndoFn] = None, depends_on: Collection[str] = ()
+    ) -> None:
+        if name in self.steps:
+            raise ValueError(f"Step {name} already added")
+
+        for dependency in depends_on:
+            if dependency not in self.steps:
+                raise ValueError(f"Step {name} depends on unknown step {dependency}")
+
+        self.steps[name] = Step(name, run, undo, depends_on)
+
+    async def run(self) -> StepResults:
+        tasks: MutableMapping[str, asyncio.Task] = {}
+
+        async def run_step(step: Step) -> None:
+            for dependency in step.depends_on:
+                await tasks[dependency]  # raises if the dependency failed, so we never start
+
+            start = time.perf_counter()
+            try:
+                self.results[step.name] = await step.run(self.results)
+            except Exception as error:
+                raise StepFailed(step.name, error) from error
+            finally:
+                self.timings[step.name] = time.perf_counter() - start
+
+            self.completed.append(step.name)
+
+        start = time.perf_counter()
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.create_task(run_step(step))
+
+        # let everything that already started finish, so whatever it created is known and can be undone
+        outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.elapsed = time.perf_counter() - start
+
+        # anything raised counts, including a step being cancelled, which isn't wrapped in StepFailed
+        failures = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if not failures:
+            return self.results
+
+        await self.rollback()
+
+        # dependents re-raise their dependency's failure, so these are all original failures
+        raise next((failure for failure in failures if isinstance(failure, StepFailed)), failures[0])
+
+    async def rollback(self) -> None:
+        for name in reversed(self.completed):
+            if not (undo := self.steps[name].undo):
+                continue
+
+            try:
+                await undo(self.results[name])
+            except Exception:
+                logger.warn(f"Could not undo step {name}:", exc_info=True)
+
+    def format_timings(self) -> str:
+        steps = ", ".join(f"{name} {self.timings[name]:.2f}s" for name in self.completed)
+        return f"{self.elapsed:.2f}s total; {steps}"
+
+
+__all__ = ["Provisioner", "StepFailed", "StepResults"]
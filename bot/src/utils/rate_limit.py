@@ -0,0 +1,71 @@
+import logging
+import time
+from collections import Counter
+from typing import MutableMapping, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRUNE_THRESHOLD = 1024  # number of buckets before idle ones are dropped
+
+
+class TokenBucket:
+    __slots__ = "capacity", "refill_rate", "tokens", "updated"
+
+    def __init__(self, capacity: int, per: float) -> None:
+        self.capacity = capacity
+        self.refill_rate = capacity / per  # tokens per second
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        # returns 0 if a token was taken, otherwise how long until one is available
+        self.refill(now)
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+
+        return (1 - self.tokens) / self.refill_rate
+
+
+class RateLimiter:
+    __slots__ = "buckets", "rejected"
+
+    def __init__(self) -> None:
+        self.buckets: MutableMapping[Tuple[int, str], TokenBucket] = {}  # (user id, command) -> bucket
+        self.rejected: Counter[str] = Counter()  # command -> number of rejected calls
+
+    def hit(self, user_id: int, command: str, capacity: int, per: float) -> float:
+        now = time.monotonic()
+
+        if not (bucket := self.buckets.get((user_id, command))):
+            if len(self.buckets) >= PRUNE_THRESHOLD:
+                self.prune(now)
+            bucket = self.buckets[(user_id, command)] = TokenBucket(capacity, per)
+
+        retry_after = bucket.take(now)
+        if retry_after:
+            self.rejected[command] += 1
+            logger.warn(
+                f"Rate limited {user_id} on {command} for {retry_after:.0f}s "
+                f"({self.rejected[command]} rejected calls so far)"
+            )
+
+        return retry_after
+
+    def prune(self, now: float) -> None:
+        # a full bucket behaves the same as a new one, so there is no need to keep it around
+        # wrap in list to create a copy of items (we modify the dict in the loop)
+        for key, bucket in list(self.buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity:
+                self.buckets.pop(key)
+
+
+rate_limiter = RateLimiter()
+
+__all__ = ["rate_limiter", "RateLimiter", "TokenBucket"]
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import (
+    Callable,
+    Generic,
+    Hashable,
+    Mapping,
+    MutableMapping,
+    MutableSet,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+logger = logging.getLogger(__name__)
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class WriteBuffer(Generic[KeyType, ValueType]):
+    # write-behind buffer: writes wait briefly and go to the database together, as one statement and one commit,
+    # once max_size are waiting or max_delay has passed since the first. write() returns only once its row committed
+    __slots__ = "flush_rows", "after_flush", "max_size", "max_delay", "pending", "timer", "flushes", "flush_lock"
+
+    def __init__(
+        self,
+        flush_rows: Callable[[Mapping[KeyType, ValueType]], None],
+        *,
+        after_flush: Optional[Callable[[Mapping[KeyType, ValueType]], None]] = None,
+        max_size: int,
+        max_delay: float,
+    ) -> None:
+        # writes all rows in a single transaction, raising if it didn't commit. runs in a worker thread
+        self.flush_rows = flush_rows
+        # called on the event loop with the rows that committed, for whatever isn't safe to touch from a thread
+        self.after_flush = after_flush
+        self.max_size = max_size
+        self.max_delay = max_delay  # seconds
+        self.pending: MutableMapping[KeyType, Tuple[ValueType, asyncio.Future[None]]] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.flushes: MutableSet[asyncio.Task] = set()
+        # batches commit in the order they were taken, so a later write to a key can't be overwritten by an earlier one
+        self.flush_lock = asyncio.Lock()
+
+    async def write(self, key: KeyType, value: ValueType) -> None:
+        loop = asyncio.get_running_loop()
+
+        if key in self.pending:
+            # the later write wins, and both callers wait on the same commit
+            _, future = self.pending[key]
+        else:
+            future = loop.create_future()
+        self.pending[key] = (value, future)
+
+        if len(self.pending) >= self.max_size:
+            self.start_flush()
+        elif not self.timer:
+            self.timer = loop.call_later(self.max_delay, self.start_flush)
+
+        # shield so a caller going away doesn't cancel the write for anyone else in the batch
+        await asyncio.shield(future)
+
+    def start_flush(self) -> None:
+        # the batch is taken now, and written by a task of its own so no caller can cancel it halfway
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+
+        task = asyncio.create_task(self.flush(pending))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def flush(self, pending: Mapping[KeyType, Tuple[ValueType, asyncio.Future[None]]]) -> None:
+        async with self.flush_lock:
+            try:
+                await self.flush_batch({key: value for key, (value, _) in pending.items()})
+            except Exception:
+                # one bad row shouldn't fail everyone else's write, so find it by going row by row
+                logger.warn(f"Batched write of {len(pending)} rows failed, retrying one at a time:", exc_info=True)
+                for key, (value, future) in pending.items():
+                    try:
+                        await self.flush_batch({key: value})
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(None)
+                return
+
+        for _, future in pending.values():
+            if not future.done():
+                future.set_result(None)
+
+    async def flush_batch(self, rows: Mapping[KeyType, ValueType]) -> None:
+        # peewee blocks, so the write runs off the event loop
+        await asyncio.to_thread(self.flush_rows, rows)
+
+        if self.after_flush:
+            try:
+                self.after_flush(rows)
+            except Exception:
+                logger.error("After flush callback failed:", exc_info=True)
+
+
+__all__ = ["WriteBuffer"]
@@ -2,9 +2,11 @@ import os
 
 
 class Config:
-    __slots__ = ("ipc_secret",)
+    __slots__ = "github_webhook_secret", "ipc_secret"
 
     def __init__(self) -> None:
+        # webhook deliveries are rejected until this is set
+        self.github_webhook_secret = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
         self.ipc_secret = os.environ["IPC_SECRET"]
 
 
@@ -0,0 +1,11 @@
+from peewee import PostgresqlDatabase
+
+from shared import auth_flow, repo_index
+from shared.auth_flow import get_ms_auth_uri
+
+db = PostgresqlDatabase(database="postgres", host="db", port=5432, user="postgres", password="postgres")
+# the auth flow table and the collaborator index kept current from GitHub webhooks live in the shared package
+auth_flow.db.initialize(db)
+repo_index.db.initialize(db)
+
+__all__ = ["db", "get_ms_auth_uri"]
@@ -1,46 +1,40 @@
 import logging
+from typing import Any, MutableMapping
 
 from config import config
+from database import db  # noqa: F401, binds the shared models to the database
 from nextcord.ext.ipc.client import Client
-from quart import Quart, redirect, request
+from quart import Quart
+
+from shared.single_flight import SingleFlight, succeeded
+from shared.verify_routes import register_routes
 
 app = Quart(__name__)
 ipc_client = Client(host="bot", secret_key=config.ipc_secret)
 
-logger = logging.getLogger(__name__)
+# users double submit or refresh the callback pages, so identical callbacks share one request to the bot
+# failures aren't kept, so retrying after one reaches the bot again
+callbacks: SingleFlight = SingleFlight(ttl=30, cache_if=succeeded)
 
+logger = logging.getLogger(__name__)
 
-@app.route("/", methods=["GET", "POST"])
-async def ms_auth_result():
-    if request.method == "GET":
-        return "Hello! This is for the AppVenture bot.", 405
 
-    resp = await ipc_client.request(endpoint="on_ms_auth_response", response=dict(await request.form))
+async def ask_bot(endpoint: str, kind: str, params: MutableMapping[str, Any]) -> Any:
+    state = params.get("state")
+    resp = await callbacks.run(
+        (kind, state) if state else None,
+        lambda: ipc_client.request(endpoint=endpoint, response=params),
+    )
     if isinstance(resp, list):
         resp = tuple(resp)
     return resp
 
 
-@app.route("/ms_auth", methods=["GET"])
-async def redirect_to_ms_auth():
-    if not (state := request.args.get("state")):
-        return "Invalid request, try running <code>/ms verify</code> again", 400
-
-    link = await ipc_client.request(endpoint="get_real_ms_auth_link", state=state)
-    if link is None:
-        return "Invalid request, try running <code>/ms verify</code> again", 400
-    elif not link:
-        return "Internal IPC error, contact exco", 500
-
-    return redirect(link)
-
-
-@app.route("/github", methods=["GET"])
-async def do_github_auth():
-    resp = await ipc_client.request(endpoint="on_gh_auth_response", response=dict(request.args))
-    if isinstance(resp, list):
-        resp = tuple(resp)
-    return resp
-
+register_routes(
+    app,
+    on_ms_auth_response=lambda form: ask_bot("on_ms_auth_response", "ms", form),
+    on_gh_auth_response=lambda args: ask_bot("on_gh_auth_response", "github", args),
+    webhook_secret=config.github_webhook_secret,
+)
 
 __all__ = ["app"]
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from peewee import BigIntegerField, CharField, DatabaseProxy, Model, TextField
+
+logger = logging.getLogger(__name__)
+
+# the bot and the server each bind this to their own connection; the bot creates the table
+db = DatabaseProxy()
+
+AUTH_FLOW_TTL = 86400  # seconds
+
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+class AuthFlow(BaseModel):
+    # written by the bot; the verify server reads auth_uri directly
+    state = CharField(32, primary_key=True)
+    kind = CharField(10)  # "ms" or "github"
+    discord_id = BigIntegerField(index=True)
+    created_at = BigIntegerField(index=True)
+    auth_uri = TextField(null=True)
+    flow = TextField(null=True)  # serialised msal flow
+
+
+def get_ms_auth_uri(state: str) -> Optional[str]:
+    auth_flow = (
+        AuthFlow.select(AuthFlow.auth_uri)
+        .where(
+            (AuthFlow.state == state)
+            & (AuthFlow.kind == "ms")
+            & (AuthFlow.created_at > int(time.time()) - AUTH_FLOW_TTL)
+        )
+        .first()
+    )
+
+    return auth_flow and auth_flow.auth_uri
+
+
+def import_legacy_auth_flows(storage: str) -> int:
+    # flows used to live in the bot's JSON caches: auth_flows.json as state -> [created at, discord id, msal flow]
+    # and github_auth_flows.json as state -> [created at, discord id]. pending ones are carried over once, and the
+    # files renamed so they aren't imported again
+    rows = []
+    imported = []
+    expired = int(time.time()) - AUTH_FLOW_TTL
+
+    for name, kind in (("auth_flows", "ms"), ("github_auth_flows", "github")):
+        path = os.path.join(storage, f"{name}.json")
+        try:
+            with open(path, "rb") as f:
+                flows = json.loads(f.read())
+        except FileNotFoundError:
+            continue
+
+        for state, (created_at, discord_id, *flow) in flows.items():
+            if created_at <= expired:
+                continue
+
+            auth_uri = flow[0].get("auth_uri") if flow else None
+            rows.append((state, kind, discord_id, int(created_at), auth_uri, json.dumps(flow[0]) if flow else None))
+
+        imported.append(path)
+
+    if rows:
+        with db.atomic():
+            AuthFlow.insert_many(
+                rows,
+                fields=[
+                    AuthFlow.state,
+                    AuthFlow.kind,
+                    AuthFlow.discord_id,
+                    AuthFlow.created_at,
+                    AuthFlow.auth_uri,
+                    AuthFlow.flow,
+                ],
+            ).on_conflict_ignore().execute()
+
+        logger.info(f"Imported {len(rows)} pending auth flows from the JSON caches")
+
+    # only once they are in the table, so a failed import is retried on the next start
+    for path in imported:
+        os.replace(path, f"{path}.imported")
+
+    return len(rows)
+
+
+__all__ = ["db", "AuthFlow", "AUTH_FLOW_TTL", "get_ms_auth_uri", "import_legacy_auth_flows"]
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Callable, List, Mapping, MutableMapping, Optional
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "bot_changes"
+RECONNECT_DELAY = 5  # seconds
+ORIGIN = uuid.uuid4().hex[:12]  # tells this process' own notifications apart, those are applied already
+
+Change = Mapping[str, Any]  # table, op and the key of the row, e.g. {"table": "project", "op": "upsert", "name": ...}
+ChangeHandler = Callable[[Change], None]
+
+
+def change_payload(table: str, op: str, *, echo: bool = False, **key: Any) -> str:
+    # postgres caps payloads at 8000 bytes, so only keys go out and subscribers read the rows themselves.
+    # echoed changes reach this process too, for writers that don't patch its in-memory copies themselves
+    return json.dumps({"table": table, "op": op, "origin": "" if echo else ORIGIN, **key})
+
+
+def publish(database: Any, table: str, op: str, *, echo: bool = False, **key: Any) -> None:
+    # sent inside the write's transaction, so listeners only hear about it once it commits
+    database.execute_sql("SELECT pg_notify(%s, %s)", (CHANNEL, change_payload(table, op, echo=echo, **key)))
+
+
+class ChangeFeed:
+    # LISTEN side of the notifications the Database sends on writes, so in-memory copies follow writes made by
+    # other processes. nothing is delivered while disconnected, so everything is reloaded after a reconnect
+    __slots__ = "connect", "reload", "handlers", "loop", "connection", "fileno"
+
+    def __init__(self, connect: Callable[[], Any], reload: Callable[[], None]) -> None:
+        self.connect = connect  # returns a new psycopg2 connection
+        self.reload = reload
+        self.handlers: MutableMapping[str, List[ChangeHandler]] = {}  # table -> handlers
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.connection: Any = None
+        self.fileno: Optional[int] = None
+
+    def subscribe(self, table: str, handler: ChangeHandler) -> None:
+        self.handlers.setdefault(table, []).append(handler)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self.loop:
+            return
+
+        self.loop = loop
+        self.listen()
+
+    def listen(self) -> bool:
+        try:
+            connection = self.connect()
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+        except Exception:
+            logger.warn(f"Could not listen for changes, retrying in {RECONNECT_DELAY}s:", exc_info=True)
+            self.loop.call_later(RECONNECT_DELAY, self.reconnect)  # type: ignore
+            return False
+
+        self.connection = connection
+        self.fileno = connection.fileno()
+        # the connection's socket becomes readable when a notification arrives, no polling loop needed
+        self.loop.add_reader(self.fileno, self.poll)  # type: ignore
+        return True
+
+    def reconnect(self) -> None:
+        if self.listen():
+            logger.info("Listening for changes again, reloading cached rows")
+            self.reload()
+
+    def poll(self) -> None:
+        try:
+            self.connection.poll()
+        except Exception:
+            logger.warn(f"Lost the change notification connection, reconnecting in {RECONNECT_DELAY}s:", exc_info=True)
+            self.loop.remove_reader(self.fileno)  # type: ignore
+            self.connection.close()
+            self.connection = self.fileno = None
+            self.loop.call_later(RECONNECT_DELAY, self.reconnect)  # type: ignore
+            return
+
+        while self.connection.notifies:
+            self.dispatch(self.connection.notifies.pop(0).payload)
+
+    def dispatch(self, payload: str) -> None:
+        try:
+            change: Change = json.loads(payload)
+            table = change["table"]
+        except (ValueError, KeyError, TypeError):
+            logger.warn(f"Malformed change notification: {payload!r}")
+            return
+
+        if change.get("origin") == ORIGIN:
+            return
+
+        for handler in self.handlers.get(table, []):
+            try:
+                handler(change)
+            except Exception:
+                logger.error(f"Change handler for {table} failed:", exc_info=True)
+
+    def stop(self) -> None:
+        if self.connection:
+            self.loop.remove_reader(self.fileno)  # type: ignore
+            self.connection.close()
+            self.connection = self.fileno = None
+
+
+__all__ = ["CHANNEL", "Change", "ChangeFeed", "change_payload", "publish"]
@@ -0,0 +1,72 @@
+import hashlib
+import hmac
+import json
+import logging
+from typing import Any, Mapping, Optional, Tuple
+
+from . import repo_index
+
+logger = logging.getLogger(__name__)
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    # https://docs.github.com/en/webhooks/using-webhooks/validating-webhook-deliveries
+    if not secret or not signature:
+        return False
+
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def handle_webhook(secret: str, event: str, body: bytes, signature: Optional[str]) -> Tuple[str, int]:
+    # writes to the database, so callers run it in a thread rather than on the event loop
+    if not verify_signature(secret, body, signature):
+        return "Invalid signature", 401
+
+    try:
+        payload: Mapping[str, Any] = json.loads(body)
+        # the worker thread's connection is handed back after, rather than staying checked out of the bot's pool
+        with repo_index.db.connection_context():
+            return apply_event(event, payload)
+    except (ValueError, KeyError, TypeError):
+        logger.warn(f"Malformed {event} webhook payload:", exc_info=True)
+        return "Malformed payload", 400
+
+
+def apply_event(event: str, payload: Mapping[str, Any]) -> Tuple[str, int]:
+    # keeps the collaborator index, and the repos projects link to, current
+    action = payload.get("action")
+
+    if event == "ping":
+        return "pong", 200
+
+    if event == "member":
+        # https://docs.github.com/en/webhooks/webhook-events-and-payloads#member
+        repo = payload["repository"]["name"]
+        login = payload["member"]["login"]
+
+        if action == "added":
+            repo_index.add_repo_collaborator(repo, login)
+        elif action == "removed":
+            repo_index.remove_repo_collaborator(repo, login)
+
+        return "ok", 200
+
+    if event == "repository":
+        # https://docs.github.com/en/webhooks/webhook-events-and-payloads#repository
+        repo = payload["repository"]["name"]
+
+        if action == "created":
+            # nobody has been added yet, so there is nothing to fetch later
+            repo_index.set_repo_collaborators(repo, [])
+        elif action == "renamed":
+            repo_index.rename_repo(payload["changes"]["repository"]["name"]["from"], repo)
+        elif action in ("deleted", "transferred"):
+            repo_index.delete_repo(repo)
+
+        return "ok", 200
+
+    return f"Ignored {event} event", 202
+
+
+__all__ = ["handle_webhook", "verify_signature"]
@@ -0,0 +1,134 @@
+import time
+from typing import Collection, List, Mapping, Optional, Set
+
+from peewee import (
+    BigIntegerField,
+    CharField,
+    CompositeKey,
+    DatabaseProxy,
+    Model,
+    chunked,
+    fn,
+)
+
+from .change_feed import publish
+
+# the bot and the server each bind this to their own connection; the bot creates the tables
+db = DatabaseProxy()
+
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+class RepoCollaborator(BaseModel):
+    # direct collaborators of org repos, kept current from GitHub webhooks
+    repo = CharField(100)  # lowercased, like login
+    login = CharField(100)
+
+    class Meta:
+        primary_key = CompositeKey("repo", "login")
+
+
+class RepoSync(BaseModel):
+    # repos whose collaborators have been fetched once; webhooks keep them current from then on
+    repo = CharField(100, primary_key=True)
+    synced_at = BigIntegerField()
+
+
+class ProjectRepo(BaseModel):
+    # the bot's project table, only the columns a repo rename touches
+    name = CharField(100, primary_key=True)
+    github_repo = CharField(100, null=True)
+
+    class Meta:
+        table_name = "project"
+
+
+def get_repo_collaborators(repo: str) -> Optional[Set[str]]:
+    # None if the repo was never synced, since an empty set is a valid answer
+    repo = repo.lower()
+    if not RepoSync.get_or_none(RepoSync.repo == repo):
+        return None
+
+    return set(RepoCollaborator.select(RepoCollaborator.login).where(RepoCollaborator.repo == repo).scalars())
+
+
+def set_repo_collaborators(repo: str, logins: Collection[str]) -> None:
+    repo = repo.lower()
+    with db.atomic():
+        RepoCollaborator.delete().where(RepoCollaborator.repo == repo).execute()
+        if logins:
+            RepoCollaborator.insert_many(
+                [(repo, login.lower()) for login in logins], fields=[RepoCollaborator.repo, RepoCollaborator.login]
+            ).execute()
+        RepoSync.insert(repo=repo, synced_at=int(time.time())).on_conflict(
+            conflict_target=[RepoSync.repo], preserve=[RepoSync.synced_at]
+        ).execute()
+
+
+def replace_repo_collaborators(collaborators: Mapping[str, Collection[str]]) -> None:
+    # a full snapshot of the org, so repos missing from it are gone
+    rows = [(repo.lower(), login.lower()) for repo, logins in collaborators.items() for login in logins]
+    synced_at = int(time.time())
+
+    with db.atomic():
+        RepoCollaborator.delete().execute()
+        RepoSync.delete().execute()
+        for batch in chunked(rows, 500):
+            RepoCollaborator.insert_many(batch, fields=[RepoCollaborator.repo, RepoCollaborator.login]).execute()
+        for batch in chunked([(repo.lower(), synced_at) for repo in collaborators], 500):
+            RepoSync.insert_many(batch, fields=[RepoSync.repo, RepoSync.synced_at]).execute()
+
+
+def add_repo_collaborator(repo: str, login: str) -> None:
+    with db.atomic():
+        RepoCollaborator.insert(repo=repo.lower(), login=login.lower()).on_conflict_ignore().execute()
+
+
+def remove_repo_collaborator(repo: str, login: str) -> None:
+    with db.atomic():
+        RepoCollaborator.delete().where(
+            (RepoCollaborator.repo == repo.lower()) & (RepoCollaborator.login == login.lower())
+        ).execute()
+
+
+def rename_repo(old: str, new: str) -> List[str]:
+    # returns the names of the projects linked to the repo, which now point at the new name
+    with db.atomic():
+        RepoCollaborator.update(repo=new.lower()).where(RepoCollaborator.repo == old.lower()).execute()
+        RepoSync.update(repo=new.lower()).where(RepoSync.repo == old.lower()).execute()
+
+        # projects keep the name as GitHub spells it
+        projects = [
+            str(project.name)
+            for project in ProjectRepo.update(github_repo=new)
+            .where(fn.LOWER(ProjectRepo.github_repo) == old.lower())
+            .returning(ProjectRepo.name)
+        ]
+        for name in projects:
+            # echoed, so the bot's project registry follows even when the bot made the change itself
+            publish(db, "project", "upsert", echo=True, name=name)
+
+    return projects
+
+
+def delete_repo(repo: str) -> None:
+    with db.atomic():
+        RepoCollaborator.delete().where(RepoCollaborator.repo == repo.lower()).execute()
+        RepoSync.delete().where(RepoSync.repo == repo.lower()).execute()
+
+
+__all__ = [
+    "db",
+    "RepoCollaborator",
+    "RepoSync",
+    "get_repo_collaborators",
+    "set_repo_collaborators",
+    "replace_repo_collaborators",
+    "add_repo_collaborator",
+    "remove_repo_collaborator",
+    "rename_repo",
+    "delete_repo",
+]
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    MutableMapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+ResultType = TypeVar("ResultType")
+
+
+def succeeded(response: Any) -> bool:
+    # route results are a body, or a (body, status) pair, which arrives as a list when it went through IPC
+    return not isinstance(response, (tuple, list)) or response[1] < 400
+
+
+class SingleFlight(Generic[ResultType]):
+    __slots__ = "ttl", "cache_if", "in_flight", "results"
+
+    def __init__(self, ttl: float, cache_if: Callable[[ResultType], bool] = lambda _: True) -> None:
+        self.ttl = ttl
+        self.cache_if = cache_if  # results it rejects are only shared with calls already waiting, not kept
+        self.in_flight: MutableMapping[Hashable, asyncio.Future[ResultType]] = {}
+        self.results: MutableMapping[Hashable, Tuple[float, ResultType]] = {}  # key -> expiry, result
+
+    async def run(self, key: Optional[Hashable], fn: Callable[[], Awaitable[ResultType]]) -> ResultType:
+        if key is None:
+            # nothing to tell the calls apart by, so nothing to share either
+            return await fn()
+
+        now = time.monotonic()
+
+        # wrap in list to create a copy of items (we modify the dict in the loop)
+        for result_key, (expiry, _) in list(self.results.items()):
+            if expiry <= now:
+                self.results.pop(result_key)
+
+        if key in self.results:
+            return self.results[key][1]
+
+        if not (task := self.in_flight.get(key)):
+            task = asyncio.ensure_future(self.run_once(key, fn))
+            self.in_flight[key] = task
+
+        # shield so a caller going away doesn't cancel the call for everyone else waiting on it
+        return await asyncio.shield(task)
+
+    async def run_once(self, key: Hashable, fn: Callable[[], Awaitable[ResultType]]) -> ResultType:
+        try:
+            result = await fn()
+        finally:
+            self.in_flight.pop(key, None)
+
+        if self.cache_if(result):
+            self.results[key] = (time.monotonic() + self.ttl, result)
+        return result
+
+
+__all__ = ["SingleFlight", "succeeded"]
@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable, Callable, MutableMapping
+
+from quart import Quart, redirect, request
+
+from .auth_flow import get_ms_auth_uri
+from .github_webhook import handle_webhook
+
+# gets the callback's form or query parameters, returns the page to show
+AuthCallback = Callable[[MutableMapping[str, Any]], Awaitable[Any]]
+
+
+def register_routes(
+    app: Quart, *, on_ms_auth_response: AuthCallback, on_gh_auth_response: AuthCallback, webhook_secret: str
+) -> None:
+    # the verify routes, served by the server container or by the bot in embedded mode. only how the OAuth
+    # callbacks reach the auth cogs differs between the two, so that is passed in
+
+    @app.route("/", methods=["GET", "POST"])
+    async def ms_auth_result():
+        if request.method == "GET":
+            return "Hello! This is for the AppVenture bot.", 405
+
+        return await on_ms_auth_response(dict(await request.form))
+
+    @app.route("/ms_auth", methods=["GET"])
+    async def redirect_to_ms_auth():
+        if not (state := request.args.get("state")):
+            return "Invalid request, try running <code>/ms verify</code> again", 400
+
+        # read straight from the shared auth flow table, no need to ask the bot; peewee blocks, so off the event loop
+        link = await asyncio.to_thread(get_ms_auth_uri, state)
+        if not link:
+            return "Invalid request, try running <code>/ms verify</code> again", 400
+
+        return redirect(link)
+
+    @app.route("/github", methods=["GET"])
+    async def do_github_auth():
+        return await on_gh_auth_response(dict(request.args))
+
+    @app.route("/github/webhook", methods=["POST"])
+    async def github_webhook():
+        return await asyncio.to_thread(
+            handle_webhook,
+            webhook_secret,
+            request.headers.get("X-GitHub-Event", ""),
+            await request.get_data(),
+            request.headers.get("X-Hub-Signature-256"),
+        )
+
+
+__all__ = ["register_routes"]
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the images run from src/ with the shared package copied in, so mirror that layout
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bot", "src")]
@@ -0,0 +1,31 @@
+import json
+import time
+from pathlib import Path
+
+from peewee import SqliteDatabase
+
+from shared import auth_flow
+from shared.auth_flow import AUTH_FLOW_TTL, AuthFlow, get_ms_auth_uri, import_legacy_auth_flows
+
+
+def test_imports_pending_flows_from_json_caches(tmp_path: Path) -> None:
+    database = SqliteDatabase(str(tmp_path / "flows.db"))
+    auth_flow.db.initialize(database)
+    database.create_tables([AuthFlow])
+
+    now = int(time.time())
+    ms_flow = {"auth_uri": "https://login.example/authorize", "state": "ms-state"}
+    (tmp_path / "auth_flows.json").write_text(
+        json.dumps({"ms-state": [now, 1, ms_flow], "ms-expired": [now - AUTH_FLOW_TTL, 2, ms_flow]})
+    )
+    (tmp_path / "github_auth_flows.json").write_text(json.dumps({"gh-state": [now, 3]}))
+
+    assert import_legacy_auth_flows(str(tmp_path)) == 2
+    assert get_ms_auth_uri("ms-state") == ms_flow["auth_uri"]
+    assert json.loads(AuthFlow.get_by_id("ms-state").flow) == ms_flow
+    assert AuthFlow.get_by_id("gh-state").discord_id == 3
+    assert not AuthFlow.get_or_none(AuthFlow.state == "ms-expired")
+
+    # renamed, so the next start doesn't import them again
+    assert not (tmp_path / "auth_flows.json").exists()
+    assert import_legacy_auth_flows(str(tmp_path)) == 0
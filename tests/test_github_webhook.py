@@ -0,0 +1,84 @@
+import hashlib
+import hmac
+import os
+from pathlib import Path
+from typing import Any, Iterator, List, Tuple
+
+import pytest
+from peewee import SqliteDatabase
+
+from shared import repo_index
+from shared.github_webhook import handle_webhook
+from shared.repo_index import ProjectRepo, RepoCollaborator, RepoSync
+
+SECRET = "webhook-secret"
+PAYLOADS = os.path.join(os.path.dirname(__file__), "payloads")
+
+
+def load(name: str) -> bytes:
+    # the exact bytes GitHub signed, so they are never re-serialised
+    with open(os.path.join(PAYLOADS, name), "rb") as payload:
+        return payload.read()
+
+
+def sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+@pytest.fixture
+def published(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Iterator[List[Tuple[str, str, Any]]]:
+    # sqlite in place of postgres, which has no pg_notify, so notifications are recorded instead. a file rather
+    # than :memory:, since the webhook hands its connection back after each delivery
+    database = SqliteDatabase(str(tmp_path / "index.db"))
+    repo_index.db.initialize(database)
+    database.create_tables([RepoCollaborator, RepoSync, ProjectRepo])
+
+    changes: List[Tuple[str, str, Any]] = []
+    monkeypatch.setattr(repo_index, "publish", lambda _, table, op, **key: changes.append((table, op, key)))
+
+    yield changes
+
+    database.close()
+    repo_index.db.initialize(None)
+
+
+def test_member_added(published: List[Tuple[str, str, Any]]) -> None:
+    body = load("member_added.json")
+
+    assert handle_webhook(SECRET, "member", body, sign(body)) == ("ok", 200)
+    assert repo_index.get_repo_collaborators("hello-world") is None  # never synced, so still unknown
+    assert list(RepoCollaborator.select().tuples()) == [("hello-world", "octocat")]
+
+
+def test_repository_renamed(published: List[Tuple[str, str, Any]]) -> None:
+    repo_index.set_repo_collaborators("Hello-World", ["Octocat"])
+    ProjectRepo.create(name="hello", github_repo="Hello-World")
+    ProjectRepo.create(name="other", github_repo="Other")
+    body = load("repository_renamed.json")
+
+    assert handle_webhook(SECRET, "repository", body, sign(body)) == ("ok", 200)
+    assert repo_index.get_repo_collaborators("hello-world") is None
+    assert repo_index.get_repo_collaborators("hello-universe") == {"octocat"}
+    # the project follows the rename, spelled the way GitHub spells it, and the bot hears about it
+    assert ProjectRepo.get_by_id("hello").github_repo == "Hello-Universe"
+    assert ProjectRepo.get_by_id("other").github_repo == "Other"
+    assert published == [("project", "upsert", {"echo": True, "name": "hello"})]
+
+
+@pytest.mark.parametrize("name, event", [("member_added.json", "member"), ("repository_renamed.json", "repository")])
+def test_unsigned_payloads_are_rejected(published: List[Tuple[str, str, Any]], name: str, event: str) -> None:
+    repo_index.set_repo_collaborators("Hello-World", [])
+    body = load(name)
+
+    assert handle_webhook(SECRET, event, body, None) == ("Invalid signature", 401)
+    assert handle_webhook(SECRET, event, body, sign(body + b" ")) == ("Invalid signature", 401)
+    # without a configured secret nothing is trusted, signed or not
+    assert handle_webhook("", event, body, sign(body)) == ("Invalid signature", 401)
+    assert repo_index.get_repo_collaborators("hello-world") == set()
+    assert not published
+
+
+def test_malformed_payload(published: List[Tuple[str, str, Any]]) -> None:
+    body = b'{"action": "added"}'
+
+    assert handle_webhook(SECRET, "member", body, sign(body)) == ("Malformed payload", 400)
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Any, List, Tuple
+
+import pytest
+from cogs import outbox as outbox_module
+from cogs.outbox import Outbox
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int) -> None:
+        self.id = channel_id
+        self.sent: List[Tuple[float, Any]] = []  # time, content
+
+    async def send(self, **kwargs: Any) -> str:
+        self.sent.append((time.monotonic(), kwargs["content"]))
+        return kwargs["content"]
+
+
+async def drain(outbox: Outbox, channel: FakeChannel, count: int) -> List[Any]:
+    outbox.senders = [asyncio.create_task(outbox.sender()) for _ in range(outbox_module.SENDERS)]
+    try:
+        futures = [outbox.send(channel, f"message {i}") for i in range(count)]  # type: ignore
+        return await asyncio.wait_for(asyncio.gather(*futures), timeout=5)
+    finally:
+        for sender in outbox.senders:
+            sender.cancel()
+
+
+def test_more_messages_than_the_bucket_holds(monkeypatch: pytest.MonkeyPatch) -> None:
+    # 2 messages per 0.2s, so 6 messages need two refills after the first 2
+    monkeypatch.setattr(outbox_module, "PACING", (2, 0.2))
+    channel = FakeChannel(1)
+
+    start = time.monotonic()
+    results = asyncio.run(drain(Outbox(None), channel, 6))  # type: ignore
+
+    assert results == [f"message {i}" for i in range(6)]
+    assert [content for _, content in channel.sent] == results
+    # a token comes back every 0.1s, and the 4 messages past the bucket each waited for one
+    assert channel.sent[-1][0] - start >= 0.35
+
+
+def test_retries_server_errors(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(outbox_module, "RETRY_BACKOFF", 0.01)
+
+    class FlakyChannel(FakeChannel):
+        failures = 1
+
+        async def send(self, **kwargs: Any) -> str:
+            if self.failures:
+                self.failures -= 1
+                response = type("Response", (), {"status": 503, "reason": "Service Unavailable"})()
+                raise outbox_module.HTTPException(response, "unavailable")  # type: ignore
+            return await super().send(**kwargs)
+
+    outbox = Outbox(None)  # type: ignore
+    channel = FlakyChannel(2)
+
+    assert asyncio.run(drain(outbox, channel, 1)) == ["message 0"]
+    assert outbox.stats["retried"] == 1
+
+
+def test_resolves_on_unexpected_errors() -> None:
+    class BrokenChannel(FakeChannel):
+        async def send(self, **kwargs: Any) -> str:
+            raise Exception("not an HTTP error")
+
+    outbox = Outbox(None)  # type: ignore
+
+    assert asyncio.run(drain(outbox, BrokenChannel(3), 2)) == [None, None]
+    assert outbox.stats["failed"] == 2
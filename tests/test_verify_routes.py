@@ -0,0 +1,52 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Any, List, Mapping
+
+from peewee import SqliteDatabase
+from quart import Quart
+
+from shared import auth_flow
+from shared.auth_flow import AuthFlow
+from shared.verify_routes import register_routes
+
+
+def test_routes(tmp_path: Path) -> None:
+    database = SqliteDatabase(str(tmp_path / "flows.db"))
+    auth_flow.db.initialize(database)
+    database.create_tables([AuthFlow])
+    AuthFlow.create(
+        state="ms-state", kind="ms", discord_id=1, created_at=int(time.time()), auth_uri="https://login.example/"
+    )
+
+    received: List[Mapping[str, Any]] = []
+
+    async def on_gh_auth_response(args: Mapping[str, Any]) -> Any:
+        received.append(args)
+        return "Successfully linked with GitHub!"
+
+    async def on_ms_auth_response(form: Mapping[str, Any]) -> Any:
+        return "unused"
+
+    app = Quart(__name__)
+    register_routes(
+        app,
+        on_ms_auth_response=on_ms_auth_response,
+        on_gh_auth_response=on_gh_auth_response,
+        webhook_secret="secret",
+    )
+
+    async def run() -> None:
+        client = app.test_client()
+
+        response = await client.get("/ms_auth", query_string={"state": "ms-state"})
+        assert response.status_code == 302
+        assert response.headers["Location"] == "https://login.example/"
+        assert (await client.get("/ms_auth", query_string={"state": "unknown"})).status_code == 400
+
+        assert (await client.get("/")).status_code == 405
+        response = await client.get("/github", query_string={"state": "gh-state", "code": "abc"})
+        assert await response.get_data(as_text=True) == "Successfully linked with GitHub!"
+        assert received == [{"state": "gh-state", "code": "abc"}]
+
+    asyncio.run(run())
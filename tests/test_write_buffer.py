@@ -0,0 +1,72 @@
+import asyncio
+import threading
+from typing import Any, List, Mapping
+
+import pytest
+from utils.write_buffer import WriteBuffer
+
+
+class Recorder:
+    def __init__(self, bad: Any = None) -> None:
+        self.bad = bad
+        self.batches: List[Mapping[str, int]] = []
+        self.flushed: List[Mapping[str, int]] = []
+        self.threads: List[threading.Thread] = []
+        self.after_threads: List[threading.Thread] = []
+
+    def flush_rows(self, rows: Mapping[str, int]) -> None:
+        self.threads.append(threading.current_thread())
+        if self.bad in rows:
+            raise ValueError(f"bad row {self.bad}")
+        self.batches.append(dict(rows))
+
+    def after_flush(self, rows: Mapping[str, int]) -> None:
+        self.after_threads.append(threading.current_thread())
+        self.flushed.append(dict(rows))
+
+
+def test_batches_off_the_event_loop() -> None:
+    recorder = Recorder()
+
+    async def run() -> None:
+        buffer = WriteBuffer(recorder.flush_rows, after_flush=recorder.after_flush, max_size=10, max_delay=0.05)
+        await asyncio.wait_for(asyncio.gather(*(buffer.write(f"key {i}", i) for i in range(3))), timeout=5)
+
+    asyncio.run(run())
+
+    assert recorder.batches == [{"key 0": 0, "key 1": 1, "key 2": 2}]
+    assert recorder.flushed == recorder.batches
+    assert threading.main_thread() not in recorder.threads
+    # listeners aren't thread safe, so they hear about the commit on the loop
+    assert recorder.after_threads == [threading.main_thread()]
+
+
+def test_size_limit_flushes_in_order() -> None:
+    recorder = Recorder()
+
+    async def run() -> None:
+        buffer = WriteBuffer(recorder.flush_rows, max_size=2, max_delay=5)
+        writes = [buffer.write("key", 1), buffer.write("other", 2), buffer.write("key", 3), buffer.write("last", 4)]
+        await asyncio.wait_for(asyncio.gather(*writes), timeout=5)
+
+    asyncio.run(run())
+
+    # the later write to key landed after the earlier one
+    assert recorder.batches == [{"key": 1, "other": 2}, {"key": 3, "last": 4}]
+
+
+def test_bad_row_only_fails_its_own_write() -> None:
+    recorder = Recorder(bad="key 1")
+
+    async def run() -> List[Any]:
+        buffer = WriteBuffer(recorder.flush_rows, after_flush=recorder.after_flush, max_size=3, max_delay=5)
+        writes = [buffer.write(f"key {i}", i) for i in range(3)]
+        return await asyncio.wait_for(asyncio.gather(*writes, return_exceptions=True), timeout=5)
+
+    results = asyncio.run(run())
+
+    assert results[0] is None and results[2] is None
+    with pytest.raises(ValueError):
+        raise results[1]
+    assert recorder.batches == [{"key 0": 0}, {"key 2": 2}]
+    assert recorder.flushed == recorder.batches